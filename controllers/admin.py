@@ -754,6 +754,123 @@ def acl():
 
     return s3_rest_controller("s3", "permission")
 
+# -----------------------------------------------------------------------------
+@auth.s3_requires_membership(1)
+def acl_explain():
+    """
+        Show the accessible-query of a user for a table, with the generated
+        SQL and the query plan, to tune indexes for ACL-filtered queries
+        for debugging purposes, not for production use!
+
+        URL vars:
+            table: the table name
+            user: the user (email or ID), omit for anonymous
+            method: the method (default: read)
+            c, f: the controller/function (default: derived from table name)
+    """
+
+    get_vars = request.get_vars
+
+    tablename = get_vars.get("table")
+    if not tablename or s3db.table(tablename, db_only=True) is None:
+        raise HTTP(400, "Invalid or missing table name")
+
+    method = get_vars.get("method", "read")
+    if "," in method:
+        method = method.split(",")
+    prefix, name = tablename.split("_", 1)
+    c = get_vars.get("c", prefix)
+    f = get_vars.get("f", name)
+
+    # Don't persist the impersonation
+    session.forget(response)
+    try:
+        auth.s3_impersonate(get_vars.get("user"))
+    except ValueError:
+        raise HTTP(404, "User not found")
+
+    output = auth.permission.explain(method, tablename, c=c, f=f)
+
+    response.headers["Content-Type"] = "application/json"
+    return json.dumps(output, indent=4, separators=(",", ": "))
+
+# -----------------------------------------------------------------------------
+@auth.s3_requires_membership(1)
+def profiler():
+    """
+        Statistics of the sampling request profiler (JSON), with mean
+        time and DB queries per phase for each controller/function/method
+
+        URL vars:
+            clear: set to remove all samples from the statistics
+    """
+
+    from s3 import S3RequestProfiler
+
+    output = S3RequestProfiler.statistics()
+    if request.get_vars.get("clear"):
+        S3RequestProfiler.clear()
+
+    response.headers["Content-Type"] = "application/json"
+    return json.dumps(output, indent=4, separators=(",", ": "), sort_keys=True)
+
+# -----------------------------------------------------------------------------
+@auth.s3_requires_membership(1)
+def xslt_statistics():
+    """
+        Statistics of XSLT stylesheet compilation and transformation
+        in this process (JSON)
+    """
+
+    output = current.xml.xslt_statistics()
+
+    response.headers["Content-Type"] = "application/json"
+    return json.dumps(output, indent=4, separators=(",", ": "), sort_keys=True)
+
+# -----------------------------------------------------------------------------
+@auth.s3_requires_membership(1)
+def index_advisor():
+    """
+        Missing-index candidates from the slow-query log (JSON), or a
+        migration script to create them
+
+        URL vars:
+            backend: postgres|mysql|sqlite to return the migration script
+                     for this database backend
+            save: set to also write the migration script for the current
+                  database to the cache folder, where it is picked up by
+                  static/scripts/tools/indexes.py
+            clear: set to remove all entries from the slow-query log
+    """
+
+    from s3 import S3IndexAdvisor
+
+    get_vars = request.get_vars
+
+    candidates = S3IndexAdvisor.report()
+
+    if get_vars.get("save"):
+        script = S3IndexAdvisor.script(candidates=candidates)
+        path = os.path.join(request.folder, "cache", "index_advisor.sql")
+        with open(path, "w") as f:
+            f.write(script)
+
+    backend = get_vars.get("backend")
+    if backend:
+        try:
+            output = S3IndexAdvisor.script(backend, candidates=candidates)
+        except ValueError as e:
+            raise HTTP(400, str(e))
+        response.headers["Content-Type"] = "text/plain"
+    else:
+        output = json.dumps(candidates, indent=4, separators=(",", ": "))
+        response.headers["Content-Type"] = "application/json"
+
+    if get_vars.get("clear"):
+        S3IndexAdvisor.clear()
+
+    return output
+
 # -----------------------------------------------------------------------------
 def acl_represent(acl, options):
     """
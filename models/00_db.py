@@ -90,6 +90,14 @@ import s3 as s3base # Shortcut for use, primarily, from views
 import s3log
 s3log.S3Log.setup()
 
+# Slow-query log for the index advisor
+if settings.get_base_slow_query_threshold():
+    s3base.S3IndexAdvisor.capture(db)
+
+# Sampling request profiler
+if settings.get_base_profiler_sample_rate():
+    s3base.S3RequestProfiler.sample()
+
 # Keep top-level scope cleaner by accessing these from s3base
 #from s3 import AuthS3, S3Audit, S3Calendar, S3GIS, S3Msg, S3Sync, S3XML
 
@@ -130,6 +130,41 @@ def gis_update_location_tree(feature, user_id=None):
     db.commit()
     return path
 
+# -----------------------------------------------------------------------------
+def realm_entity_update(tablename, entity=0, user_id=None):
+    """
+        Re-apply the realm rules to all records in a table
+            - bulk update, to be run asynchronously after changes to
+              the realm rules or the organisation hierarchy
+
+        @param tablename: the table name
+        @param entity: the realm entity (pe_id), 0 for default lookup
+        @param user_id: calling request's auth.user.id or None
+    """
+    if user_id:
+        # Authenticate
+        auth.s3_impersonate(user_id)
+
+    table = s3db.table(tablename)
+    if not table or "realm_entity" not in table.fields:
+        return "No realm entity in %s" % tablename
+
+    query = (table._id > 0)
+    if "deleted" in table.fields:
+        query &= (table.deleted == False)
+
+    def progress(done, total):
+        S3Task.progress("%s/%s records updated" % (done, total))
+
+    # Run the Task & return the result
+    result = auth.set_realm_entity_bulk(table, query,
+                                        entity = entity,
+                                        force_update = True,
+                                        progress = progress,
+                                        )
+    db.commit()
+    return "%s records updated" % result
+
 # -----------------------------------------------------------------------------
 # Org: always-enabled
 # -----------------------------------------------------------------------------
@@ -153,6 +188,7 @@ tasks = {"dummy": dummy,
          "maintenance": maintenance,
          "gis_download_kml": gis_download_kml,
          "gis_update_location_tree": gis_update_location_tree,
+         "realm_entity_update": realm_entity_update,
          "org_site_check": org_site_check,
          }
 
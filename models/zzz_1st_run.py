@@ -136,6 +136,9 @@ if len(pop_list) > 0:
     # Create indexes for permission table
     auth.permission.create_indexes()
 
+    # Create indexes for hierarchy closure table
+    s3base.S3Hierarchy.create_indexes()
+
     # =========================================================================
     # Configure Scheduled Tasks
     #
@@ -67,6 +67,10 @@ from .s3task import *
 # Hierarchy Handling
 from .s3hierarchy import *
 
+# Request Profiler and Index Advisor
+from .s3profiler import *
+from .s3indexes import *
+
 # Core Framework ==============================================================
 
 # Model Extensions
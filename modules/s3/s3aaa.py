@@ -40,6 +40,7 @@ __all__ = ("AuthS3",
 import datetime
 import json
 #import re
+import sys
 import time
 
 from collections import OrderedDict
@@ -61,11 +62,31 @@ from s3dal import Row, Rows, Query, Table, Field, original_tablename
 from .s3datetime import S3DateTime
 from .s3error import S3PermissionError
 from .s3fields import S3MetaFields, S3Represent, s3_comments
+from .s3profiler import s3_profiled
 from .s3rest import S3Method, S3Request
 from .s3track import S3Tracker
-from .s3utils import s3_addrow, s3_get_extension, s3_mark_required, s3_str
+from .s3utils import S3LRUCache, s3_addrow, s3_get_extension, s3_mark_required, s3_str
 from .s3validators import IS_ISO639_2_LANGUAGE_CODE
 
+# Maximum number of records per UPDATE in bulk realm entity updates
+REALM_UPDATE_BATCH = 1000
+
+# Tables with personal data, records in these tables are owned by the
+# person they refer to (if that person has a user account)
+PERSONAL_DATA_TABLES = ("pr_person",
+                        "pr_identity",
+                        "pr_education",
+                        "pr_contact",
+                        "pr_address",
+                        "pr_contact_emergency",
+                        "pr_person_availability",
+                        "pr_person_details",
+                        "pr_physical_description",
+                        "pr_group_membership",
+                        "pr_image",
+                        "hrm_training",
+                        )
+
 # =============================================================================
 class AuthS3(Auth):
     """
@@ -5139,39 +5160,57 @@ Please go to %(url)s to approve this user."""
         success = db(q).update(**data)
 
         if success and update and REALM in data:
-
             # Update realm-components
-            # Only goes down 1 level: doesn't do components of components
-            s3db = current.s3db
-            realm_components = s3db.get_config(table, "realm_components")
-
-            if realm_components:
-                resource = s3db.resource(table,
-                                         components = realm_components,
-                                         )
-                components = resource.components
-                realm = {REALM: data[REALM]}
-                for alias in realm_components:
-                    component = components.get(alias)
-                    if not component:
-                        continue
-                    ctable = component.table
-                    if REALM not in ctable.fields:
-                        continue
-                    query = component.get_join() & q
-                    rows = db(query).select(ctable._id)
-                    ids = set(row[ctable._id] for row in rows)
-                    if ids:
-                        ctablename = component.tablename
-                        if ctable._tablename != ctablename:
-                            # Component with table alias => switch to
-                            # original table for update:
-                            ctable = db[ctablename]
-                        db(ctable._id.belongs(ids)).update(**realm)
+            self.update_realm_components(table, q, data[REALM])
 
         # Update super-entity
         self.update_shared_fields(table, record, **data)
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def update_realm_components(table, query, realm_entity):
+        """
+            Update the realm entity in all realm-components of the records
+            (only goes down 1 level: doesn't do components of components)
+
+            Args:
+                table: the master table
+                query: the query for the master records
+                realm_entity: the realm entity
+        """
+
+        REALM = "realm_entity"
+
+        s3db = current.s3db
+        realm_components = s3db.get_config(table, "realm_components")
+        if not realm_components:
+            return
+
+        db = current.db
+
+        resource = s3db.resource(table,
+                                 components = realm_components,
+                                 )
+        components = resource.components
+        realm = {REALM: realm_entity}
+        for alias in realm_components:
+            component = components.get(alias)
+            if not component:
+                continue
+            ctable = component.table
+            if REALM not in ctable.fields:
+                continue
+            cquery = component.get_join() & query
+            rows = db(cquery).select(ctable._id)
+            ids = set(row[ctable._id] for row in rows)
+            if ids:
+                ctablename = component.tablename
+                if ctable._tablename != ctablename:
+                    # Component with table alias => switch to
+                    # original table for update:
+                    ctable = db[ctablename]
+                db(ctable._id.belongs(ids)).update(**realm)
+
     # -------------------------------------------------------------------------
     def s3_set_record_owner(self,
                             table,
@@ -5270,19 +5309,7 @@ Please go to %(url)s to approve this user."""
 
         # Find owned_by_user
         if OUSR in fields_in_table:
-            pi = ("pr_person",
-                  "pr_identity",
-                  "pr_education",
-                  "pr_contact",
-                  "pr_address",
-                  "pr_contact_emergency",
-                  "pr_person_availability",
-                  "pr_person_details",
-                  "pr_physical_description",
-                  "pr_group_membership",
-                  "pr_image",
-                  "hrm_training",
-                  )
+            pi = PERSONAL_DATA_TABLES
             if OUSR in fields:
                 data[OUSR] = fields[OUSR]
             elif not row[OUSR] or tablename in pi:
@@ -5329,6 +5356,68 @@ Please go to %(url)s to approve this user."""
 
         self.s3_update_record_owner(table, row, update=force_update, **data)
 
+    # -------------------------------------------------------------------------
+    def s3_set_record_owner_bulk(self, table, record_ids):
+        """
+            Set the record owned_by_user, owned_by_group and realm_entity
+            for multiple new records at once (auto-detect values), bulk
+            version of s3_set_record_owner
+                - to be called by the Importer in bulk commit mode
+
+            Args:
+                table: the Table
+                record_ids: list of record IDs
+
+            Note:
+                Falls back to s3_set_record_owner per record if the owner
+                depends on the individual record, i.e. for records in
+                personal data tables, or if the table has an owner_group
+                callback
+        """
+
+        if not record_ids:
+            return
+
+        s3db = current.s3db
+
+        # Ownership fields
+        OUSR = "owned_by_user"
+        OGRP = "owned_by_group"
+        REALM = "realm_entity"
+
+        tablename = original_tablename(table)
+        fields = table.fields
+        if not any(fn in fields for fn in (OUSR, OGRP, REALM)):
+            return
+
+        # Owner depending on the individual record?
+        owner_group = s3db.get_config(tablename, "owner_group")
+        if OUSR in fields and tablename in PERSONAL_DATA_TABLES or \
+           OGRP in fields and callable(owner_group):
+            for record_id in record_ids:
+                self.s3_set_record_owner(table, record_id)
+            return
+
+        db = current.db
+        query = table._id.belongs(record_ids)
+
+        # Owner user (current user, unless set in the record)
+        if OUSR in fields and self.s3_logged_in() and self.user:
+            q = query & (table[OUSR] == None)
+            data = {OUSR: self.user.id}
+            self.update_shared_fields(table, q, **data)
+            db(q).update(**data)
+
+        # Owner group (only if configured for the table)
+        if OGRP in fields and owner_group:
+            data = {OGRP: owner_group}
+            db(query).update(**data)
+            self.update_shared_fields(table, query, **data)
+
+        # Realm entity (unless set in the record)
+        if REALM in fields:
+            self.set_realm_entity(table, query)
+
     # -------------------------------------------------------------------------
     def set_realm_entity(self, table, records, entity=0, force_update=False):
         """
@@ -5401,7 +5490,11 @@ Please go to %(url)s to approve this user."""
         if query is not None:
             if not force_update:
                 query &= (table[REALM] == None)
-            records = db(query).select(*fields_to_load)
+            self.set_realm_entity_bulk(table, query,
+                                       entity = realm_entity,
+                                       force_update = force_update,
+                                       )
+            return
         elif not isinstance(records, (list, Rows)):
             records = [records]
         if not records:
@@ -5446,6 +5539,123 @@ Please go to %(url)s to approve this user."""
 
         return
 
+    # -------------------------------------------------------------------------
+    def set_realm_entity_bulk(self,
+                              table,
+                              query,
+                              entity = 0,
+                              force_update = False,
+                              progress = None,
+                              ):
+        """
+            Update the realm entity for all records matching a query,
+            resolving each distinct realm only once and updating the
+            records in batches rather than one by one
+
+            Args:
+                table: the Table
+                query: the Query
+                entity: the realm entity (pe_id), 0 for default lookup
+                force_update: update the realm entity in realm-components, too
+                progress: callback to report progress, function(done, total)
+
+            Returns:
+                the number of records processed
+
+            Note:
+                If the realm entity of the table is determined by nothing
+                but the entity fields (pe_id, organisation_id, site_id or
+                group_id) - i.e. there is no realm_entity callback, or the
+                table declares its callback as set-safe with the table
+                setting realm_entity_set_safe=True, and there is no
+                deployment-global callback (settings.auth.realm_entity)
+                - then the update is
+                fully set-based, otherwise the realm entity is looked up
+                record by record, and only the updates are batched.
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        REALM = "realm_entity"
+
+        tablename = original_tablename(table)
+        entity_fields = [fn for fn in ("pe_id", "organisation_id", "site_id", "group_id")
+                         if fn in table.fields]
+
+        # Can the realm entity be determined from the entity fields alone?
+        # - a deployment-global handler receives the full record, so is
+        #   never set-safe, and realm_entity_set_safe only applies to the
+        #   table-specific handler
+        if entity != 0:
+            set_safe = True
+        elif callable(current.deployment_settings.get_auth_realm_entity()):
+            set_safe = False
+        else:
+            set_safe = s3db.get_config(tablename, "realm_entity_set_safe") or \
+                       not callable(s3db.get_config(tablename, "realm_entity"))
+
+        total = db(query).count()
+        done = 0
+
+        get_realm_entity = self.get_realm_entity
+        def update(q, realm_entity):
+            # Update the records, their realm-components and super-entities
+            data = {REALM: realm_entity}
+            db(q).update(**data)
+            if force_update:
+                self.update_realm_components(table, q, realm_entity)
+            self.update_shared_fields(table, q, **data)
+
+        if set_safe:
+            # Update per distinct combination of entity fields
+            if entity_fields:
+                efields = [table[fn] for fn in entity_fields]
+                count = table._id.count()
+                groups = db(query).select(count,
+                                          groupby = efields,
+                                          *efields)
+            else:
+                groups = [None]
+            for group in groups:
+                if group is None:
+                    q, record, number = query, Storage(), total
+                else:
+                    q, record = query, Storage()
+                    for fn in entity_fields:
+                        value = group[table[fn]]
+                        q &= (table[fn] == value)
+                        record[fn] = value
+                    number = group[count]
+                update(q, get_realm_entity(table, record, entity=entity))
+                done += number
+                if progress:
+                    progress(done, total)
+        else:
+            # Look up the realm record by record, but update in batches
+            fields = [table._id] + [table[fn] for fn in entity_fields]
+            batch_size = REALM_UPDATE_BATCH
+            last_id = 0
+            while True:
+                rows = db(query & (table._id > last_id)).select(
+                                                        limitby = (0, batch_size),
+                                                        orderby = table._id,
+                                                        *fields)
+                if not rows:
+                    break
+                realms = {}
+                for row in rows:
+                    realm_entity = get_realm_entity(table, row, entity=entity)
+                    realms.setdefault(realm_entity, []).append(row[table._id])
+                for realm_entity, record_ids in realms.items():
+                    update(table._id.belongs(record_ids), realm_entity)
+                last_id = rows.last()[table._id]
+                done += len(rows)
+                if progress:
+                    progress(done, total)
+
+        return done
+
     # -------------------------------------------------------------------------
     @staticmethod
     def get_realm_entity(table, record, entity=0):
@@ -5792,6 +6002,9 @@ class S3Permission:
                "publish": PUBLISH,
                }
 
+    # Process-wide cache for compiled ACLs
+    _acl_cache = None
+
     # -------------------------------------------------------------------------
     def __init__(self, auth, tablename=None):
         """
@@ -5852,10 +6065,13 @@ class S3Permission:
         # Settings
         self.record_approval = settings.get_auth_record_approval()
         self.strict_ownership = settings.get_security_strict_ownership()
+        self.simplify = settings.get_auth_simplify_realm_queries()
 
         # Initialize cache
         self.permission_cache = {}
         self.query_cache = {}
+        self.acl_version = None
+        self.realms_key = None
 
         # Pages which never require permission:
         # Make sure that any data access via these pages uses
@@ -5880,6 +6096,70 @@ class S3Permission:
 
         self.permission_cache = {}
         self.query_cache = {}
+        self.acl_version = None
+        self.realms_key = None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def acl_cache(cls):
+        """
+            Get the process-wide cache for compiled ACLs
+
+            Returns:
+                S3LRUCache, or None if disabled by deployment setting
+        """
+
+        cache = S3Permission._acl_cache
+        if cache is None:
+            maxsize = current.deployment_settings.get_auth_acl_cache()
+            if maxsize:
+                cache = S3Permission._acl_cache = S3LRUCache(maxsize=maxsize)
+        return cache
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear_acl_cache(cls):
+        """ Remove all compiled ACLs from the process-wide cache """
+
+        cache = S3Permission._acl_cache
+        if cache is not None:
+            cache.clear()
+
+    # -------------------------------------------------------------------------
+    def acl_signature(self, realms):
+        """
+            Get a canonical signature of the permission situation of
+            the current user, as key for the process-wide ACL cache
+
+            Args:
+                realms: the realms of the user {group_id: [pe_id, ...]}
+
+            Returns:
+                tuple (ACL version, roles and realms)
+
+            Note:
+                The ACL version changes with any update of the permission
+                table, thus makes sure that ACLs compiled before the
+                update are no longer used (also in other processes)
+        """
+
+        version = self.acl_version
+        if version is None:
+            table = self.table
+            count, latest = table.id.count(), table.modified_on.max()
+            row = current.db(table.id > 0).select(count, latest).first()
+            version = self.acl_version = (row[count], row[latest])
+
+        realms_key = self.realms_key
+        if realms_key is None or realms_key[0] is not realms or \
+           realms_key[1] != len(realms):
+            signature = tuple(sorted((group_id,
+                                      tuple(sorted(realm)) if realm is not None else None,
+                                      )
+                                     for group_id, realm in realms.items()))
+            realms_key = self.realms_key = (realms, len(realms), signature)
+
+        return (self.policy, version, realms_key[2])
 
     # -------------------------------------------------------------------------
     def check_settings(self):
@@ -6037,6 +6317,7 @@ class S3Permission:
         if "restricted_tables" in s3:
             del s3["restricted_tables"]
         self.clear_cache()
+        self.clear_acl_cache()
 
         if c is None and f is None and t is None:
             return None
@@ -6300,7 +6581,8 @@ class S3Permission:
                     user,
                     use_realm = True,
                     realm = None,
-                    no_realm = None
+                    no_realm = None,
+                    realm_public = False,
                     ):
         """
             Returns a query to select the records in table owned by user
@@ -6311,6 +6593,10 @@ class S3Permission:
                 use_realm: use realms
                 realm: limit owner access to these realms
                 no_realm: don't include these entities in role realms
+                realm_public: the caller's query already includes all
+                              records in the no_realm entities and all
+                              records without realm entity (only used
+                              to simplify the query)
 
             Returns:
                 a web2py Query instance, or None if no query can be constructed
@@ -6340,11 +6626,17 @@ class S3Permission:
             use_realm = use_realm and \
                         OENT in table.fields and self.entity_realm
 
+            simplify = self.simplify
+            realm_public = simplify and realm_public and use_realm
+
             # Individual owner query
             if OUSR in table.fields:
                 user_id = user.id
                 query = (table[OUSR] == user_id)
                 if use_realm:
+                    if realm and realm_public and "ANY" not in realm:
+                        # Skip realms already covered by the caller
+                        realm = sorted(set(realm) - no_realm)
                     # Limit owner access to permitted realms
                     if realm:
                         realm_query = self.realm_query(table, realm)
@@ -6353,7 +6645,7 @@ class S3Permission:
                     else:
                         query = None
 
-            if not self.strict_ownership:
+            if not self.strict_ownership and not realm_public:
                 # Any authenticated user owns all records with no owner
                 public = None
                 if OUSR in table.fields:
@@ -6382,6 +6674,7 @@ class S3Permission:
                 any_entity = set()
                 g = None
                 user_realms = user.realms
+                merged = {}
                 for group_id in user_realms:
 
                     role_realm = user_realms[group_id]
@@ -6392,12 +6685,22 @@ class S3Permission:
 
                     role_realm = set(role_realm) - no_realm
 
-                    if role_realm:
+                    if role_realm and simplify:
+                        # Merge roles with identical realms
+                        merged.setdefault(frozenset(role_realm), []).append(group_id)
+                    elif role_realm:
                         q = (table[OGRP] == group_id) & (table[OENT].belongs(role_realm))
                         if g is None:
                             g = q
                         else:
                             g |= q
+                for role_realm, group_ids in merged.items():
+                    q = self.belongs(table[OGRP], group_ids) & \
+                        self.belongs(table[OENT], role_realm)
+                    if g is None:
+                        g = q
+                    else:
+                        g |= q
                 if any_entity:
                     q = (table[OGRP].belongs(any_entity))
                     if g is None:
@@ -6412,6 +6715,28 @@ class S3Permission:
 
         return query
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def belongs(field, values):
+        """
+            Returns a normalized query for field values in a set, i.e.
+            duplicates removed, and values sorted so that equivalent
+            queries produce the same SQL
+
+            Args:
+                field: the Field
+                values: iterable of values
+
+            Returns:
+                a web2py Query instance
+        """
+
+        values = sorted(set(values))
+        if len(values) == 1:
+            return (field == values[0])
+        else:
+            return (field.belongs(values))
+
     # -------------------------------------------------------------------------
     @staticmethod
     def realm_query(table, entities):
@@ -7084,6 +7409,7 @@ class S3Permission:
         return permitted
 
     # -------------------------------------------------------------------------
+    @s3_profiled("acl")
     def accessible_query(self, method, table, c=None, f=None, deny=True):
         """
             Returns a query to select the accessible records for method
@@ -7252,6 +7578,8 @@ class S3Permission:
             check_owner_acls = False
 
         elif uacls:
+            if self.simplify:
+                uacls = sorted(set(uacls))
             query = self.realm_query(table, uacls)
             if query is None:
                 #_debug("==> permitted for any records")
@@ -7269,6 +7597,7 @@ class S3Permission:
                                            use_realm = use_realm,
                                            realm = oacls,
                                            no_realm = no_realm,
+                                           realm_public = bool(no_realm),
                                            )
 
             if owner_query is not None:
@@ -7279,7 +7608,10 @@ class S3Permission:
                     query = owner_query
             elif use_realm:
                 #_debug("==> permitted for any records owned by entities %s", str(uacls+oacls))
-                query = self.realm_query(table, uacls+oacls)
+                entities = uacls + oacls
+                if self.simplify:
+                    entities = sorted(set(entities))
+                query = self.realm_query(table, entities)
 
             if query is not None and requires_approval:
                 base_filter = None if approved and unapproved else \
@@ -7296,6 +7628,66 @@ class S3Permission:
         query_cache[key] = query
         return query
 
+    # -------------------------------------------------------------------------
+    def explain(self, method, table, c=None, f=None):
+        """
+            Inspect the accessible-query for the current user, i.e. the
+            SQL it generates and the query plan of the database, e.g. to
+            tune indexes for the queries ACLs actually produce
+
+            Args:
+                method: the method as string or a list of methods (AND)
+                table: the database table or table name
+                c: controller name (falls back to current request)
+                f: function name (falls back to current request)
+
+            Returns:
+                a dict {"tablename": the table name,
+                        "method": the method,
+                        "simplified": whether realm predicates are simplified,
+                        "query": the accessible-query as string,
+                        "sql": the SQL,
+                        "plan": the query plan as list of strings,
+                        }
+        """
+
+        db = current.db
+
+        if not hasattr(table, "_tablename"):
+            tablename = table
+            error = AttributeError("undefined table %s" % tablename)
+            table = current.s3db.table(tablename,
+                                       db_only = True,
+                                       default = error,
+                                       )
+
+        query = self.accessible_query(method, table, c=c, f=f)
+        sql = db(query)._select(table._id)
+
+        dbname = db._dbname
+        if dbname == "sqlite":
+            explain = "EXPLAIN QUERY PLAN %s"
+        else:
+            explain = "EXPLAIN %s"
+        try:
+            rows = db.executesql(explain % sql.rstrip(";"))
+        except Exception:
+            plan = ["Query plan not available: %s" % sys.exc_info()[1]]
+        else:
+            if dbname == "sqlite":
+                # Only the detail column is relevant
+                plan = [s3_str(row[-1]) for row in rows]
+            else:
+                plan = [" ".join(s3_str(col) for col in row) for row in rows]
+
+        return {"tablename": original_tablename(table),
+                "method": method,
+                "simplified": bool(self.simplify),
+                "query": str(query),
+                "sql": sql,
+                "plan": plan,
+                }
+
     # -------------------------------------------------------------------------
     def accessible_url(self,
                        c = None,
@@ -7392,6 +7784,7 @@ class S3Permission:
     # -------------------------------------------------------------------------
     # ACL Lookup
     # -------------------------------------------------------------------------
+    @s3_profiled("acl")
     def applicable_acls(self, racl,
                         realms = None,
                         c = None,
@@ -7421,21 +7814,120 @@ class S3Permission:
         if not self.use_cacls:
             # We do not use ACLs at all (allow all)
             return None
+
+        if not realms:
+            # No roles available (deny all)
+            return {}
+
+        c = c or self.controller
+        f = f or self.function
+
+        # Be sure to use the original table name
+        if t and hasattr(t, "_tablename"):
+            t = original_tablename(t)
+
+        # Get the compiled ACLs (from the process-wide cache if possible)
+        cache = self.acl_cache()
+        if cache is not None:
+            key = (self.acl_signature(realms), c, f, t)
+            compiled = cache(key, lambda: self.compile_acls(realms, c, f, t))
         else:
-            acls = {}
+            compiled = self.compile_acls(realms, c, f, t)
+
+        acls, page_restricted, table_restricted, \
+        default_page_acl, default_table_acl = compiled
+
+        ANY = "ANY"
+        ALL = (self.ALL, self.ALL)
+
+        most_permissive = lambda x, y: (x[0] | y[0], x[1] | y[1])
+        most_restrictive = lambda x, y: (x[0] & y[0], x[1] & y[1])
+
+        # Order by precedence
+        s3db = current.s3db
+        ancestors = set()
+        if entity and self.entity_hierarchy and \
+           s3db.pr_instance_type(entity) == "pr_person":
+            # If the realm entity is a person, then we apply the ACLs
+            # for the immediate OU ancestors, for two reasons:
+            # a) it is not possible to assign roles for personal realms anyway
+            # b) looking up OU ancestors of a person (=a few) is much more
+            #    efficient than looking up pr_person OU descendants of the
+            #    role realm (=could be tens or hundreds of thousands)
+            ancestors = set(s3db.pr_default_realms(entity))
+
+        result = {}
+        for e in acls:
+            # Skip irrelevant ACLs
+            if entity and e != entity and e != ANY:
+                if e in ancestors:
+                    key = entity
+                else:
+                    continue
+            else:
+                key = e
+
+            acl = acls[e]
+
+            # Get the page ACL
+            if "f" in acl:
+                page_acl = most_permissive(default_page_acl, acl["f"])
+            elif "c" in acl:
+                page_acl = most_permissive(default_page_acl, acl["c"])
+            elif page_restricted:
+                page_acl = default_page_acl
+            else:
+                page_acl = ALL
+
+            # Get the table ACL
+            if "t" in acl:
+                table_acl = most_permissive(default_table_acl, acl["t"])
+            elif table_restricted:
+                table_acl = default_table_acl
+            else:
+                table_acl = ALL
+
+            # Merge
+            acl = most_restrictive(page_acl, table_acl)
+
+            # Include ACL if relevant
+            if acl[0] & racl == racl or acl[1] & racl == racl:
+                result[key] = acl
+
+        #for pe in result:
+        #    import sys
+        #    sys.stderr.write("ACL for PE %s: %04X %04X\n" %
+        #                        (pe, result[pe][0], result[pe][1]))
+
+        return result
+
+    # -------------------------------------------------------------------------
+    def compile_acls(self, realms, c, f, t):
+        """
+            Retrieve and cascade all ACLs for the roles and realms of
+            the user in the specified situation (independent of the
+            required ACL and the realm entity of a particular record)
+
+            Args:
+                realms: the realms
+                c: the controller name
+                f: the function name
+                t: the tablename
+
+            Returns:
+                tuple (acls, page_restricted, table_restricted,
+                       default_page_acl, default_table_acl), where
+                acls is a dict {entity: {rule_type: (uacl, oacl)}}
+        """
+
+        acls = {}
 
         # Get all roles
-        if realms:
-            roles = set(realms.keys())
-        else:
-            # No roles available (deny all)
-            return acls
+        roles = set(realms.keys())
 
         db = current.db
         table = self.table
 
-        c = c or self.controller
-        f = f or self.function
         page_restricted = self.page_restricted(c=c, f=f)
 
         # Base query
@@ -7453,9 +7945,6 @@ class S3Permission:
 
         # Table ACLs
         if t and self.use_tacls:
-            # Be sure to use the original table name
-            if hasattr(t, "_tablename"):
-                t = original_tablename(t)
             tq = (table.tablename == t) & \
                  (table.controller == None) & \
                  (table.function == None)
@@ -7498,7 +7987,6 @@ class S3Permission:
             return None
 
         most_permissive = lambda x, y: (x[0] | y[0], x[1] | y[1])
-        most_restrictive = lambda x, y: (x[0] & y[0], x[1] & y[1])
 
         # Realms
         use_realms = self.entity_realm
@@ -7568,63 +8056,12 @@ class S3Permission:
             elif not page_restricted:
                 acls[ANY] = {"c": default_page_acl}
 
-        # Order by precedence
-        s3db = current.s3db
-        ancestors = set()
-        if entity and self.entity_hierarchy and \
-           s3db.pr_instance_type(entity) == "pr_person":
-            # If the realm entity is a person, then we apply the ACLs
-            # for the immediate OU ancestors, for two reasons:
-            # a) it is not possible to assign roles for personal realms anyway
-            # b) looking up OU ancestors of a person (=a few) is much more
-            #    efficient than looking up pr_person OU descendants of the
-            #    role realm (=could be tens or hundreds of thousands)
-            ancestors = set(s3db.pr_default_realms(entity))
-
-        result = {}
-        for e in acls:
-            # Skip irrelevant ACLs
-            if entity and e != entity and e != ANY:
-                if e in ancestors:
-                    key = entity
-                else:
-                    continue
-            else:
-                key = e
-
-            acl = acls[e]
-
-            # Get the page ACL
-            if "f" in acl:
-                page_acl = most_permissive(default_page_acl, acl["f"])
-            elif "c" in acl:
-                page_acl = most_permissive(default_page_acl, acl["c"])
-            elif page_restricted:
-                page_acl = default_page_acl
-            else:
-                page_acl = ALL
-
-            # Get the table ACL
-            if "t" in acl:
-                table_acl = most_permissive(default_table_acl, acl["t"])
-            elif table_restricted:
-                table_acl = default_table_acl
-            else:
-                table_acl = ALL
-
-            # Merge
-            acl = most_restrictive(page_acl, table_acl)
-
-            # Include ACL if relevant
-            if acl[0] & racl == racl or acl[1] & racl == racl:
-                result[key] = acl
-
-        #for pe in result:
-        #    import sys
-        #    sys.stderr.write("ACL for PE %s: %04X %04X\n" %
-        #                        (pe, result[pe][0], result[pe][1]))
-
-        return result
+        return (acls,
+                page_restricted,
+                table_restricted,
+                default_page_acl,
+                default_table_acl,
+                )
 
     # -------------------------------------------------------------------------
     # Utilities
@@ -1525,6 +1525,22 @@ class S3CRUD(S3Method):
             start = None
             limit = None if s3.no_sspag else 0
 
+        # Keyset pagination
+        keyset = get_config(tablename,
+                            "keyset_pagination",
+                            current.deployment_settings.get_base_keyset_pagination(),
+                            )
+        seek = None
+        if keyset and not s3.no_sspag:
+            if representation == "aadata":
+                seek = self._seek(get_vars)
+            else:
+                # First page
+                seek = []
+
+        # Estimated record counts (exact count requested separately)
+        estimate = current.deployment_settings.get_base_count_estimate()
+
         # Linkto
         #linkto = get_config(tablename, "linkto", None)
         #if not linkto:
@@ -1572,7 +1588,8 @@ class S3CRUD(S3Method):
                                                left = left,
                                                orderby = orderby,
                                                distinct = False,
-                                                                 
+                                               seek = seek,
+                                               estimate = estimate,
                                                )
             displayrows = totalrows
 
@@ -1633,6 +1650,18 @@ class S3CRUD(S3Method):
             if orderby is None:
                 orderby = get_config(tablename, "orderby", None)
 
+            # Exact count only (follow-up for estimated counts)
+            draw = int(get_vars.get("draw", 0))
+            if get_vars.get("count") == "exact":
+                displayrows = resource.count(left=left)
+                if totalrows is None:
+                    totalrows = displayrows
+                return json.dumps({"recordsTotal": totalrows,
+                                   "recordsFiltered": displayrows,
+                                   "dataTable_id": list_id,
+                                   "draw": draw,
+                                   })
+
             # Get a data table
             if totalrows != 0:
                 dt, displayrows = resource.datatable(fields = list_fields,
@@ -1641,15 +1670,14 @@ class S3CRUD(S3Method):
                                                      left = left,
                                                      orderby = orderby,
                                                      distinct = False,
+                                                     seek = seek,
+                                                     estimate = estimate,
                                                      )
             else:
                 dt, displayrows = None, 0
             if totalrows is None:
                 totalrows = displayrows
 
-            # Echo
-            draw = int(get_vars.get("draw", 0))
-
             # Representation
             if dt is not None:
                 output = dt.json(totalrows,
@@ -2899,6 +2927,34 @@ class S3CRUD(S3Method):
                 except ValueError:
                     pass
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _seek(get_vars):
+        """
+            Extract the last-seen sort key for keyset pagination
+            from GET vars
+
+            Args:
+                get_vars: the GET vars
+
+            Returns:
+                the sort key (list), or None if not present or invalid
+                (=fall back to OFFSET pagination)
+        """
+
+        seek = get_vars.get("seek")
+        if isinstance(seek, list):
+            seek = seek[-1]
+        if not seek:
+            return None
+
+        try:
+            seek = json.loads(seek)
+        except (ValueError, TypeError):
+            return None
+
+        return seek if isinstance(seek, list) else None
+
     # -------------------------------------------------------------------------
     @staticmethod
     def _limits(get_vars, default_limit=0):
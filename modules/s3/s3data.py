@@ -64,6 +64,8 @@ class S3DataTable:
                  filterString = None,
                  orderby = None,
                  empty = False,
+                 seek = None,
+                 estimated = False,
                  ):
         """
             Args:
@@ -74,11 +76,20 @@ class S3DataTable:
                 limit: the (maximum) number of records to return
                 filterString: The string that was used in filtering the records
                 orderby: the DAL orderby construct
+                empty: the table is empty (rather than no record matching
+                       the filter)
+                seek: the sort key of the last record in data, for keyset
+                      pagination (passed back by the client with the request
+                      for the subsequent page)
+                estimated: the total number of records is an estimate (the
+                           client will request the exact number separately)
         """
 
         self.data = data
         self.rfields = rfields
         self.empty = empty
+        self.seek = seek
+        self.estimated = estimated
 
         colnames = []
         heading = {}
@@ -286,6 +297,7 @@ class S3DataTable:
                    '''i18n.emptyTable="%s"''' % T("No records found"), #T("No data available in table"),
                    '''i18n.info="%s"''' % T("Showing _START_ to _END_ of _TOTAL_ entries"),
                    '''i18n.infoEmpty="%s"''' % T("Showing 0 to 0 of 0 entries"),
+                   '''i18n.infoEstimated="%s"''' % T("Showing _START_ to _END_ of about _TOTAL_ entries"),
                    '''i18n.infoFiltered="%s"''' % T("(filtered from _MAX_ total entries)"),
                    '''i18n.infoThousands="%s"''' % current.deployment_settings.get_L10n_thousands_separator(),
                    '''i18n.lengthMenu="%s"''' % (T("Show %(number)s entries") % {"number": "_MENU_"}),
@@ -850,6 +862,10 @@ class S3DataTable:
         structure["dataTable_filter"] = self.filterString
         structure["dataTable_groupTotals"] = attr.get("dt_group_totals", [])
         structure["dataTable_sort"] = self.orderby
+        if self.seek is not None:
+            structure["dataTable_seek"] = self.seek
+        if self.estimated:
+            structure["recordsEstimated"] = True
         structure["data"] = aadata
         structure["recordsTotal"] = totalrows
         structure["recordsFiltered"] = displayrows
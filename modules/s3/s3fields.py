@@ -42,7 +42,8 @@ from gluon.languages import lazyT
 from s3dal import SQLCustomType
 from .s3datetime import S3DateTime
 from .s3navigation import S3ScriptItem
-from .s3utils import NONE, s3_str, S3MarkupStripper
+from .s3profiler import s3_profiled
+from .s3utils import NONE, s3_str, S3LRUCache, S3MarkupStripper
 from .s3validators import IS_ISO639_2_LANGUAGE_CODE, IS_ONE_OF, IS_UTC_DATE, IS_UTC_DATETIME
 from .s3widgets import S3CalendarWidget, S3DateWidget
 
@@ -208,8 +209,23 @@ class S3Represent:
                                                     link
         @group Internal Methods: _setup,
                                  _lookup
+        @group Shared Cache: cache,
+                             cache_key,
+                             cache_stats,
+                             clear_cache,
+                             invalidator
     """
 
+    # Share representations of lookup rows between requests
+    # (in subclasses which can safely do so, see cache_key)
+    # - the models of the lookup table and of any other tables the
+    #   representations depend on must invalidate the cache when
+    #   records are changed (see clear_cache and invalidator)
+    shared = False
+
+    # Process-wide cache of representations, see cache()
+    _cache = None
+
     def __init__(self,
                  lookup = None,
                  key = None,
@@ -274,6 +290,8 @@ class S3Represent:
         self.slabels = None
         self.htemplate = None
 
+        self.shared_key = None
+
         # Attributes to simulate being a function for sqlhtml's count_expected_args()
         # Make sure we indicate only 1 position argument
         self.__code__ = Storage(co_argcount = 1)
@@ -494,6 +512,7 @@ class S3Represent:
         return self.none
 
     # -------------------------------------------------------------------------
+    @s3_profiled("represent")
     def bulk(self, values, rows=None, list_type=True, show_link=True):
         """
             Represent multiple values as dict {value: representation}
@@ -643,6 +662,10 @@ class S3Represent:
         else:
             self.htemplate = "%s > %s"
 
+        # Shared cache
+        if self.shared and self.table is not None and self.cache() is not None:
+            self.shared_key = self.cache_key()
+
         self.setup = True
 
     # -------------------------------------------------------------------------
@@ -731,6 +754,16 @@ class S3Represent:
                 if pop(k, None):
                     items[keys.get(k, k)] = theset[k]
 
+        # Look up remaining values in the shared cache
+        shared_key = self.shared_key
+        if lookup and shared_key is not None:
+            cache = self.cache()
+            for k in list(lookup.keys()):
+                v = cache.get(shared_key + (k,))
+                if v is not None:
+                    pop(k, None)
+                    items[keys.get(k, k)] = theset[k] = v
+
         # Retrieve additional rows as needed
         if lookup:
             if not self.custom_lookup:
@@ -760,6 +793,14 @@ class S3Represent:
                     lookup.pop(k, None)
                     items[keys.get(k, k)] = theset[k] = represent_row(row)
 
+                # Store the new representations in the shared cache
+                if shared_key is not None:
+                    cache = self.cache()
+                    for k in rows:
+                        v = theset.get(k)
+                        if isinstance(v, (str, lazyT)):
+                            cache.set(shared_key + (k,), s3_str(v))
+
         # Anything left gets set to default
         if lookup:
             for k in lookup:
@@ -767,6 +808,139 @@ class S3Represent:
 
         return items
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def cache(cls):
+        """
+            Get the process-wide cache for representations
+
+            Returns:
+                S3LRUCache, or None if disabled by deployment setting
+        """
+
+        cache = S3Represent._cache
+        if cache is None:
+            settings = current.deployment_settings
+            maxsize = settings.get_base_represent_cache()
+            if maxsize:
+                cache = S3Represent._cache = S3LRUCache(
+                            maxsize = maxsize,
+                            ttl = settings.get_base_represent_cache_ttl(),
+                            )
+        return cache
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def cache_stats(cls):
+        """
+            Get the hit/miss statistics of the representation cache
+
+            Returns:
+                dict {size, maxsize, hits, misses, ratio}, or None
+                if the cache is disabled
+        """
+
+        cache = cls.cache()
+        return cache.stats() if cache is not None else None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear_cache(cls, tablename=None):
+        """
+            Remove representations from the cache
+
+            Args:
+                tablename: remove only the representations of records
+                           in this lookup table, None to clear the cache
+                           entirely
+        """
+
+        cache = S3Represent._cache
+        if cache is None:
+            return
+        if tablename:
+            cache.clear(condition=lambda key: key[0] == tablename)
+        else:
+            cache.clear()
+
+    # -------------------------------------------------------------------------
+    def cache_key(self):
+        """
+            Get the key prefix for the representations of this instance
+            in the shared cache, must reflect all parameters that affect
+            the result of represent_row; to be extended in subclasses
+            with additional parameters
+
+            Returns:
+                the key prefix (tuple), or None if the representations
+                can not be shared (e.g. with hierarchical representation,
+                or with row-dependent links)
+        """
+
+        if self.options is not None or self.hierarchy:
+            return None
+
+        # Links requiring the row can't be rendered from cache
+        if self.show_link and \
+           type(self).link is not S3Represent.link:
+            return None
+
+        # Callable labels must be module-level functions
+        labels = self.labels
+        if callable(labels):
+            name = getattr(labels, "__qualname__", "<")
+            if "<" in name:
+                return None
+            labels = "%s.%s" % (labels.__module__, name)
+        elif labels is not None:
+            labels = s3_str(labels)
+
+        fields = tuple(self.fields) if self.fields else ()
+
+        return (self.tablename,
+                self.key,
+                "%s.%s" % (type(self).__module__, type(self).__name__),
+                current.session.s3.language,
+                fields,
+                labels,
+                bool(self.translate),
+                self.field_sep,
+                s3_str(self.default),
+                s3_str(self.none),
+                )
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def invalidator(cls, *tablenames):
+        """
+            Get a callback to remove the representations of records in
+            lookup tables from the shared cache, to configure as onaccept
+            and ondelete of the tables the representations depend on
+
+            Args:
+                tablenames: the names of the lookup tables
+
+            Returns:
+                the callback function
+
+            Example:
+                self.configure("org_organisation_name",
+                               onaccept = S3Represent.invalidator("org_organisation"),
+                               ondelete = S3Represent.invalidator("org_organisation"),
+                               )
+
+            Note:
+                The shared cache is per-process, so changes by other
+                processes only take effect when the entries expire
+                (see settings.base.represent_cache_ttl)
+        """
+
+        def invalidate(form):
+            for tablename in tablenames:
+                cls.clear_cache(tablename)
+
+        return invalidate
+
     # -------------------------------------------------------------------------
     def _represent_path(self, value, row, rows=None, hierarchy=None):
         """
@@ -807,6 +981,11 @@ class S3RepresentLazy:
     """
         Lazy Representation of a field value, utilizes the bulk-feature
         of S3Represent-style representation methods
+
+        Pending values of all S3Represent instances with the same lookup
+        table are registered per request, and resolved together (with a
+        single query) when the first of them gets rendered, see
+        resolve_pending
     """
 
     def __init__(self, value, renderer):
@@ -820,7 +999,11 @@ class S3RepresentLazy:
         self.renderer = renderer
 
         self.multiple = False
-        renderer.lazy.append(value)
+
+        lazy = renderer.lazy
+        if not lazy and isinstance(renderer, S3Represent):
+            self.register(renderer)
+        lazy.append(value)
 
     # -------------------------------------------------------------------------
     def __repr__(self):
@@ -834,6 +1017,7 @@ class S3RepresentLazy:
         value = self.value
         renderer = self.renderer
         if renderer.lazy:
+            self.resolve_pending(renderer)
             labels = renderer.bulk(renderer.lazy, show_link=False)
             renderer.lazy = []
         else:
@@ -856,6 +1040,7 @@ class S3RepresentLazy:
         value = self.value
         renderer = self.renderer
         if renderer.lazy:
+            self.resolve_pending(renderer)
             labels = renderer.bulk(renderer.lazy)
             renderer.lazy = []
         else:
@@ -875,6 +1060,115 @@ class S3RepresentLazy:
             else:
                 return renderer(value)
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def register(renderer):
+        """
+            Register a renderer with pending lazy values for the
+            current request
+
+            Args:
+                renderer: the S3Represent instance
+        """
+
+        tablename = renderer.tablename
+        if not tablename:
+            return
+
+        s3 = current.response.s3
+        pending = s3.represent_pending
+        if pending is None:
+            pending = s3.represent_pending = {}
+
+        renderers = pending.get(tablename)
+        if renderers is None:
+            pending[tablename] = [renderer]
+        elif renderer not in renderers:
+            renderers.append(renderer)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def resolve_pending(renderer):
+        """
+            Look up the rows for the pending lazy values of all renderers
+            with the same lookup table as renderer, with a single query,
+            and pass them to the renderers - so that each renderer can
+            then bulk-represent its values without further queries
+
+            Args:
+                renderer: the S3Represent instance to render values for
+
+            Note:
+                Renderers with custom lookup methods can not share rows,
+                and are left to resolve their pending values themselves
+        """
+
+        pending = current.response.s3.represent_pending
+        if not pending:
+            return
+        renderers = pending.pop(renderer.tablename, None)
+        if not renderers or len(renderers) < 2:
+            return
+
+        # Group renderers by key
+        groups = {}
+        for r in renderers:
+            if not r.lazy or r.custom_lookup:
+                continue
+            r._setup()
+            if r.table is None or r.key not in r.table.fields:
+                continue
+            if r.key in groups:
+                groups[r.key].append(r)
+            else:
+                groups[r.key] = [r]
+
+        db = current.db
+        for key, group in groups.items():
+            if len(group) < 2:
+                continue
+            table = group[0].table
+
+            # Collect the values to look up, and the fields to retrieve
+            values = {}
+            all_values = set()
+            fields = {key}
+            for r in group:
+                lazy = r.lazy
+                if r.list_type:
+                    lazy = chain.from_iterable(v for v in lazy
+                                               if isinstance(v, (list, tuple)))
+                theset = r.theset
+                missing = {v for v in lazy if v is not None and v not in theset}
+
+                # Use the shared cache where possible
+                shared_key = r.shared_key
+                if shared_key is not None and missing:
+                    cache = r.cache()
+                    for v in list(missing):
+                        label = cache.get(shared_key + (v,))
+                        if label is not None:
+                            theset[v] = label
+                            missing.discard(v)
+
+                values[r] = missing
+                all_values |= missing
+                fields.update(fn for fn in r.fields if fn in table.fields)
+            if not all_values:
+                continue
+
+            # Look up all rows at once
+            key_field = table[key]
+            query = key_field.belongs(all_values)
+            rows = db(query).select(*[table[fn] for fn in fields])
+            rows = {row[key]: row for row in rows}
+
+            # Let each renderer represent its rows
+            for r in group:
+                found = [v for v in values[r] if v in rows]
+                if found:
+                    r._lookup(found, rows=[rows[v] for v in found])
+
     # -------------------------------------------------------------------------
     def render_node(self, element, attributes, name):
         """
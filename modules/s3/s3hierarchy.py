@@ -573,6 +573,7 @@ class S3Hierarchy:
             self.__connect()
         if self.__status("dirty"):
             self.read()
+            self.save()
         return self.__theset
 
     # -------------------------------------------------------------------------
@@ -597,6 +598,21 @@ class S3Hierarchy:
                 return s3db.get_config(tablename, "hierarchy")
         return None
 
+    # -------------------------------------------------------------------------
+    @property
+    def closure(self):
+        """
+            Whether the hierarchy maintains a closure table to resolve
+            subtrees in the database, configured per table like:
+
+                s3db.configure(tablename, hierarchy_closure=True)
+        """
+
+        tablename = self.tablename
+        if tablename and self.config:
+            return bool(current.s3db.get_config(tablename, "hierarchy_closure"))
+        return False
+
     # -------------------------------------------------------------------------
     @property
     def nodes(self):
@@ -748,9 +764,29 @@ class S3Hierarchy:
                                         "c": item["c"],
                                         "s": set(item["s"]) \
                                              if item["s"] else set()}
+
+            # Has the table changed since the hierarchy was stored?
+            snapshot = self.__snapshot()
+            if not snapshot or data.get("checksum") != list(snapshot[0]):
+                # Rebuild
+                self.__status(dirty = True,
+                              dbupdate = None,
+                              dbstatus = True)
+                return
+
             self.__status(dirty = False,
                           dbupdate = None,
-                          dbstatus = True)
+                          dbstatus = True,
+                          snapshot = snapshot,
+                          )
+
+            closure = self.closure
+            if closure and not data.get("closure"):
+                # Closure table not built yet
+                self.__status(dbupdate = True, reindex = True)
+                self.save()
+            elif closure:
+                self.__status(closure = True)
             return
         else:
             self.__status(dirty = True,
@@ -770,6 +806,11 @@ class S3Hierarchy:
         if not self.__status("dbupdate"):
             return
 
+        # The state of the hierarchical table the nodes reflect
+        snapshot = self.__status("snapshot")
+        if not snapshot:
+            return
+
         # Serialize the theset
         nodes_dict = {}
         for node_id, node in theset.items():
@@ -779,28 +820,44 @@ class S3Hierarchy:
                                         if node["s"] else []}
 
         # Generate record
+        checksum, timestamp = snapshot
+        closure = self.closure
         data = {"tablename": tablename,
                 "dirty": False,
-                "hierarchy": {"nodes": nodes_dict}
+                "hierarchy": {"nodes": nodes_dict,
+                              "checksum": list(checksum),
+                              "closure": closure,
+                              },
                 }
 
         # Get current entry
         htable = current.s3db.s3_hierarchy
         row = current.db(htable.tablename == tablename).select(htable.id,
+                                                               htable.modified_on,
                                                                limitby = (0, 1),
                                                                ).first()
 
         if row:
+            if row.modified_on and row.modified_on > timestamp:
+                # Changed (e.g. marked dirty) since we have read the
+                # hierarchy => do not override
+                return
             # Update record
             row.update_record(**data)
         else:
             # Create new record
             htable.insert(**data)
 
+        # Update the closure table
+        if closure:
+            self.__reindex(self.__status("reindex"))
+
         # Update status
         self.__status(dirty = False,
                       dbupdate = None,
                       dbstatus = True,
+                      reindex = None,
+                      closure = True if closure else None,
                       )
 
     # -------------------------------------------------------------------------
@@ -833,6 +890,7 @@ class S3Hierarchy:
                                       }
 
         flags["dirty"] = True
+        flags.pop("closure", None)
 
         dbstatus = flags.get("dbstatus", True)
         if dbstatus:
@@ -850,6 +908,32 @@ class S3Hierarchy:
                 row.update_record(dirty = True)
             flags["dbstatus"] = False
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def create_indexes():
+        """
+            Create indexes for the s3_hierarchy_closure table, for faster
+            subtree lookups
+        """
+
+        dbtype = current.deployment_settings.get_database_type()
+
+        if dbtype in ("postgres", "sqlite"):
+            sql = "CREATE INDEX IF NOT EXISTS %(index)s ON %(table)s (%(fields)s);"
+        else:
+            return
+
+        table = current.s3db.s3_hierarchy_closure
+        names = {"table": table._tablename}
+
+        db = current.db
+        for fname in ("ancestor", "descendant"):
+            names["fields"] = "tablename, %s" % fname
+            names["index"] = "%(table)s_%(fname)s_idx" % {"table": names["table"],
+                                                          "fname": fname,
+                                                          }
+            db.executesql(sql % names)
+
     # -------------------------------------------------------------------------
     def read(self):
         """ Rebuild this hierarchy from the target table """
@@ -869,6 +953,9 @@ class S3Hierarchy:
         if ckey is not None:
             fields.append(table[ckey])
 
+        # Capture the state of the table
+        snapshot = self.__snapshot()
+
         if "deleted" in table:
             query = (table.deleted == False)
         else:
@@ -892,12 +979,128 @@ class S3Hierarchy:
         # Update status: memory is clean, db needs update
         self.__status(dirty = False,
                       dbupdate = True,
+                      snapshot = snapshot,
+                      reindex = True,
                       )
 
         # Remove subset
         self.__roots = None
         self.__nodes = None
 
+    # -------------------------------------------------------------------------
+    def __snapshot(self):
+        """
+            Capture the current state of the hierarchical table (and
+            link table), to detect subsequent changes
+
+            Returns:
+                tuple (checksum, timestamp) with the checksum of the
+                table(s) and the current time
+
+            Note:
+                The checksum consists of the number of (undeleted) records
+                and the maximum record ID of each table, and the sums of
+                their integer parent/category keys (to detect moves), all
+                obtained with a single aggregate query per table; changes
+                of non-integer categories are not detected, so these still
+                require an explicit dirty()
+        """
+
+        s3db = current.s3db
+        db = current.db
+
+        table = s3db[self.tablename]
+        ckey = self.ckey
+        keys = [table[ckey]] if ckey is not None else []
+        tables = [(table, keys)]
+
+        fname = self.fkey.name
+        link = self.link
+        if link:
+            ltable = s3db[link]
+            tables.append((ltable, [ltable[self.lkey], ltable[fname]]))
+        else:
+            keys.append(table[fname])
+
+        checksum = []
+        for t, fields in tables:
+            aggregates = [t._id.count(), t._id.max()]
+            aggregates.extend(field.sum() for field in fields
+                              if str(field.type) == "integer" or
+                                 str(field.type)[:9] == "reference")
+            if "deleted" in t.fields:
+                query = (t.deleted == False)
+            else:
+                query = (t._id > 0)
+            row = db(query).select(*aggregates).first()
+            for aggregate in aggregates:
+                value = row[aggregate] if row else None
+                checksum.append(int(value) if value is not None else None)
+
+        return tuple(checksum), current.request.utcnow
+
+    # -------------------------------------------------------------------------
+    def __reindex(self, node_ids):
+        """
+            Update the closure table
+
+            Args:
+                node_ids: the IDs of the changed nodes, or True to
+                          rebuild the closure table for all nodes
+        """
+
+        if not node_ids:
+            return
+
+        db = current.db
+        ctable = current.s3db.s3_hierarchy_closure
+
+        tablename = self.tablename
+        theset = self.__theset
+
+        query = (ctable.tablename == tablename)
+        if node_ids is True:
+            db(query).delete()
+            affected = set(theset)
+        else:
+            # Include all descendants of the changed nodes
+            affected = set()
+            pending = set(node_ids)
+            while pending:
+                node_id = pending.pop()
+                if node_id in affected:
+                    continue
+                affected.add(node_id)
+                node = theset.get(node_id)
+                if node:
+                    pending |= node["s"]
+
+            # Descendants of removed nodes are no longer in the theset
+            removed = {node_id for node_id in node_ids if node_id not in theset}
+            if removed:
+                rows = db(query & ctable.ancestor.belongs(removed)).select(
+                                                        ctable.descendant,
+                                                        )
+                affected |= {row.descendant for row in rows}
+
+            db(query & ctable.descendant.belongs(affected)).delete()
+            affected -= removed
+
+        # Insert one row per ancestor (including the node itself)
+        items = []
+        for node_id in affected:
+            ancestor = node_id
+            path = set()
+            while ancestor and ancestor not in path and ancestor in theset:
+                path.add(ancestor)
+                items.append({"tablename": tablename,
+                              "ancestor": ancestor,
+                              "descendant": node_id,
+                              })
+                ancestor = theset[ancestor]["p"]
+        if items:
+            ctable.bulk_insert(items)
+
     # -------------------------------------------------------------------------
     def __keys(self):
         """ Introspect the key fields in the hierarchical table """
@@ -1145,6 +1348,7 @@ class S3Hierarchy:
         """
 
         theset = self.__theset
+        self.__status(closure = None)
 
         if node_id in theset:
             node = theset[node_id]
@@ -1181,9 +1385,10 @@ class S3Hierarchy:
             node = theset[node_id]
         else:
             return False
+        self.__status(closure = None)
 
         parent_id = node["p"]
-        if parent_id:
+        if parent_id and parent_id in theset:
             parent = theset[parent_id]
             parent["s"].discard(node_id)
         del theset[node_id]
@@ -1511,6 +1716,47 @@ class S3Hierarchy:
                 result.add(this)
         return result
 
+    # -------------------------------------------------------------------------
+    def subtree_query(self, field, node_ids):
+        """
+            Construct a query for a field to match any node in the subtrees
+            of the given nodes (inclusive), using the closure table rather
+            than expanding the subtrees into a list of node IDs
+
+            Args:
+                field: the Field referencing the nodes
+                node_ids: the IDs of the subtree root nodes
+
+            Returns:
+                Query, or None if the closure table is not available
+        """
+
+        if not self.closure or self.filter is not None:
+            return None
+
+        if not self.flags.get("closure"):
+            # Closure table is outdated
+            return None
+
+        if not isinstance(node_ids, (list, tuple, set)):
+            node_ids = {node_ids}
+
+        s3db = current.s3db
+        table = s3db[self.tablename]
+        ctable = s3db.s3_hierarchy_closure
+
+        query = (ctable.tablename == self.tablename) & \
+                (ctable.ancestor.belongs(set(node_ids))) & \
+                (ctable.descendant == self.pkey)
+
+        # Accessible nodes only, as for the subset
+        aquery = current.auth.s3_accessible_query("read", table)
+        if aquery is not None:
+            query &= aquery
+
+        subselect = current.db(query)._select(ctable.descendant)
+        return field.belongs(subselect)
+
     # -------------------------------------------------------------------------
     def _represent(self, node_ids=None, renderer=None):
         """
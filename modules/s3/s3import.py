@@ -33,6 +33,7 @@
 
 __all__ = ("S3Importer",
            "S3ImportJob",
+           "S3ImportBatches",
            "S3ImportItem",
            "S3Duplicate",
            "S3BulkImporter",
@@ -60,7 +61,7 @@ from urllib.error import HTTPError, URLError
 
 from gluon import current, redirect, URL, \
                   A, B, DIV, INPUT, LI, P, TABLE, TBODY, TD, TFOOT, TH, TR, UL, \
-                  IS_EMPTY_OR, IS_IN_SET, SQLFORM
+                  IS_EMPTY_OR, IS_IN_SET, IS_NOT_IN_DB, SQLFORM
 from gluon.storage import Storage, Messages
 from gluon.tools import callback, fetch
 
@@ -2260,13 +2261,15 @@ class S3ImportItem:
         return accepted
 
     # -------------------------------------------------------------------------
-    def commit(self, ignore_errors=False):
+    def commit(self, ignore_errors=False, bulk=None):
         """
             Commit this item to the database
 
             Args:
                 ignore_errors: skip invalid components
                                (still reports errors)
+                bulk: the S3ImportBulkCommit to defer the creation of
+                      new records to (bulk commit mode)
         """
 
         if self.committed:
@@ -2309,6 +2312,10 @@ class S3ImportItem:
         # Resolve references
         self._resolve_references()
 
+        # Create any pending records this could be a duplicate of
+        if bulk is not None:
+            bulk.check(self)
+
         # Deduplicate and validate
         if not self.validate():
             self.skip = True
@@ -2531,6 +2538,11 @@ class S3ImportItem:
                 if MCI in table.fields:
                     data[MCI] = self.mci
 
+                if bulk is not None:
+                    # Defer insert and post-processing to the bulk commit
+                    bulk.add(self, data)
+                    return True
+
                 # Insert the new record
                 try:
                     success = table.insert(**dict(data))
@@ -2681,7 +2693,26 @@ class S3ImportItem:
                 modified_on.update = modified_on_update
 
         # Update referencing items
+        self._update_referencing_items(bulk=bulk)
+
+        return True
+
+    # -------------------------------------------------------------------------
+    def _update_referencing_items(self, bulk=None):
+        """
+            Update the foreign keys in items which have been committed
+            before this item and could therefore not be resolved at the
+            time (due to circular references)
+
+            Args:
+                bulk: the S3ImportBulkCommit (in bulk commit mode)
+        """
+
         if self.update and self.id:
+
+            db = current.db
+            table = self.table
+
             for u in self.update:
 
                 # The other import item that shall be updated
@@ -2689,6 +2720,10 @@ class S3ImportItem:
                 if not item:
                     continue
 
+                # Create the other record first if it is still pending
+                if bulk is not None and not item.id and bulk.pending(item):
+                    bulk.flush()
+
                 # The field in the other item that shall be updated
                 field = u.get("field")
                 if isinstance(field, (list, tuple)):
@@ -2711,8 +2746,6 @@ class S3ImportItem:
                     # Target field is a reference or list:reference
                     item._update_reference(fkey, ref_id)
 
-        return True
-
     # -------------------------------------------------------------------------
     def _dynamic_defaults(self, data):
         """
@@ -3103,6 +3136,7 @@ class S3ImportJob():
                  conflict_policy = None,
                  last_sync = None,
                  onconflict = None,
+                 resolved = None,
                  ):
         """
             Args:
@@ -3114,6 +3148,10 @@ class S3ImportJob():
                 conflict_policy: the conflict resolution policy
                 last_sync: the last synchronization time stamp (datetime)
                 onconflict: custom conflict resolver function
+                resolved: dict {(tablename, attribute, uid): record ID}
+                          of records imported from elements which are
+                          no longer in the tree (e.g. earlier batches of
+                          a streaming import), to resolve references
         """
 
         self.error = None # the last error
@@ -3125,6 +3163,7 @@ class S3ImportJob():
         self.directory = Storage()
 
         self._uidmap = None
+        self.resolved = resolved
 
         # Mandatory fields
         self.mandatory_fields = Storage()
@@ -3532,6 +3571,7 @@ class S3ImportJob():
         if tree is not None:
             root = tree if isinstance(tree, etree._Element) else tree.getroot()
         uidmap = self.uidmap
+        resolved = self.resolved
 
         references = [lookup] if lookup else element.findall("reference")
         for reference in references:
@@ -3637,10 +3677,13 @@ class S3ImportJob():
                             # Element in the source => append to relements
                             relements.append(e)
                         else:
-                            # No element found, see if original record exists
+                            # No element found, see if the record has been
+                            # imported before, or if original record exists
                             _uid = import_uid(uid)
-                            if _uid and _uid in id_map:
+                            _id = resolved.get((tablename, attr, uid)) if resolved else None
+                            if not _id and _uid and _uid in id_map:
                                 _id = id_map[_uid]
+                            if _id:
                                 entry = Storage(tablename = tablename,
                                                 element = None,
                                                 uid = uid,
@@ -3728,7 +3771,40 @@ class S3ImportJob():
         return True
 
     # -------------------------------------------------------------------------
-    def commit(self, ignore_errors=False, log_items=None):
+    def levels(self, import_list):
+        """
+            Group the ordered list of items to import into levels, so
+            that items only reference items in lower levels (except
+            circular references), for bulk commits
+
+            Args:
+                import_list: the ordered list of items (UIDs) to import
+
+            Returns:
+                list of lists of item UIDs, in import order
+        """
+
+        items = self.items
+
+        level = {}
+        levels = []
+        for item_id in import_list:
+            number = 0
+            for reference in items[item_id].references:
+                entry = reference.entry
+                ritem_id = entry.item_id if entry else None
+                if ritem_id in level:
+                    number = max(number, level[ritem_id] + 1)
+            level[item_id] = number
+            if number == len(levels):
+                levels.append([item_id])
+            else:
+                levels[number].append(item_id)
+
+        return levels
+
+    # -------------------------------------------------------------------------
+    def commit(self, ignore_errors=False, log_items=None, bulk=False):
         """
             Commit the import job to the DB
 
@@ -3737,6 +3813,8 @@ class S3ImportJob():
                                (does still report the errors)
                 log_items: callback function to log import items
                            before committing them
+                bulk: bulk commit mode, i.e. create new records in
+                      batches per table (see S3ImportBulkCommit)
         """
 
         ATTRIBUTE = current.xml.ATTRIBUTE
@@ -3748,6 +3826,16 @@ class S3ImportJob():
             self.resolve(item_id, import_list)
             if item_id not in import_list:
                 import_list.append(item_id)
+
+        # Bulk commit: commit the items level by level, so that all
+        # items in a level can be created together
+        if bulk:
+            bulk = S3ImportBulkCommit()
+            levels = self.levels(import_list)
+        else:
+            bulk = None
+            levels = [import_list]
+
         # Commit the items
         items = self.items
         count = 0
@@ -3760,17 +3848,10 @@ class S3ImportJob():
 
         self.log = log_items
         failed = False
-        for item_id in import_list:
-            item = items[item_id]
-            error = None
 
-            if item.accepted is not False:
-                logged = False
-                success = item.commit(ignore_errors=ignore_errors)
-            else:
-                # Field validation failed
-                logged = True
-                success = ignore_errors
+        def report(item, success, logged):
+            # Report the commit result of an item
+            nonlocal count, mtime, failed
 
             if not success:
                 failed = True
@@ -3798,6 +3879,35 @@ class S3ImportJob():
                     elif item.method in (METHOD.MERGE, METHOD.DELETE):
                         deleted.append(item.id)
 
+        for level in levels:
+
+            deferred = []
+            for item_id in level:
+                item = items[item_id]
+
+                if item.accepted is not False:
+                    logged = False
+                    success = item.commit(ignore_errors = ignore_errors,
+                                          bulk = bulk,
+                                          )
+                else:
+                    # Field validation failed
+                    logged = True
+                    success = ignore_errors
+
+                if bulk is not None and bulk.pending(item):
+                    # Report when created
+                    deferred.append((item, logged))
+                else:
+                    report(item, success, logged)
+
+            if bulk is not None:
+                bulk.flush()
+                for item, logged in deferred:
+                    success = item.item_id not in bulk.failed or ignore_errors
+                    report(item, success, logged)
+                bulk.clear()
+
         if failed:
             return False
 
@@ -3999,6 +4109,540 @@ class S3ImportJob():
                     item.parent = parent
                 item.load_parent = None
 
+# =============================================================================
+class S3ImportBatches:
+    """
+        State of a streaming import (see S3Resource.import_stream), which
+        imports the source in batches of top-level elements; carries over
+        the information needed to resolve references to elements of
+        earlier batches:
+
+        - the record IDs of imported elements with a tuid (references
+          by uuid are resolved from the database)
+        - top-level elements of other tables which have not been imported
+          yet (=not referenced so far), and could thus be referenced by
+          elements in later batches
+
+        Note:
+            - forward references (to elements in later batches) can only be
+              resolved if the record already exists in the database
+            - to keep memory use bounded, pending elements are imported into
+              their tables (flush) when there are more than max_pending, even
+              if they have not been referenced so far
+    """
+
+    def __init__(self, max_pending=None):
+        """
+            Args:
+                max_pending: the maximum number of pending elements
+                             to keep, None for no limit
+        """
+
+        # {(tablename, "tuid", tuid): record ID}
+        self.resolved = {}
+
+        # Top-level elements of other tables, not imported yet
+        self.pending = etree.Element(current.xml.TAG.root)
+        self.max_pending = max_pending
+
+        # Whether a batch has failed (=transaction rolled back)
+        self.failed = False
+
+    # -------------------------------------------------------------------------
+    def prepare(self, root):
+        """
+            Add pending elements from earlier batches to a batch
+
+            Args:
+                root: the root element of the batch
+        """
+
+        # NB appending moves the elements
+        root.extend(list(self.pending))
+
+    # -------------------------------------------------------------------------
+    def update(self, job, root, tablename):
+        """
+            Update the state after a batch has been committed
+
+            Args:
+                job: the S3ImportJob for the batch, None if the batch
+                     contained nothing to import
+                root: the root element of the batch
+                tablename: the name of the table to import into
+        """
+
+        xml = current.xml
+        NAME = xml.ATTRIBUTE.name
+        TUID = xml.ATTRIBUTE.tuid
+        UID = xml.UID
+
+        if isinstance(root, etree._ElementTree):
+            root = root.getroot()
+
+        if job is not None:
+            resolved = self.resolved
+            for item in job.items.values():
+                element = item.element
+                if item.id and element is not None:
+                    tuid = element.get(TUID)
+                    if tuid:
+                        resolved[(item.tablename, TUID, tuid)] = item.id
+            imported = job.elements
+        else:
+            imported = {}
+
+        pending = self.pending
+        for element in list(root):
+            if element.get(NAME) == tablename or element in imported:
+                continue
+            if element.get(TUID) or element.get(UID):
+                # NB appending moves the element out of the batch
+                pending.append(element)
+
+    # -------------------------------------------------------------------------
+    def exceeded(self):
+        """
+            Check whether there are more pending elements than allowed
+
+            Returns:
+                True|False
+        """
+
+        max_pending = self.max_pending
+        return max_pending is not None and len(self.pending) > max_pending
+
+    # -------------------------------------------------------------------------
+    def flush(self, **args):
+        """
+            Import all pending elements into their tables, table by table,
+            so that they can be released
+
+            Args:
+                args: keyword arguments for S3Resource.import_tree
+
+            Returns:
+                list of the S3Resources imported into (to collect errors),
+                with the import stopped after the first failure (see failed)
+        """
+
+        NAME = current.xml.ATTRIBUTE.name
+
+        s3db = current.s3db
+
+        resources = []
+        while len(self.pending):
+
+            # Pending elements of other tables are moved back
+            # into self.pending after the import (see update)
+            root = self.pending
+            self.pending = etree.Element(current.xml.TAG.root)
+
+            resource = s3db.resource(root[0].get(NAME))
+            success = resource.import_tree(None, root, batches=self, **args)
+            resources.append(resource)
+
+            if not success or self.failed:
+                self.failed = True
+                break
+
+        return resources
+
+# =============================================================================
+class S3ImportBulkCommit:
+    """
+        Bulk commit of new records in an import job (see S3ImportJob.commit):
+        rather than creating and post-processing the new records one by one,
+        import items defer their creation to this class, which then creates
+        the records of each table together, and batches the post-processing
+
+        - inserts the records with multi-row INSERT statements (see
+          bulk_insert)
+        - creates the super-entity records with S3Model.update_super_bulk
+        - sets the record owners with AuthS3.s3_set_record_owner_bulk
+        - runs the bulk_onaccept callback of the table with the list of
+          all forms if the table configures one, otherwise create_onaccept
+          or onaccept per form
+
+        Note:
+            - items which could be duplicates of pending items (same
+              deduplicator key, or same value in a unique field or a
+              field with IS_NOT_IN_DB validator) trigger a flush before
+              they are validated, as do all items in tables with a custom
+              deduplicator without key method (see S3Duplicate.key), or
+              with an onvalidation callback (which could check against
+              records in the database) - i.e. those are created one by
+              one, so that the bulk commit does not speed up imports
+              into these tables
+            - if the insert fails, the error is reported for all records
+              of the table that are created together
+    """
+
+    def __init__(self):
+
+        # Pending items per table {tablename: [(item, data)]}
+        self.queue = {}
+
+        # Duplicate keys of pending items per table {tablename: set}
+        self.keys = {}
+
+        # UIDs of items that have been queued or failed since clear()
+        self.queued = set()
+        self.failed = set()
+
+    # -------------------------------------------------------------------------
+    def pending(self, item):
+        """
+            Check whether the creation of an item has been deferred
+            to the bulk commit (since the last clear)
+
+            Args:
+                item: the S3ImportItem
+
+            Returns:
+                True|False
+        """
+
+        return item.item_id in self.queued
+
+    # -------------------------------------------------------------------------
+    def add(self, item, data):
+        """
+            Defer the creation of a record
+
+            Args:
+                item: the S3ImportItem
+                data: the record data to insert
+        """
+
+        tablename = item.tablename
+
+        self.queue.setdefault(tablename, []).append((item, data))
+        self.keys.setdefault(tablename, set()).update(self.item_keys(item) or ())
+        self.queued.add(item.item_id)
+
+    # -------------------------------------------------------------------------
+    def check(self, item):
+        """
+            Flush all pending records before an item is validated, if
+            it could be a duplicate of a pending record
+
+            Args:
+                item: the S3ImportItem
+        """
+
+        if item.id or not self.queue.get(item.tablename):
+            return
+
+        keys = self.item_keys(item)
+        if keys is None or keys & self.keys[item.tablename]:
+            self.flush()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def item_keys(item):
+        """
+            Get the keys to detect duplicates among the import items of
+            a table: the key of the deduplicator, and the values of unique
+            fields and fields with IS_NOT_IN_DB validator
+
+            Args:
+                item: the S3ImportItem
+
+            Returns:
+                set of keys, or None if duplicates can not be detected
+                by key (custom deduplicator without key method, or
+                onvalidation callback)
+        """
+
+        table = item.table
+        data = item.data
+        if table is None or data is None:
+            return set()
+
+        keys = set()
+
+        tablename = item.tablename
+        get_config = current.s3db.get_config
+
+        # Onvalidation may check against existing records
+        for key in ("create_onvalidation", "update_onvalidation", "onvalidation"):
+            if get_config(tablename, key):
+                return None
+
+        deduplicate = get_config(tablename, "deduplicate")
+        if deduplicate:
+            get_key = getattr(deduplicate, "key", None)
+            if not callable(get_key):
+                return None
+            keys.add(("deduplicate", get_key(item)))
+
+        pkey = table._id.name
+        for fieldname in data:
+            if fieldname == pkey or fieldname not in table.fields:
+                continue
+            value = data[fieldname]
+            if value is None:
+                continue
+            field = table[fieldname]
+            if field.unique or S3ImportBulkCommit.not_in_db(field):
+                if isinstance(value, list):
+                    value = tuple(value)
+                keys.add((fieldname, value))
+
+        return keys
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def not_in_db(field):
+        """
+            Check whether a field has an IS_NOT_IN_DB validator (including
+            IS_NOT_ONE_OF)
+
+            Args:
+                field: the Field
+
+            Returns:
+                True|False
+        """
+
+        requires = field.requires
+        if not requires:
+            return False
+        if not isinstance(requires, (list, tuple)):
+            requires = [requires]
+        for validator in requires:
+            if isinstance(validator, IS_EMPTY_OR):
+                other = validator.other
+                if isinstance(other, (list, tuple)):
+                    if any(isinstance(v, IS_NOT_IN_DB) for v in other):
+                        return True
+                    continue
+                validator = other
+            if isinstance(validator, IS_NOT_IN_DB):
+                return True
+        return False
+
+    # -------------------------------------------------------------------------
+    def flush(self):
+        """
+            Create all pending records
+        """
+
+        queue = self.queue
+        if not queue:
+            return
+
+        self.queue = {}
+        self.keys = {}
+
+        # Create the records
+        created = []
+        for tablename, pending in queue.items():
+            items = self.insert(pending[0][0].table, pending)
+            if items:
+                created.append(items)
+
+        # Post-process the new records
+        for items in created:
+            self.postprocess(items)
+
+        # Update referencing items
+        for items in created:
+            for item in items:
+                item._update_referencing_items(bulk=self)
+
+    # -------------------------------------------------------------------------
+    def insert(self, table, pending):
+        """
+            Insert the pending records of a table
+
+            Args:
+                table: the Table
+                pending: list of tuples (item, data)
+
+            Returns:
+                list of the items for which a record has been created
+        """
+
+        try:
+            record_ids = self.bulk_insert(table, [dict(data) for _, data in pending])
+        except:
+            error = sys.exc_info()[1]
+            record_ids = None
+        else:
+            error = None
+
+        created = []
+        if record_ids and len(record_ids) == len(pending):
+            for (item, _), record_id in zip(pending, record_ids):
+                if record_id:
+                    item.id = record_id
+                    item.committed = True
+                    created.append(item)
+                else:
+                    item.error = "Record could not be created"
+                    item.skip = True
+                    self.failed.add(item.item_id)
+        else:
+            for item, _ in pending:
+                item.error = error if error else "Bulk insert failed"
+                item.skip = True
+                self.failed.add(item.item_id)
+
+        return created
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def bulk_insert(table, items, chunk_size=500):
+        """
+            Insert multiple records with one INSERT statement per chunk
+            of records (whereas Table.bulk_insert inserts them one by one)
+
+            Args:
+                table: the Table
+                items: list of dicts with the record data
+                chunk_size: the maximum number of records per statement
+
+            Returns:
+                list of the new record IDs, in the same order as items
+
+            Note:
+                - requires INSERT...RETURNING (PostgreSQL, SQLite>=3.35),
+                  otherwise falls back to Table.bulk_insert, as it does
+                  for tables with DAL insert callbacks
+                - the new record IDs are matched to the items by UUID, as
+                  the order of the returned rows is not guaranteed, so
+                  tables without uuid field are also inserted with
+                  Table.bulk_insert; missing UUIDs are generated
+        """
+
+        dbtype = current.deployment_settings.get_database_type()
+        if dbtype == "sqlite":
+            import sqlite3
+            returning = sqlite3.sqlite_version_info >= (3, 35, 0)
+        else:
+            returning = dbtype == "postgres"
+
+        if not returning or "uuid" not in table.fields or \
+           table._before_insert or table._after_insert:
+            return table.bulk_insert(items)
+
+        db = current.db
+        expand = db._adapter.expand
+
+        # Complete the records (defaults, computed fields), and group
+        # them by their columns
+        groups = {}
+        uuid_field = table.uuid
+        for index, item in enumerate(items):
+            fields = table._fields_and_values_for_insert(item)
+            if hasattr(fields, "op_values"):
+                fields = fields.op_values()
+            # Generate missing UUIDs here rather than in the field
+            # encoder, so that the record can be matched with its ID
+            uid = item.get("uuid") or uuid.uuid4().urn
+            fields = [(field, value) for field, value in fields
+                      if field.name != "uuid"]
+            fields.append((uuid_field, uid))
+            columns = tuple(field.name for field, _ in fields)
+            groups.setdefault(columns, []).append((index, uid, fields))
+
+        sql = "INSERT INTO %s(%%s) VALUES %%s RETURNING %s,%s;" % \
+              (table._rname, table._id._rname, table.uuid._rname)
+
+        record_ids = [None] * len(items)
+        for columns, rows in groups.items():
+            names = ",".join(table[fn]._rname for fn in columns)
+            for i in range(0, len(rows), chunk_size):
+                chunk = rows[i:i + chunk_size]
+                values = ",".join("(%s)" % ",".join(expand(value, field.type)
+                                                    for field, value in fields)
+                                  for _, _, fields in chunk)
+                created = dict((uid, record_id)
+                               for record_id, uid in db.executesql(sql % (names, values)))
+                for index, uid, _ in chunk:
+                    record_ids[index] = created.get(uid)
+
+        return record_ids
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def postprocess(items):
+        """
+            Audit and post-process new records (in the same order as
+            S3ImportItem.commit does for single records)
+
+            Args:
+                items: the S3ImportItems of the new records (same table)
+        """
+
+        s3db = current.s3db
+        auth = current.auth
+
+        table = items[0].table
+        tablename = items[0].tablename
+        prefix, name = tablename.split("_", 1)
+
+        CREATE = S3ImportItem.METHOD.CREATE
+        MTIME = current.xml.MTIME
+
+        # Create pseudo-forms for callbacks, and audit
+        audit = current.audit
+        forms = []
+        for item in items:
+            form = Storage()
+            form.method = CREATE
+            form.table = table
+            form.vars = item.data
+            form.vars.id = item.id
+            audit(CREATE, prefix, name,
+                  form = form,
+                  record = item.id,
+                  representation = "xml",
+                  )
+            forms.append(form)
+
+        # Prevent that record post-processing breaks time-delayed
+        # synchronization by implicitly updating "modified_on"
+        if MTIME in table.fields:
+            modified_on = table[MTIME]
+            modified_on_update = modified_on.update
+            modified_on.update = None
+        else:
+            modified_on_update = None
+
+        # Update super entity links
+        s3db.update_super_bulk(table, [form.vars for form in forms])
+
+        # Set record owners
+        auth.s3_set_record_owner_bulk(table, [item.id for item in items])
+
+        # Onaccept
+        get_config = s3db.get_config
+        onaccept = get_config(tablename, "bulk_onaccept")
+        if onaccept:
+            callback(onaccept, forms)
+        else:
+            onaccept = get_config(tablename, "create_onaccept") or \
+                       get_config(tablename, "onaccept")
+            if onaccept:
+                for form in forms:
+                    callback(onaccept, form)
+
+        # Restore modified_on.update
+        if modified_on_update is not None:
+            modified_on.update = modified_on_update
+
+    # -------------------------------------------------------------------------
+    def clear(self):
+        """
+            Reset the lists of queued and failed items (after reporting)
+        """
+
+        self.queued = set()
+        self.failed = set()
+
 # =============================================================================
 class S3ObjectReferences:
     """
@@ -4246,6 +4890,36 @@ class S3Duplicate:
         # For uses outside of imports:
         return duplicate
 
+    # -------------------------------------------------------------------------
+    def key(self, item):
+        """
+            Get a key to detect duplicates among import items that are
+            not yet in the database (bulk commit), i.e. items with the
+            same key could be duplicates of each other
+
+            Args:
+                item: the import item
+
+            Returns:
+                a tuple of the values of the primary fields
+        """
+
+        data = item.data
+        table = item.table
+
+        values = []
+        for fname in sorted(self.primary):
+            value = data.get(fname)
+            if self.ignore_case and hasattr(value, "lower") and \
+               fname in table.fields and \
+               str(table[fname].type) in ("string", "text"):
+                value = s3_str(value).lower()
+            elif isinstance(value, list):
+                value = tuple(value)
+            values.append(value)
+
+        return tuple(values)
+
     # -------------------------------------------------------------------------
     def match(self, field, value):
         """
@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+
+""" S3 Slow Query Log and Index Advisor
+
+    @copyright: 2021 (c) Sahana Software Foundation
+    @license: MIT
+
+    @requires: U{B{I{gluon}} <http://web2py.com>}
+
+    Permission is hereby granted, free of charge, to any person
+    obtaining a copy of this software and associated documentation
+    files (the "Software"), to deal in the Software without
+    restriction, including without limitation the rights to use,
+    copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following
+    conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+__all__ = ("S3IndexAdvisor",
+           "s3_query_origin",
+           )
+
+import re
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+from functools import wraps
+
+from gluon import current
+
+from .s3utils import s3_str
+
+# Backends for which the advisor can write migration scripts
+BACKENDS = ("postgres", "mysql", "sqlite")
+
+# Literals in SQL statements
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# Lists of literals (after replacing the literals with placeholders)
+PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+# Columns used in comparisons (left operand)
+FILTER_COLUMNS = re.compile(r"""[`"]?(\w+)[`"]?\.[`"]?(\w+)[`"]?\s*"""
+                            r"""(?:=|<>|!=|<=|>=|<|>|\bIN\b|\bNOT\b|\bIS\b|\bLIKE\b|\bBETWEEN\b)""",
+                            re.IGNORECASE)
+
+# Columns used in comparisons (right operand, e.g. join conditions)
+JOIN_COLUMNS = re.compile(r"""(?:=|<>|<=|>=|<|>)\s*[`"]?(\w+)[`"]?\.[`"]?(\w+)[`"]?""")
+
+# Table aliases
+ALIASES = re.compile(r"""[`"]?(\w+)[`"]?\s+AS\s+[`"]?(\w+)[`"]?""", re.IGNORECASE)
+
+# Columns in index definitions
+INDEX_COLUMNS = re.compile(r"""\(\s*[`"]?(\w+)[`"]?""")
+
+# =============================================================================
+class S3IndexAdvisor:
+    """
+        Records slow DAL queries with their normalized shape and the
+        S3Resource they originate from, and derives missing-index
+        candidates from the filter and join columns of these queries
+
+        The slow-query log is process-wide, and limited in size (least
+        recently recorded shapes are dropped first).
+    """
+
+    # Process-wide slow-query log {shape: [count, time, max, origins]}
+    _log = OrderedDict()
+    _lock = threading.Lock()
+
+    # Maximum number of query shapes in the log
+    LOG_SIZE = 1000
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def capture(cls, db):
+        """
+            Start capturing slow queries (to be called at the start of
+            the request, once the database is connected)
+
+            Args:
+                db: the DAL instance
+        """
+
+        threshold = current.deployment_settings.get_base_slow_query_threshold()
+        if not threshold:
+            return
+
+        adapter = db._adapter
+        execute = adapter.execute
+        record = cls.record
+
+        def timed_execute(*args, **kwargs):
+            start = time.time()
+            try:
+                return execute(*args, **kwargs)
+            finally:
+                duration = time.time() - start
+                if duration >= threshold:
+                    command = args[0] if args else kwargs.get("command")
+                    record(command, duration)
+
+        adapter.execute = timed_execute
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def record(cls, sql, duration, origin=None):
+        """
+            Add a query to the slow-query log
+
+            Args:
+                sql: the SQL statement
+                duration: the execution time (seconds)
+                origin: the originating resource (tablename), defaults
+                        to the resource currently accessed
+        """
+
+        if not isinstance(sql, str):
+            return
+        verb = sql.lstrip()[:6].upper()
+        if verb not in ("SELECT", "UPDATE", "DELETE"):
+            # Not relevant for indexes
+            return
+
+        if origin is None:
+            s3 = current.response.s3
+            origin = s3.query_origin if s3 else None
+
+        shape = cls.shape(sql)
+
+        log = cls._log
+        with cls._lock:
+            entry = log.get(shape)
+            if entry is None:
+                entry = log[shape] = [0, 0.0, 0.0, set()]
+                while len(log) > cls.LOG_SIZE:
+                    log.popitem(last=False)
+            else:
+                log.move_to_end(shape)
+            entry[0] += 1
+            entry[1] += duration
+            if duration > entry[2]:
+                entry[2] = duration
+            if origin:
+                entry[3].add(origin)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def shape(sql):
+        """
+            Normalize an SQL statement, i.e. replace all literals with
+            placeholders and lists of literals with a single placeholder
+
+            Args:
+                sql: the SQL statement
+
+            Returns:
+                the normalized statement
+        """
+
+        shape = LITERALS.sub("?", sql)
+        shape = PLACEHOLDER_LISTS.sub("(?)", shape)
+        return " ".join(shape.split()).rstrip(";")
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def columns(shape):
+        """
+            Find the filter and join columns in a query
+
+            Args:
+                shape: the (normalized) SQL statement
+
+            Returns:
+                set of tuples (tablename, fieldname)
+        """
+
+        # Only the FROM/WHERE part is relevant
+        upper = shape.upper()
+        position = upper.find(" FROM ")
+        if position >= 0:
+            shape = shape[position:]
+        else:
+            # UPDATE/DELETE
+            position = upper.find(" WHERE ")
+            if position < 0:
+                return set()
+            shape = shape[position:]
+
+        aliases = dict((alias, tablename)
+                       for tablename, alias in ALIASES.findall(shape))
+
+        columns = set()
+        for expr in (FILTER_COLUMNS, JOIN_COLUMNS):
+            for tablename, fieldname in expr.findall(shape):
+                columns.add((aliases.get(tablename, tablename), fieldname))
+        return columns
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def existing_indexes(db):
+        """
+            Look up the existing indexes in the database
+
+            Args:
+                db: the DAL instance
+
+            Returns:
+                set of tuples (tablename, fieldname) of the leading
+                columns of all indexes, or None if not available
+        """
+
+        dbname = db._dbname
+        if dbname == "postgres":
+            sql = "SELECT tablename, indexdef FROM pg_indexes " \
+                  "WHERE schemaname=current_schema();"
+        elif dbname == "sqlite":
+            sql = "SELECT tbl_name, sql FROM sqlite_master " \
+                  "WHERE type='index' AND sql IS NOT NULL;"
+        elif dbname == "mysql":
+            sql = "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.STATISTICS " \
+                  "WHERE TABLE_SCHEMA=DATABASE() AND SEQ_IN_INDEX=1;"
+        else:
+            return None
+
+        try:
+            rows = db.executesql(sql)
+        except Exception:
+            current.log.error("Index lookup failed: %s" % sys.exc_info()[1])
+            return None
+
+        indexes = set()
+        for tablename, definition in rows:
+            if dbname == "mysql":
+                fieldname = definition
+            else:
+                match = INDEX_COLUMNS.search(s3_str(definition))
+                if not match:
+                    continue
+                fieldname = match.group(1)
+            indexes.add((s3_str(tablename).lower(), s3_str(fieldname).lower()))
+
+        return indexes
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def report(cls):
+        """
+            Aggregate the slow-query log into missing-index candidates
+
+            Returns:
+                a list of dicts {"table": the table name,
+                                 "field": the field name,
+                                 "type": realm|deleted|modified|foreign key|filter,
+                                 "queries": number of slow query shapes,
+                                 "count": number of slow queries,
+                                 "time": total time of the slow queries,
+                                 "origins": originating resources,
+                                 }, ordered by total time (descending)
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        with cls._lock:
+            log = [(shape, list(entry)) for shape, entry in cls._log.items()]
+
+        existing = cls.existing_indexes(db) or set()
+
+        candidates = {}
+        for shape, (count, total, _, origins) in log:
+            for tablename, fieldname in cls.columns(shape):
+
+                if (tablename.lower(), fieldname.lower()) in existing:
+                    continue
+
+                # Must be a column of a known table, and not the primary
+                # key or a unique field (which are always indexed)
+                table = s3db.table(tablename, db_only=True)
+                if table is None:
+                    continue
+                if fieldname not in table.fields or \
+                   fieldname == table._id.name or table[fieldname].unique:
+                    continue
+
+                key = (tablename, fieldname)
+                candidate = candidates.get(key)
+                if candidate is None:
+                    candidate = candidates[key] = {
+                        "table": tablename,
+                        "field": fieldname,
+                        "type": cls.column_type(table[fieldname]),
+                        "queries": 0,
+                        "count": 0,
+                        "time": 0.0,
+                        "origins": set(),
+                        }
+                candidate["queries"] += 1
+                candidate["count"] += count
+                candidate["time"] += total
+                candidate["origins"] |= origins
+
+        output = sorted(candidates.values(), key=lambda c: c["time"], reverse=True)
+        for candidate in output:
+            candidate["origins"] = sorted(candidate["origins"])
+
+        return output
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def column_type(field):
+        """
+            Classify an index candidate
+
+            Args:
+                field: the Field
+
+            Returns:
+                the candidate type
+        """
+
+        fieldname = field.name
+        if fieldname == "realm_entity":
+            column_type = "realm"
+        elif fieldname == "deleted":
+            column_type = "deleted"
+        elif fieldname == "modified_on":
+            column_type = "modified"
+        elif str(field.type)[:9] == "reference":
+            column_type = "foreign key"
+        else:
+            column_type = "filter"
+        return column_type
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def script(cls, backend=None, candidates=None):
+        """
+            Write a migration script to create the missing indexes
+
+            Args:
+                backend: the database backend (postgres|mysql|sqlite),
+                         defaults to the current database
+                candidates: the index candidates (default: report())
+
+            Returns:
+                the script as string
+        """
+
+        if backend is None:
+            backend = current.db._dbname
+        if backend not in BACKENDS:
+            raise ValueError("Unsupported database backend: %s" % backend)
+
+        if candidates is None:
+            candidates = cls.report()
+
+        if backend == "postgres":
+            # Don't lock the table while building the index
+            template = "CREATE INDEX CONCURRENTLY IF NOT EXISTS %(index)s ON %(table)s (%(field)s);"
+        elif backend == "sqlite":
+            template = "CREATE INDEX IF NOT EXISTS %(index)s ON %(table)s (%(field)s);"
+        else:
+            template = "CREATE INDEX %(index)s ON %(table)s (%(field)s);"
+
+        lines = ["-- Indexes recommended by the S3IndexAdvisor (%s)" % backend,
+                 "-- %s candidates from slow queries" % len(candidates),
+                 ]
+        for candidate in candidates:
+            tablename = candidate["table"]
+            fieldname = candidate["field"]
+            lines.append("-- %s: %s slow queries, %.3fs total (%s)" % \
+                         (candidate["type"],
+                          candidate["count"],
+                          candidate["time"],
+                          ", ".join(candidate["origins"]) or "-",
+                          ))
+            index = ("%s_%s_idx" % (tablename, fieldname))[:63]
+            lines.append(template % {"index": index,
+                                     "table": tablename,
+                                     "field": fieldname,
+                                     })
+
+        return "\n".join(lines) + "\n"
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear(cls):
+        """
+            Remove all entries from the slow-query log
+        """
+
+        with cls._lock:
+            cls._log.clear()
+
+# =============================================================================
+def s3_query_origin(method):
+    """
+        Decorator for S3Resource methods, to record the resource as
+        origin of slow queries
+    """
+
+    @wraps(method)
+    def recorded(resource, *args, **kwargs):
+        s3 = current.response.s3
+        if s3 is None:
+            return method(resource, *args, **kwargs)
+        previous = s3.query_origin
+        s3.query_origin = resource.tablename
+        try:
+            return method(resource, *args, **kwargs)
+        finally:
+            s3.query_origin = previous
+
+    return recorded
+
+# END =========================================================================
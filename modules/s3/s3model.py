@@ -31,6 +31,9 @@ __all__ = ("S3Model",
            #"S3DynamicModel",
            )
 
+import json
+import os
+
 from collections import OrderedDict
 
 from gluon import current, IS_EMPTY_OR, IS_FLOAT_IN_RANGE, IS_INT_IN_RANGE, \
@@ -40,6 +43,7 @@ from gluon.tools import callback
 
 from s3dal import Table, Field, original_tablename
 from .s3navigation import S3ScriptItem
+from .s3profiler import s3_profiled
 from .s3resource import S3Resource
 from .s3validators import IS_ONE_OF, IS_JSONS3
 from .s3widgets import s3_comments_widget, s3_richtext_widget
@@ -71,6 +75,14 @@ class S3Model:
     LOAD = "s3_model_load"
     DELETED = "deleted"
 
+    # Model manifest (see manifest()), file name and process-wide instance
+    MANIFEST = "s3model_manifest.json"
+    _manifest = None
+
+    # Manifest entries collected while loading all models
+    _recording = None
+
+    @s3_profiled("model")
     def __init__(self, module=None):
 
         self.cache = (current.cache.ram, 60)
@@ -105,6 +117,12 @@ class S3Model:
             if self.__loaded():
                 return
             self.__lock()
+
+            recording = S3Model._recording
+            if recording is not None:
+                snapshot = self.__snapshot()
+            names = []
+
             try:
                 env = self.mandatory()
             except Exception:
@@ -113,6 +131,7 @@ class S3Model:
             else:
                 if isinstance(env, dict):
                     response.s3.update(env)
+                    names.extend(env)
             if module in mandatory_models or \
                current.deployment_settings.has_module(module):
                 try:
@@ -128,6 +147,11 @@ class S3Model:
                     raise
             if isinstance(env, dict):
                 response.s3.update(env)
+                names.extend(env)
+
+            if recording is not None:
+                self.__record(recording, snapshot, names)
+
             self.__loaded(True)
             self.__unlock()
 
@@ -172,6 +196,54 @@ class S3Model:
                 del response[LOCK]
         return
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def __snapshot():
+        """
+            Get a snapshot of the currently defined tables and component
+            hooks, to find out which of them a model defines
+
+            Returns:
+                tuple (set of tablenames, {master: set of aliases})
+        """
+
+        components = current.model["components"]
+
+        return (set(current.db.tables),
+                {master: set(hooks) for master, hooks in components.items()},
+                )
+
+    # -------------------------------------------------------------------------
+    def __record(self, recording, snapshot, names):
+        """
+            Add the tables, names and component hooks defined by this
+            model to the manifest being built
+
+            Args:
+                recording: the manifest entries being collected
+                snapshot: the snapshot from before loading this model
+                names: the names this model has added to response.s3
+        """
+
+        entry = [self.prefix, self.__class__.__name__]
+
+        tables, hooks = snapshot
+        defined = set(current.db.tables) - tables
+
+        # Nested models have been recorded before (=setdefault)
+        recorded = recording["names"]
+        for name in defined.union(names):
+            recorded.setdefault(name, entry)
+
+        recorded = recording["components"]
+        for master, aliases in current.model["components"].items():
+            if set(aliases) - hooks.get(master, set()):
+                entries = recorded.get(master)
+                if entries is None:
+                    recorded[master] = [entry]
+                elif entry not in entries:
+                    entries.append(entry)
+
     # -------------------------------------------------------------------------
     def __getattr__(self, name):
         """ Model auto-loader """
@@ -238,6 +310,13 @@ class S3Model:
         except AttributeError:
             pass
 
+        # Load the model that defines the table, if known from the manifest
+        if cls.load_from_manifest(tablename):
+            if not db_only and tablename in s3:
+                return s3[tablename]
+            elif hasattr(db, tablename):
+                return getattr(db, tablename)
+
         found = None
 
         prefix, name = tablename.split("_", 1)
@@ -337,6 +416,8 @@ class S3Model:
 
         if name in s3:
             return s3[name]
+        elif cls.load_from_manifest(name) and name in s3:
+            return s3[name]
         elif "_" in name:
             prefix = name.split("_", 1)[0]
             models = current.models
@@ -408,6 +489,11 @@ class S3Model:
         models = current.models
         settings = current.deployment_settings
 
+        # Record the model manifest while loading, if needed
+        build = settings.get_base_model_manifest() and not cls.manifest()
+        if build:
+            S3Model._recording = {"names": {}, "components": {}}
+
         # Load models
         if models is not None:
             # Add Custom Models
@@ -417,9 +503,15 @@ class S3Model:
                 module = parent.__dict__[prefix]
                 models.__dict__[prefix] = module
 
-            for name in models.__dict__:
-                if type(models.__dict__[name]).__name__ == "module":
-                    cls.load(name)
+            try:
+                for name in models.__dict__:
+                    if type(models.__dict__[name]).__name__ == "module":
+                        cls.load(name)
+            finally:
+                recording = S3Model._recording
+                S3Model._recording = None
+            if build:
+                cls.build_manifest(recording)
 
         db = current.db
 
@@ -462,6 +554,231 @@ class S3Model:
         s3.load_all_models = False
         s3.all_models_loaded = True
 
+    # -------------------------------------------------------------------------
+    # Model manifest
+    # -------------------------------------------------------------------------
+    @classmethod
+    def manifest(cls):
+        """
+            Get the model manifest, i.e. a map of table names, other
+            names in response.s3 and component hooks to the S3Model
+            classes defining them, so that table() and get() can load
+            exactly the model class needed rather than searching a
+            module for it
+
+            Returns:
+                the manifest (dict), or None if not available or outdated
+
+            Note:
+                - requires settings.base.model_manifest
+                - the manifest is written when all models are loaded (e.g.
+                  during first run, or with static/scripts/tools/noop.py),
+                  and read once per process; it is only valid as long as
+                  the model modules are unchanged (mtimes) and the same
+                  modules are enabled
+        """
+
+        manifest = cls._manifest
+        if manifest is None:
+            manifest = False
+            if current.deployment_settings.get_base_model_manifest():
+                path = os.path.join(current.request.folder, "cache", cls.MANIFEST)
+                try:
+                    with open(path, "r") as f:
+                        data = json.load(f)
+                except (IOError, ValueError):
+                    pass
+                else:
+                    if cls.__manifest_signature(data.get("mtimes")) == data.get("signature"):
+                        manifest = data
+            S3Model._manifest = manifest
+
+        return manifest or None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def build_manifest(cls, recording):
+        """
+            Write the model manifest
+
+            Args:
+                recording: the names and component hooks recorded while
+                           loading all models
+
+            Note:
+                Models that have been loaded before recording started
+                are added with their "names" only
+        """
+
+        models = current.models
+
+        names = {}
+        mtimes = {}
+        for prefix, module in models.__dict__.items():
+            if type(module).__name__ != "module" or \
+               not hasattr(module, "__all__"):
+                continue
+            try:
+                mtimes[prefix] = [module.__file__,
+                                  os.path.getmtime(module.__file__),
+                                  ]
+            except (AttributeError, OSError):
+                continue
+            for n in module.__all__:
+                model = module.__dict__.get(n)
+                if hasattr(model, "_s3model") and hasattr(model, "names"):
+                    for name in model.names:
+                        names.setdefault(name, [prefix, n])
+
+        # Recorded entries take precedence
+        names.update(recording["names"])
+
+        manifest = {"names": names,
+                    "components": recording["components"],
+                    "mtimes": mtimes,
+                    "signature": cls.__manifest_signature(mtimes),
+                    }
+
+        folder = os.path.join(current.request.folder, "cache")
+        path = os.path.join(folder, cls.MANIFEST)
+        tmp = "%s.%s" % (path, os.getpid())
+        try:
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            with open(tmp, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, path)
+        except (IOError, OSError):
+            current.log.warning("Could not write model manifest to %s" % path)
+        else:
+            S3Model._manifest = manifest
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def __manifest_signature(mtimes):
+        """
+            Get the signature to validate the manifest against, i.e.
+            the current modification times of the model modules, the
+            enabled modules, and the current modification times of the
+            configuration files (000_config.py, and config.py and
+            tasks.cfg of the templates in use)
+
+            Args:
+                mtimes: the model modules recorded in the manifest,
+                        {prefix: [path, mtime]}
+
+            Returns:
+                the signature (list), or None if a model module no
+                longer exists
+        """
+
+        if not mtimes:
+            return None
+
+        signature = []
+        for prefix in sorted(mtimes):
+            path = mtimes[prefix][0]
+            try:
+                signature.append([prefix, os.path.getmtime(path)])
+            except OSError:
+                return None
+
+        settings = current.deployment_settings
+        signature.append(sorted(settings.modules.keys()))
+
+        # Configuration files (templates can customise models, e.g.
+        # add components or define custom models)
+        folder = current.request.folder
+        sources = [os.path.join("models", "000_config.py")]
+        templates = settings.get_template()
+        if not isinstance(templates, (list, tuple)):
+            templates = [templates]
+        for template in templates:
+            location = os.path.join("modules", "templates", *template.split("."))
+            sources.extend(os.path.join(location, fn) for fn in ("config.py", "tasks.cfg"))
+        for source in sources:
+            try:
+                mtime = os.path.getmtime(os.path.join(folder, source))
+            except OSError:
+                mtime = None
+            signature.append([source, mtime])
+
+        return signature
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def load_from_manifest(cls, name):
+        """
+            Load the model class defining a name, if known from the manifest
+
+            Args:
+                name: the table name, or other name in response.s3
+
+            Returns:
+                True if a model class has been loaded, otherwise False
+        """
+
+        manifest = cls.manifest()
+        if not manifest:
+            return False
+
+        entry = manifest["names"].get(name)
+        if not entry:
+            return False
+
+        return cls.__load_model(*entry)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def load_components(cls, tablename):
+        """
+            Load all model classes which configure component hooks for
+            a master table, if known from the manifest
+
+            Args:
+                tablename: the master table name
+        """
+
+        manifest = cls.manifest()
+        if not manifest:
+            return
+
+        entries = manifest["components"].get(tablename)
+        if entries:
+            for entry in entries:
+                cls.__load_model(*entry)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def __load_model(prefix, name):
+        """
+            Load a particular model class
+
+            Args:
+                prefix: the model module name
+                name: the class name
+
+            Returns:
+                True if the model has been loaded, otherwise False
+        """
+
+        models = current.models
+
+        module = models.__dict__.get(prefix)
+        if module is None:
+            custom_models = current.deployment_settings.get_base_custom_models()
+            if prefix not in custom_models:
+                return False
+            parent = __import__("templates.%s" % custom_models[prefix], fromlist=[prefix])
+            module = models.__dict__[prefix] = parent.__dict__[prefix]
+
+        model = module.__dict__.get(name)
+        if not hasattr(model, "_s3model"):
+            return False
+
+        model(prefix)
+        return True
+
     # -------------------------------------------------------------------------
     @staticmethod
     def define_table(tablename, *fields, **args):
@@ -872,6 +1189,9 @@ class S3Model:
 
         components[master] = hooks
 
+        # Component hooks have changed
+        cls.clear_component_index()
+
     # -------------------------------------------------------------------------
     @classmethod
     def add_dynamic_components(cls, tablename, exclude=None):
@@ -983,15 +1303,33 @@ class S3Model:
                 The component descriptions (Storage {alias: description})
         """
 
-        table, hooks = cls.get_hooks(table, names=names)
-
-        # Build component-objects for each hook
         components = Storage()
-        if table and hooks:
-            for alias in hooks:
-                component = cls.parse_hook(table, alias, hook=hooks[alias])
-                if component:
-                    components[alias] = component
+
+        # Get tablename and table
+        if type(table) is Table:
+            tablename = original_tablename(table)
+        else:
+            tablename = table
+            table = cls.table(tablename)
+            if table is None:
+                return components
+
+        index = cls.component_index(tablename)
+        hooks = index["hooks"]
+        parsed = index["components"]
+
+        # Build component-objects for each hook (once per request)
+        for alias in cls.__select_hooks(hooks, names):
+            if alias in parsed:
+                component = parsed[alias]
+            else:
+                component = parsed[alias] = cls.parse_hook(table,
+                                                            alias,
+                                                            hook = hooks[alias],
+                                                            )
+            if component:
+                # Copy, so the caller can't alter the index
+                components[alias] = Storage(component)
 
         return components
 
@@ -1014,11 +1352,7 @@ class S3Model:
         load = cls.table
 
         if hook is None:
-            table, hooks = cls.get_hooks(table, names=[alias])
-            if hooks and alias in hooks:
-                hook = hooks[alias]
-            else:
-                return None
+            return cls.get_components(table, names=[alias]).get(alias)
 
         tn = hook.tablename
         lt = hook.linktable
@@ -1105,78 +1439,167 @@ class S3Model:
                 tuple (table, {alias: hook, ...})
         """
 
-        components = current.model["components"]
-        load = cls.table
-
         # Get tablename and table
         if type(table) is Table:
             tablename = original_tablename(table)
         else:
             tablename = table
-            table = load(tablename)
+            table = cls.table(tablename)
             if table is None:
                 # Primary table not defined
                 return None, None
 
-        # Single alias?
+        hooks = cls.component_index(tablename)["hooks"]
+
+        # Copy, so the caller can't alter the index
+        return table, dict((alias, Storage(hooks[alias]))
+                           for alias in cls.__select_hooks(hooks, names))
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def __select_hooks(hooks, names):
+        """
+            Helper method to select component hooks by alias
+
+            Args:
+                hooks: the component hooks, dict {alias: hook}
+                names: the component aliases to select, None for all
+
+            Returns:
+                list of aliases
+        """
+
+        if names is None:
+            return list(hooks)
         if isinstance(names, str):
             names = set([names])
-        elif names is not None:
+        else:
             names = set(names)
+        return [alias for alias in hooks if alias in names]
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def component_index(cls, tablename):
+        """
+            Get the compiled component hooks of a table, i.e. hooks for
+            direct, super- and dynamic components with all precedences
+            resolved, compiled once per request cycle and table; the
+            index is invalidated whenever components are added
+
+            Args:
+                tablename: the master table name
+
+            Returns:
+                dict {"hooks": {alias: hook},
+                      "components": {alias: component description},
+                      }, with the component descriptions (see parse_hook)
+                added on demand by get_components
+        """
+
+        model = current.model
+        components = model["components"]
+
+        index = model.get("component_index")
+        if index is None:
+            index = model["component_index"] = {}
+
+        entry = index.get(tablename)
+        if entry is not None:
+            # Verify that no hooks have been removed from the source
+            # configurations (without add_components)
+            sizes = entry["sizes"]
+            for name in sizes:
+                if len(components.get(name, ())) != sizes[name]:
+                    entry = None
+                    break
+
+        if entry is None:
+            version = model.get("component_version", 0)
+            hooks, tablenames = cls.__compile_hooks(tablename)
+            entry = {"hooks": hooks,
+                     "components": {},
+                     "sizes": dict((name, len(components.get(name, ())))
+                                   for name in tablenames),
+                     }
+            # Don't store if components were added while compiling
+            if model.get("component_version", 0) == version:
+                model["component_index"][tablename] = entry
+
+        return entry
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear_component_index(cls):
+        """
+            Invalidate all compiled component hooks (see component_index)
+        """
+
+        model = current.model
+        model["component_index"] = {}
+        model["component_version"] = model.get("component_version", 0) + 1
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def __compile_hooks(cls, tablename):
+        """
+            Find all applicable component configurations (hooks) for a
+            table, including super-components and dynamic components
+
+            Args:
+                tablename: the master table name
+
+            Returns:
+                tuple ({alias: hook}, [names of tables the hooks are
+                configured for])
+        """
+
+        components = current.model["components"]
+        load = cls.table
+        tablenames = [tablename]
+
+        # Load models configuring components for this table
+        cls.load_components(tablename)
 
         hooks = {}
         get_hooks = cls.__filter_hooks
-        supertables = None
 
         # Get hooks for direct components
         direct_components = components.get(tablename)
         if direct_components:
-            names = get_hooks(hooks, direct_components, names=names)
+            get_hooks(hooks, direct_components)
 
-        if names is None or names:
-            # Add hooks for super-components
-            supertables = cls.get_config(tablename, "super_entity")
-            if supertables:
-                if not isinstance(supertables, (list, tuple)):
-                    supertables = [supertables]
-                for s in supertables:
-                    if isinstance(s, str):
-                        s = load(s)
-                    if s is None:
-                        continue
-                    super_components = components.get(s._tablename)
-                    if super_components:
-                        names = get_hooks(hooks, super_components,
-                                          names = names,
-                                          supertable = s,
-                                          )
+        # Add hooks for super-components
+        supertables = cls.get_config(tablename, "super_entity")
+        if supertables:
+            if not isinstance(supertables, (list, tuple)):
+                supertables = [supertables]
+            supertables = [load(s) if isinstance(s, str) else s
+                           for s in supertables]
+            supertables = [s for s in supertables if s is not None]
+            tablenames.extend(s._tablename for s in supertables)
+            for s in supertables:
+                super_components = components.get(s._tablename)
+                if super_components:
+                    get_hooks(hooks, super_components, supertable=s)
 
         dynamic_components =  cls.get_config(tablename, "dynamic_components")
         if dynamic_components:
 
-            if names is None or names:
-                # Add hooks for dynamic components
-                cls.add_dynamic_components(tablename, exclude=hooks)
-                direct_components = components.get(tablename)
-                if direct_components:
-                    names = get_hooks(hooks, direct_components, names=names)
+            # Add hooks for dynamic components
+            cls.add_dynamic_components(tablename, exclude=hooks)
+            direct_components = components.get(tablename)
+            if direct_components:
+                get_hooks(hooks, direct_components)
 
-            if supertables and (names is None or names):
+            if supertables:
                 # Add hooks for dynamic super-components
                 for s in supertables:
-                    if isinstance(s, str):
-                        s = load(s)
-                    if s is None:
-                        continue
                     cls.add_dynamic_components(s._tablename, exclude=hooks)
                     super_components = components.get(s._tablename)
                     if super_components:
-                        names = get_hooks(hooks, super_components,
-                                          names = names,
-                                          supertable = s,
-                                          )
+                        get_hooks(hooks, super_components, supertable=s)
 
-        return table, hooks
+        return hooks, tablenames
 
     # -------------------------------------------------------------------------
     @classmethod
@@ -1199,7 +1622,9 @@ class S3Model:
             if alias in components or \
                names is not None and alias not in names:
                 continue
-            hook = hooks[alias]
+            # Copy the hook, as the same hook can apply to multiple
+            # tables with different super-tables
+            hook = Storage(hooks[alias])
             hook["supertable"] = supertable
             components[alias] = hook
 
@@ -1227,6 +1652,9 @@ class S3Model:
             if table is None:
                 return False
 
+        # Load models configuring components for this table
+        cls.load_components(tablename)
+
         # Attach dynamic components
         if cls.get_config(tablename, "dynamic_components"):
             cls.add_dynamic_components(tablename)
@@ -1590,35 +2018,33 @@ class S3Model:
 
     # -------------------------------------------------------------------------
     @classmethod
-    def update_super(cls, table, record):
+    def super_links(cls, table):
         """
-            Updates the super-entity links of an instance record
+            Find all super-tables, super-keys and shared fields of an
+            instance table
 
             Args:
                 table: the instance table
-                record: the instance record
+
+            Returns:
+                tuple (updates, fields):
+                    updates: list of tuples (tablename, supertable,
+                             superkey, {superfield: instancefield})
+                    fields: names of the instance fields required to
+                            update the super-entity records
         """
 
         get_config = cls.get_config
 
-        # Get all super-entities of this table
         tablename = original_tablename(table)
         supertables = get_config(tablename, "super_entity")
         if not supertables:
-            return False
+            return [], []
 
-        # Get the record
-        record_id = record.get("id", None)
-        if not record_id:
-            return False
-
-        # Find all super-tables, super-keys and shared fields
         if not isinstance(supertables, (list, tuple)):
             supertables = [supertables]
         updates = []
         fields = []
-        has_deleted = "deleted" in table.fields
-        has_uuid = "uuid" in table.fields
 
         for s in supertables:
             # Get the supertable and the corresponding superkey
@@ -1656,13 +2082,42 @@ class S3Model:
             fields.append(key)
             updates.append((tn, s, key, shared))
 
-        # Get the record data
-        db = current.db
-        if has_deleted:
+        if "deleted" in table.fields:
             fields.append("deleted")
-        if has_uuid:
+        if "uuid" in table.fields:
             fields.append("uuid")
-        fields = [ogetattr(table, fn) for fn in list(set(fields))]
+
+        return updates, list(set(fields))
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def update_super(cls, table, record):
+        """
+            Updates the super-entity links of an instance record
+
+            Args:
+                table: the instance table
+                record: the instance record
+        """
+
+        get_config = cls.get_config
+
+        # Get all super-entities of this table
+        tablename = original_tablename(table)
+        updates, fields = cls.super_links(table)
+        if not updates:
+            return False
+
+        # Get the record
+        record_id = record.get("id", None)
+        if not record_id:
+            return False
+
+        # Get the record data
+        db = current.db
+        has_deleted = "deleted" in table.fields
+        has_uuid = "uuid" in table.fields
+        fields = [ogetattr(table, fn) for fn in fields]
         _record = db(table.id == record_id).select(limitby=(0, 1),
                                                    *fields).first()
         if not _record:
@@ -1718,6 +2173,94 @@ class S3Model:
         record.update(super_keys)
         return True
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def update_super_bulk(cls, table, records):
+        """
+            Creates the super-entity records for multiple new instance
+            records at once (bulk version of update_super)
+
+            Args:
+                table: the instance table
+                records: list of the instance records (dicts with the
+                         record ID, will be updated with the super-keys)
+
+            Note:
+                Records which are already linked to a super-entity record
+                are updated with update_super instead
+        """
+
+        get_config = cls.get_config
+
+        tablename = original_tablename(table)
+        updates, fields = cls.super_links(table)
+        if not updates:
+            return False
+
+        records = [record for record in records if record.get("id")]
+        if not records:
+            return False
+
+        # Get the record data
+        db = current.db
+        has_deleted = "deleted" in table.fields
+        has_uuid = "uuid" in table.fields
+        fields = [ogetattr(table, fn) for fn in set(fields) | {"id"}]
+        rows = db(table.id.belongs([record["id"] for record in records])).select(*fields)
+        rows = {row.id: row for row in rows}
+
+        # Records with existing super-entity records
+        new = []
+        for record in records:
+            _record = rows.get(record["id"])
+            if not _record:
+                continue
+            if any(_record[key] for _, _, key, _ in updates):
+                cls.update_super(table, record)
+            else:
+                new.append((record, _record))
+        if not new:
+            return True
+
+        super_keys = {}
+        for tn, s, key, shared in updates:
+
+            items = []
+            for record, _record in new:
+                data = Storage([(fn, _record[shared[fn]]) for fn in shared])
+                data.instance_type = tablename
+                if has_deleted:
+                    data.deleted = _record.get("deleted", False)
+                if has_uuid:
+                    data.uuid = _record.get("uuid", None)
+                items.append((record["id"], data))
+
+            # Insert the new super-entity records
+            keys = s.bulk_insert([dict(data) for _, data in items])
+            onaccept = get_config(tn, "create_onaccept",
+                       get_config(tn, "onaccept", None))
+            for (record_id, data), k in zip(items, keys):
+                if k:
+                    super_keys.setdefault(record_id, {})[key] = k
+                    data[key] = k
+                    if onaccept:
+                        form = Storage(vars=data)
+                        onaccept(form)
+
+        # Update the super_keys in the records
+        for record, _ in new:
+            keys = super_keys.get(record["id"])
+            if not keys:
+                continue
+            record.update(keys)
+            # System update => don't update modified_by/on
+            if "modified_on" in table.fields:
+                keys["modified_by"] = table.modified_by
+                keys["modified_on"] = table.modified_on
+            db(table.id == record["id"]).update(**keys)
+
+        return True
+
     # -------------------------------------------------------------------------
     @classmethod
     def delete_super(cls, table, record):
@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+
+""" S3 Request Profiler
+
+    @copyright: 2021 (c) Sahana Software Foundation
+    @license: MIT
+
+    @requires: U{B{I{gluon}} <http://web2py.com>}
+
+    Permission is hereby granted, free of charge, to any person
+    obtaining a copy of this software and associated documentation
+    files (the "Software"), to deal in the Software without
+    restriction, including without limitation the rights to use,
+    copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following
+    conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+__all__ = ("S3RequestProfiler",
+           "s3_profile",
+           "s3_profiled",
+           )
+
+import random
+import threading
+import time
+
+from collections import OrderedDict, deque
+from functools import wraps
+
+from gluon import current
+
+# Phase for time spent outside of any instrumented phase
+OTHER = "other"
+
+# =============================================================================
+class S3NoProfile:
+    """ Context manager for phases of requests that are not profiled """
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+NOPROFILE = S3NoProfile()
+
+# =============================================================================
+class S3RequestProfiler:
+    """
+        Sampling request profiler, attributes time and DB queries of a
+        request to framework phases (request initialization, model
+        loading, ACL resolution, data extraction, representation and
+        view rendering), and aggregates the results per controller,
+        function and method in a process-wide rolling store
+
+        Instrumented code marks phases with either of:
+
+            with s3_profile("phase"):
+                ...
+
+            @s3_profiled("phase")
+            def function(...):
+                ...
+
+        Time is attributed exclusively, i.e. the time spent in a nested
+        phase counts only for the nested phase.
+    """
+
+    # Process-wide store of samples {key: deque of samples}
+    _store = OrderedDict()
+    _lock = threading.Lock()
+
+    # Maximum number of keys (controller/function/method) in the store
+    STORE_SIZE = 500
+
+    def __init__(self):
+
+        self.key = None
+        self.method = None
+
+        now = time.time()
+        self.started = now
+
+        self.phases = {}
+        self.stack = []
+
+        # Total number of DB queries and DB time
+        self.queries = 0
+        self.dbtime = 0.0
+
+        # Named counters, e.g. of instantiated objects
+        self.counters = {}
+
+        # Marks of the last attribution
+        self.mark = (now, 0, 0.0)
+
+        self.adapter = None
+        self.execute = None
+        self.finished = False
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def sample(cls):
+        """
+            Start profiling the current request, if selected by sampling
+            (to be called at the start of the request, once the database
+            is connected)
+
+            Returns:
+                the S3RequestProfiler instance, or None if not sampled
+        """
+
+        rate = current.deployment_settings.get_base_profiler_sample_rate()
+        if not rate or random.random() >= rate:
+            return None
+
+        profiler = cls()
+
+        response = current.response
+        response.s3.profiler = profiler
+
+        # Count DB queries
+        profiler.instrument(current.db)
+
+        # View rendering starts when the controller returns
+        response.postprocessing.append(profiler.postprocess)
+
+        # Finish when the DB transaction is closed (after view rendering)
+        commit = response.custom_commit
+        rollback = response.custom_rollback
+        def custom_commit(adapter):
+            profiler.finish()
+            if commit:
+                commit(adapter)
+            else:
+                adapter.commit()
+        def custom_rollback(adapter):
+            profiler.finish()
+            if rollback:
+                rollback(adapter)
+            else:
+                adapter.rollback()
+        response.custom_commit = custom_commit
+        response.custom_rollback = custom_rollback
+
+        return profiler
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def active():
+        """
+            Get the profiler for the current request
+
+            Returns:
+                the S3RequestProfiler instance, or None if the current
+                request is not profiled
+        """
+
+        response = getattr(current, "response", None)
+        if response is None:
+            return None
+        s3 = response.s3
+        return s3.profiler if s3 else None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def count(cls, name, number=1):
+        """
+            Increment a named counter of the current request, if the
+            request is profiled
+
+            Args:
+                name: the counter name
+                number: the increment
+        """
+
+        profiler = cls.active()
+        if profiler is not None:
+            counters = profiler.counters
+            counters[name] = counters.get(name, 0) + number
+
+    # -------------------------------------------------------------------------
+    def instrument(self, db):
+        """
+            Count the queries and the time spent in the database
+
+            Args:
+                db: the DAL instance
+        """
+
+        adapter = db._adapter
+        execute = adapter.execute
+
+        def profiled_execute(*args, **kwargs):
+            start = time.time()
+            try:
+                return execute(*args, **kwargs)
+            finally:
+                self.queries += 1
+                self.dbtime += time.time() - start
+
+        # Remember any previous instrumentation
+        self.execute = (adapter.__dict__.get("execute"), profiled_execute)
+
+        adapter.execute = profiled_execute
+        self.adapter = adapter
+
+    # -------------------------------------------------------------------------
+    def phase(self, name):
+        """
+            Context manager for a phase of the request
+
+            Args:
+                name: the phase name
+        """
+
+        return S3ProfilerPhase(self, name)
+
+    # -------------------------------------------------------------------------
+    def enter(self, name):
+        """
+            Enter a phase
+
+            Args:
+                name: the phase name
+        """
+
+        self.attribute()
+        self.stack.append(name)
+
+    # -------------------------------------------------------------------------
+    def exit(self):
+        """
+            Exit the current phase
+        """
+
+        self.attribute()
+        if self.stack:
+            self.stack.pop()
+
+    # -------------------------------------------------------------------------
+    def attribute(self):
+        """
+            Attribute the time and queries since the last mark to the
+            current phase
+        """
+
+        now = time.time()
+        queries, dbtime = self.queries, self.dbtime
+
+        phase = self.stack[-1] if self.stack else OTHER
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = [0.0, 0, 0.0]
+
+        mark = self.mark
+        stats[0] += now - mark[0]
+        stats[1] += queries - mark[1]
+        stats[2] += dbtime - mark[2]
+
+        self.mark = (now, queries, dbtime)
+
+    # -------------------------------------------------------------------------
+    def postprocess(self, output):
+        """
+            Response postprocessing hook, called when the controller
+            returns, starts the view rendering phase
+
+            Args:
+                output: the controller output
+
+            Returns:
+                the controller output
+        """
+
+        self.attribute()
+        self.stack = ["view"]
+        return output
+
+    # -------------------------------------------------------------------------
+    def finish(self):
+        """
+            Finish profiling the request and add the sample to the store
+        """
+
+        if self.finished:
+            return
+        self.finished = True
+
+        self.attribute()
+        self.stack = []
+
+        # Restore the adapter, unless instrumented again since
+        adapter = self.adapter
+        if adapter is not None:
+            previous, instrumented = self.execute
+            if adapter.__dict__.get("execute") is instrumented:
+                if previous is None:
+                    del adapter.execute
+                else:
+                    adapter.execute = previous
+        self.adapter = self.execute = None
+
+        request = current.request
+        key = "%s/%s/%s" % (request.controller,
+                            request.function,
+                            self.method or request.env.request_method,
+                            )
+        self.key = key
+
+        sample = (self.mark[0] - self.started,
+                  self.queries,
+                  self.dbtime,
+                  dict((k, tuple(v)) for k, v in self.phases.items()),
+                  dict(self.counters),
+                  )
+
+        store = self._store
+        with self._lock:
+            samples = store.get(key)
+            if samples is None:
+                size = current.deployment_settings.get_base_profiler_window()
+                samples = store[key] = deque(maxlen=size)
+                while len(store) > self.STORE_SIZE:
+                    store.popitem(last=False)
+            samples.append(sample)
+
+    # -------------------------------------------------------------------------
+    def summary(self):
+        """
+            The profile of this request (so far)
+
+            Returns:
+                a dict {"time": total time (seconds),
+                        "queries": number of DB queries,
+                        "dbtime": time spent in DB (seconds),
+                        "phases": {phase: {"time", "queries", "dbtime"}},
+                        "counters": {name: number},
+                        }
+        """
+
+        if not self.finished:
+            self.attribute()
+
+        return {"time": self.mark[0] - self.started,
+                "queries": self.queries,
+                "dbtime": self.dbtime,
+                "phases": dict((phase, {"time": stats[0],
+                                        "queries": stats[1],
+                                        "dbtime": stats[2],
+                                        })
+                               for phase, stats in self.phases.items()),
+                "counters": dict(self.counters),
+                }
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def statistics(cls):
+        """
+            Aggregate the samples in the store
+
+            Returns:
+                a dict {controller/function/method: {
+                            "requests": number of samples,
+                            "time": {"mean", "p95", "max"},
+                            "queries": mean number of DB queries,
+                            "dbtime": mean time spent in DB,
+                            "phases": {phase: {"time", "queries", "dbtime"}},
+                            "counters": {name: mean number},
+                            }
+                        }, with all times in seconds and per-phase
+                figures and counters as means over all samples
+        """
+
+        with cls._lock:
+            store = dict((key, list(samples))
+                         for key, samples in cls._store.items())
+
+        output = {}
+        for key, samples in store.items():
+
+            number = len(samples)
+            if not number:
+                continue
+
+            times = sorted(sample[0] for sample in samples)
+            phases = {}
+            counters = {}
+            for sample in samples:
+                for name, value in sample[4].items():
+                    counters[name] = counters.get(name, 0) + value
+                for phase, stats in sample[3].items():
+                    totals = phases.get(phase)
+                    if totals is None:
+                        totals = phases[phase] = [0.0, 0, 0.0]
+                    totals[0] += stats[0]
+                    totals[1] += stats[1]
+                    totals[2] += stats[2]
+
+            output[key] = {
+                "requests": number,
+                "time": {"mean": sum(times) / number,
+                         "p95": times[min(number - 1, int(number * 0.95))],
+                         "max": times[-1],
+                         },
+                "queries": float(sum(sample[1] for sample in samples)) / number,
+                "dbtime": sum(sample[2] for sample in samples) / number,
+                "phases": dict((phase, {"time": totals[0] / number,
+                                        "queries": float(totals[1]) / number,
+                                        "dbtime": totals[2] / number,
+                                        })
+                               for phase, totals in phases.items()),
+                "counters": dict((name, float(total) / number)
+                                 for name, total in counters.items()),
+                }
+
+        return output
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear(cls):
+        """
+            Remove all samples from the store
+        """
+
+        with cls._lock:
+            cls._store.clear()
+
+# =============================================================================
+class S3ProfilerPhase:
+    """ Context manager for a profiled phase of a request """
+
+    def __init__(self, profiler, name):
+        """
+            Args:
+                profiler: the S3RequestProfiler
+                name: the phase name
+        """
+
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.enter(self.name)
+        return self.profiler
+
+    def __exit__(self, *args):
+        self.profiler.exit()
+        return False
+
+# =============================================================================
+def s3_profile(phase):
+    """
+        Context manager to attribute a phase of the current request
+        to the request profiler
+
+        Args:
+            phase: the phase name
+
+        Example:
+            with s3_profile("extract"):
+                ...
+    """
+
+    profiler = S3RequestProfiler.active()
+    return profiler.phase(phase) if profiler else NOPROFILE
+
+# =============================================================================
+def s3_profiled(phase):
+    """
+        Decorator to attribute a function or method to a phase of the
+        current request in the request profiler
+
+        Args:
+            phase: the phase name
+    """
+
+    def decorator(function):
+
+        @wraps(function)
+        def profiled(*args, **kwargs):
+            profiler = S3RequestProfiler.active()
+            if profiler is None:
+                return function(*args, **kwargs)
+            with profiler.phase(phase):
+                return function(*args, **kwargs)
+
+        return profiled
+
+    return decorator
+
+# END =========================================================================
@@ -36,6 +36,7 @@ __all__ = ("FS",
            "S3URLQueryParser",
            )
 
+import copy
 import datetime
 import re
 import sys
@@ -48,7 +49,7 @@ from gluon.storage import Storage
 
 from s3dal import Field, Row
 from .s3fields import S3RepresentLazy
-from .s3utils import s3_get_foreign_key, s3_str, S3TypeConverter
+from .s3utils import s3_get_foreign_key, s3_str, S3LRUCache, S3TypeConverter
 
 ogetattr = object.__getattribute__
 
@@ -1304,6 +1305,40 @@ class S3ResourceQuery:
         else:
             return S3ResourceQuery(self.NOT, self)
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def resolve(resource, selector):
+        """
+            Resolve a field selector against a resource, re-using
+            previous resolutions of the same selector for the same
+            resource instance (virtual filters evaluate the query for
+            every row)
+
+            Args:
+                resource: the S3Resource
+                selector: the field selector (S3FieldSelector or str)
+
+            Returns:
+                S3ResourceField (shared, must not be modified)
+
+            Raises:
+                SyntaxError, AttributeError, KeyError: if the selector
+                                                       can not be resolved
+        """
+
+        if isinstance(selector, S3FieldSelector):
+            selector = selector.name
+
+        resolved = getattr(resource, "_resolved", None)
+        if resolved is None or not isinstance(selector, str):
+            return S3ResourceField(resource, selector)
+
+        rfield = resolved.get(selector)
+        if rfield is None:
+            rfield = resolved[selector] = S3ResourceField(resource, selector)
+
+        return rfield
+
     # -------------------------------------------------------------------------
     def _joins(self, resource, left=False):
 
@@ -1336,7 +1371,7 @@ class S3ResourceQuery:
 
         if isinstance(l, S3FieldSelector):
             try:
-                rfield = l.resolve(resource)
+                rfield = self.resolve(resource, l)
             except (SyntaxError, AttributeError):
                 pass
             else:
@@ -1433,10 +1468,7 @@ class S3ResourceQuery:
 
         l = self.left
         try:
-            if isinstance(l, S3FieldSelector):
-                lfield = l.resolve(resource)
-            else:
-                lfield = S3ResourceField(resource, l)
+            lfield = self.resolve(resource, l)
         except (SyntaxError, AttributeError):
             lfield = None
         if not lfield or lfield.field is None:
@@ -1444,6 +1476,77 @@ class S3ResourceQuery:
         else:
             return self, None
 
+    # -------------------------------------------------------------------------
+    def conjuncts(self):
+        """
+            Get the conjunctive terms of this query (i.e. split at AND)
+
+            Returns:
+                list of S3ResourceQuery
+        """
+
+        if self.op == self.AND:
+            terms = []
+            for term in (self.left, self.right):
+                if isinstance(term, S3ResourceQuery):
+                    terms.extend(term.conjuncts())
+                elif term is not None:
+                    terms.append(term)
+            return terms
+        else:
+            return [self]
+
+    # -------------------------------------------------------------------------
+    def semijoin(self, resource):
+        """
+            Convert this S3ResourceQuery into a semi-join, i.e. a sub-select
+            of the matching record IDs of the resource:
+
+                table.id IN (SELECT table.id FROM table
+                             LEFT JOIN component ON ... WHERE query)
+
+            This is equivalent to joining the components into the master
+            query and selecting DISTINCT, but does not multiply the rows
+            of the master query with multi-valued components, and can be
+            executed as semi-join by the database
+
+            Args:
+                resource: the resource to resolve the query against
+
+            Returns:
+                tuple (query, tables), where query is the DAL query (or
+                None/False, see query()), and tables a dict {tablename: Table}
+                of the tables joined in the sub-select
+        """
+
+        query = self.query(resource)
+        if query is None or query is False:
+            return query, {}
+
+        table = resource.table
+        tablename = table._tablename
+
+        ijoins = S3Joins(tablename)
+        ijoins.extend(self._joins(resource, left=False)[0])
+        ljoins = S3Joins(tablename)
+        ljoins.extend(self._joins(resource, left=True)[0])
+
+        # Authorize the joined tables the same way as S3ResourceData does
+        aqueries = {}
+        join = ijoins.as_list(aqueries=aqueries, prefer=ljoins)
+        left = ljoins.as_list(aqueries=aqueries)
+
+        tables = {}
+        for j in join + left:
+            jtable = j.first
+            tables[jtable._tablename] = jtable
+
+        subselect = current.db(query)._select(table._id,
+                                              join = join,
+                                              left = left,
+                                              )
+        return table._id.belongs(subselect), tables
+
     # -------------------------------------------------------------------------
     def transform(self, resource):
         """
@@ -1502,7 +1605,7 @@ class S3ResourceQuery:
         # Resolve the fields
         if isinstance(l, S3FieldSelector):
             try:
-                rfield = S3ResourceField(resource, l.name)
+                rfield = self.resolve(resource, l)
             except (SyntaxError, AttributeError):
                 return None
             if rfield.virtual:
@@ -1516,7 +1619,7 @@ class S3ResourceQuery:
             return None # not a field at all
         if isinstance(r, S3FieldSelector):
             try:
-                rfield = S3ResourceField(resource, r.name)
+                rfield = self.resolve(resource, r)
             except (SyntaxError, AttributeError):
                 return None
             rfield = rfield.field
@@ -1622,7 +1725,9 @@ class S3ResourceQuery:
                 r: the right operand
         """
 
-        hierarchy, field, nodeset, none = self._resolve_hierarchy(l, r)
+        hierarchy, field, nodeset, none = self._resolve_hierarchy(l, r,
+                                                                  expand = False,
+                                                                  )
         if not hierarchy:
             # Not a hierarchical query => use simple belongs
             return self._query_belongs(l, r)
@@ -1632,15 +1737,20 @@ class S3ResourceQuery:
 
         # Construct the subquery
         list_type = str(field.type)[:5] == "list:"
-        if nodeset:
+        q = None
+        if nodeset and hierarchy.config is not None:
+            if not list_type:
+                # Resolve the subtrees in the database, if possible
+                q = hierarchy.subtree_query(field, nodeset)
+            if q is None:
+                nodeset = hierarchy.findall(nodeset, inclusive=True)
+        if q is None and nodeset:
             if list_type:
                 q = (field.contains(list(nodeset)))
             elif len(nodeset) > 1:
                 q = (field.belongs(nodeset))
             else:
                 q = (field == tuple(nodeset)[0])
-        else:
-            q = None
 
         if none:
             # None needs special handling with older DAL versions
@@ -1657,13 +1767,19 @@ class S3ResourceQuery:
 
     # -------------------------------------------------------------------------
     @classmethod
-    def _resolve_hierarchy(cls, l, r):
+    def _resolve_hierarchy(cls, l, r, expand=True):
         """
             Resolve the hierarchical lookup in a typeof-query
 
             Args:
                 l: the left operand
                 r: the right operand
+                expand: expand the nodes into all their descendants
+
+            Returns:
+                tuple (hierarchy, field, nodeset, none), where hierarchy
+                is the S3Hierarchy (or False if the query is not
+                hierarchical)
         """
 
         from .s3hierarchy import S3Hierarchy
@@ -1710,7 +1826,7 @@ class S3ResourceQuery:
                     subquery = None
                 if not subquery:
                     # Field doesn't exist
-                    return True, None, None, None
+                    return hierarchy, None, None, None
 
                 # Execute query and retrieve the lookup table IDs
                 DELETED = current.xml.DELETED
@@ -1738,7 +1854,7 @@ class S3ResourceQuery:
                     except ValueError:
                         continue
                     nodes.add(node_id)
-            if hierarchy.config is not None:
+            if expand and hierarchy.config is not None:
                 nodeset = hierarchy.findall(nodes, inclusive=True)
             else:
                 nodeset = nodes
@@ -1746,7 +1862,7 @@ class S3ResourceQuery:
         elif keys is None:
             none = True
 
-        return True, field, nodeset, none
+        return hierarchy, field, nodeset, none
 
     # -------------------------------------------------------------------------
     @staticmethod
@@ -1900,7 +2016,7 @@ class S3ResourceQuery:
         left = self.left
         if isinstance(left, S3FieldSelector):
             try:
-                lfield = left.resolve(resource)
+                lfield = self.resolve(resource, left)
             except (AttributeError, KeyError, SyntaxError):
                 return None
             if lfield.field is not None:
@@ -1915,7 +2031,7 @@ class S3ResourceQuery:
         right = self.right
         if isinstance(right, S3FieldSelector):
             try:
-                rfield = right.resolve(resource)
+                rfield = self.resolve(resource, right)
             except (AttributeError, KeyError, SyntaxError):
                 return None
             if rfield.virtual:
@@ -2236,6 +2352,9 @@ class S3URLQuery:
 
     FILTEROP = re.compile(r"__(?!link\.)([_a-z\!]+)$")
 
+    # Process-wide cache of parsed filters, see cache()
+    _cache = None
+
     # -------------------------------------------------------------------------
     @classmethod
     def parse(cls, resource, get_vars):
@@ -2249,12 +2368,136 @@ class S3URLQuery:
             Returns:
                 Storage of S3ResourceQuery like {alias: query}, where
                 alias is the alias of the component the query concerns
-        """
 
-        query = Storage()
+            Note:
+                Parsed filters are cached between requests; the Storage
+                and the query lists are the caller's, but the queries
+                themselves are shared with the cache and must therefore
+                not be modified in-place (combine them with &, | and ~
+                into new queries instead)
+        """
 
         if resource is None or not get_vars:
-            return query
+            return Storage()
+
+        cache = cls.cache()
+        key = cls.cache_key(resource, get_vars) if cache is not None else None
+        if key is None:
+            return cls._parse(resource, get_vars)
+
+        parsed = cache.get(key)
+        if parsed is None:
+            # Copy once when storing, so that the cached queries are
+            # independent of the parse result returned to the caller
+            query = cls._parse(resource, get_vars)
+            parsed = tuple((alias, tuple(copy.deepcopy(queries)))
+                           for alias, queries in query.items())
+            cache.set(key, parsed)
+        else:
+            query = Storage((alias, list(queries)) for alias, queries in parsed)
+        return query
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def cache(cls):
+        """
+            Get the process-wide cache for parsed filters
+
+            Returns:
+                S3LRUCache, or None if disabled by deployment setting
+        """
+
+        cache = cls._cache
+        if cache is None:
+            maxsize = current.deployment_settings.get_base_filter_cache()
+            if maxsize:
+                cache = S3URLQuery._cache = S3LRUCache(maxsize=maxsize)
+        return cache
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def cache_stats(cls):
+        """
+            Get the hit/miss statistics of the filter cache
+
+            Returns:
+                dict {size, maxsize, hits, misses, ratio}, or None
+                if the cache is disabled
+        """
+
+        cache = cls.cache()
+        return cache.stats() if cache is not None else None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear_cache(cls, tablename=None):
+        """
+            Remove parsed filters from the cache
+
+            Args:
+                tablename: remove only the filters for this table,
+                           None to clear the cache entirely
+        """
+
+        cache = cls._cache
+        if cache is None:
+            return
+        if tablename:
+            cache.clear(condition=lambda key: key[0] == tablename)
+        else:
+            cache.clear()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def cache_key(cls, resource, get_vars):
+        """
+            Get the cache key for the filters in get_vars; since parsing
+            is independent of the current user and does not yet involve
+            any table definitions, the key consists of the resource
+            tablename and alias, and the normalized filter expressions
+
+            Args:
+                resource: the S3Resource
+                get_vars: the get_vars
+
+            Returns:
+                the cache key (tuple), or None if get_vars do not
+                contain any filter expressions
+        """
+
+        items = []
+        for k, v in get_vars.items():
+            if not k or \
+               k != "$filter" and \
+               (k[0] == "_" or not("." in k or k[0] == "(" and ")" in k)):
+                continue
+            if type(v) is list:
+                v = tuple(s3_str(item) for item in v)
+            else:
+                v = s3_str(v)
+            items.append((k, v))
+
+        if not items:
+            return None
+
+        items.sort()
+        return (resource.tablename, resource.alias, tuple(items))
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _parse(cls, resource, get_vars):
+        """
+            Parse the filters in get_vars (uncached)
+
+            Args:
+                resource: the S3Resource
+                get_vars: the get_vars
+
+            Returns:
+                Storage of S3ResourceQuery like {alias: query}
+        """
+
+        query = Storage()
 
         subquery = cls._subquery
         allof = lambda l, r: l if r is None else r if l is None else r & l
@@ -2267,9 +2510,6 @@ class S3URLQuery:
             elif key == "$filter":
                 # Instantiate the advanced filter parser
                 parser = S3URLQueryParser()
-                if parser.parser is None:
-                    # not available
-                    continue
 
                 # Multiple $filter expressions?
                 expressions = value if type(value) is list else [value]
@@ -2656,64 +2896,38 @@ combine = lambda x, y: x & y if x is not None else y
 
 # =============================================================================
 class S3URLQueryParser:
-    """ New-style URL Filter Parser """
-
-    def __init__(self):
-
-        self.parser = None
-        self.ParseResults = None
-        self.ParseException = None
-
-        self._parser()
-
-    # -------------------------------------------------------------------------
-    def _parser(self):
-        """ Import PyParsing and define the syntax for filter expressions """
-
-        # PyParsing available?
-        try:
-            import pyparsing as pp
-        except ImportError:
-            current.log.error("Advanced filter syntax requires pyparsing, $filter ignored")
-            return False
+    """
+        New-style URL Filter Parser
 
-        # Selector Syntax
-        context = lambda s, l, t: t[0].replace("[", "(").replace("]", ")")
-        selector = pp.Word(pp.alphas + "[]~", pp.alphanums + "_.$:[]")
-        selector.setParseAction(context)
+        Recursive-descent parser for filter expressions like:
+            ~.name like "Test*" and not(lower(contact.value) eq "x",NONE)
 
-        keyword = lambda x, y: x | pp.Keyword(y) if x else pp.Keyword(y)
+        Operator precedence is NOT > AND > OR; a trailing part of the
+        expression that can not be parsed is ignored.
+    """
 
-        # Expression Syntax
-        function = reduce(keyword, S3FieldSelector.OPERATORS)
-        expression = function + \
-                     pp.Literal("(").suppress() + \
-                     selector + \
-                     pp.Literal(")").suppress()
+    # Selector: ~.field, alias.field$other, [alias].field etc.
+    SELECTOR = re.compile(r"[A-Za-z\[\]~][A-Za-z0-9_.$:\[\]]*")
 
-        # Comparison Syntax
-        comparison = reduce(keyword, S3ResourceQuery.COMPARISON)
+    # Keywords (operators, functions)
+    KEYWORD = re.compile(r"[A-Za-z0-9_$]+")
+    KEYWORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz"
+                              "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+                              "0123456789_$")
 
-        # Value Syntax
-        number = pp.Regex(r"[+-]?\d+(:?\.\d*)?(:?[eE][+-]?\d+)?")
-        value = number | \
-                pp.Keyword("NONE") | \
-                pp.quotedString | \
-                pp.Word(pp.alphanums + pp.printables)
-        qe = pp.Group(pp.Group(expression | selector) +
-                      comparison +
-                      pp.originalTextFor(pp.delimitedList(value, combine=True)))
+    # Values
+    NUMBER = re.compile(r"[+-]?\d+(:?\.\d*)?(:?[eE][+-]?\d+)?")
+    DQUOTED = re.compile(r'"(?:[^"\n\r\\]|(?:"")|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*')
+    SQUOTED = re.compile(r"'(?:[^'\n\r\\]|(?:'')|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*")
+    WORD = re.compile(r"[!-~]+")
 
-        parser = pp.operatorPrecedence(qe, [("not", 1, pp.opAssoc.RIGHT, ),
-                                            ("and", 2, pp.opAssoc.LEFT, ),
-                                            ("or", 2, pp.opAssoc.LEFT, ),
-                                            ])
+    WHITESPACE = " \t\n\r"
 
-        self.parser = parser
-        self.ParseResults = pp.ParseResults
-        self.ParseException = pp.ParseException
+    def __init__(self):
 
-        return True
+        # Kept for backwards-compatibility (the parser used to require
+        # PyParsing, and was None if that was not available)
+        self.parser = self
 
     # -------------------------------------------------------------------------
     def parse(self, expression):
@@ -2730,61 +2944,242 @@ class S3URLQueryParser:
 
         query = {}
 
-        parser = self.parser
-        if not expression or parser is None:
+        if not expression:
             return query
 
-        try:
-            parsed = parser.parseString(expression)
-        except self.ParseException:
+        parsed = self._disjunction(expression, 0)
+        if parsed is None:
             current.log.error("Invalid URL Filter Expression: '%s'" %
                               expression)
         else:
-            if parsed:
-                query = self.convert_expression(parsed[0])
+            query = parsed[0]
         return query
 
     # -------------------------------------------------------------------------
-    def convert_expression(self, expression):
+    # Grammar rules
+    # - all take the expression and the current position, and return
+    #   a tuple (result, end position), or None if the rule does not
+    #   match at this position
+    # -------------------------------------------------------------------------
+    def _disjunction(self, expression, pos):
+        """
+            Disjunction: conjunction [or conjunction]...
+        """
+
+        parsed = self._conjunction(expression, pos)
+        if parsed is None:
+            return None
+
+        query, pos = parsed
+        while True:
+            end = self._keyword(expression, pos, ("or",))
+            if end is None:
+                break
+            parsed = self._conjunction(expression, end[1])
+            if parsed is None:
+                break
+            query = self._or(query, parsed[0])
+            pos = parsed[1]
+
+        return query, pos
+
+    # -------------------------------------------------------------------------
+    def _conjunction(self, expression, pos):
+        """
+            Conjunction: negation [and negation]...
+        """
+
+        parsed = self._negation(expression, pos)
+        if parsed is None:
+            return None
+
+        query, pos = parsed
+        while True:
+            end = self._keyword(expression, pos, ("and",))
+            if end is None:
+                break
+            parsed = self._negation(expression, end[1])
+            if parsed is None:
+                break
+            query = self._and(query, parsed[0])
+            pos = parsed[1]
+
+        return query, pos
+
+    # -------------------------------------------------------------------------
+    def _negation(self, expression, pos):
+        """
+            Negation: [not] negation | (disjunction) | comparison
+        """
+
+        end = self._keyword(expression, pos, ("not",))
+        if end is not None:
+            parsed = self._negation(expression, end[1])
+            if parsed is not None:
+                return self._not(parsed[0]), parsed[1]
+
+        pos = self._skip(expression, pos)
+        if expression[pos:pos+1] == "(":
+            parsed = self._disjunction(expression, pos + 1)
+            if parsed is not None:
+                end = self._skip(expression, parsed[1])
+                if expression[end:end+1] == ")":
+                    return parsed[0], end + 1
+            return None
+
+        return self._comparison(expression, pos)
+
+    # -------------------------------------------------------------------------
+    def _comparison(self, expression, pos):
+        """
+            Comparison: operand operator value[,value]...
+        """
+
+        parsed = self._operand(expression, pos)
+        if parsed is None:
+            return None
+        selector, pos = parsed
+
+        parsed = self._keyword(expression, pos, S3ResourceQuery.COMPARISON)
+        if parsed is None:
+            return None
+        op, pos = parsed
+
+        # Values (no whitespace within the list)
+        start = pos = self._skip(expression, pos)
+        end = self._value(expression, pos)
+        if end is None:
+            return None
+        while expression[end:end+1] == ",":
+            pos = self._value(expression, end + 1)
+            if pos is None:
+                break
+            end = pos
+
+        return self._query(op, selector, expression[start:end]), end
+
+    # -------------------------------------------------------------------------
+    def _operand(self, expression, pos):
+        """
+            Operand: function(selector) | selector
+
+            Returns:
+                tuple (S3FieldSelector, end position)
+        """
+
+        selector = self._selector
+
+        parsed = self._keyword(expression, pos, S3FieldSelector.OPERATORS)
+        if parsed is not None:
+            function, end = parsed
+            end = self._skip(expression, end)
+            if expression[end:end+1] == "(":
+                parsed = selector(expression, end + 1)
+                if parsed is not None:
+                    name, end = parsed
+                    end = self._skip(expression, end)
+                    if expression[end:end+1] == ")":
+                        fs = S3FieldSelector(name)
+                        fs.op = function
+                        return fs, end + 1
+
+        parsed = selector(expression, pos)
+        if parsed is None:
+            return None
+        name, end = parsed
+
+        return S3FieldSelector(name), end
+
+    # -------------------------------------------------------------------------
+    def _selector(self, expression, pos):
+        """
+            Field selector, with [] as alternative for () in context
+            selectors
+
+            Returns:
+                tuple (selector string, end position)
+        """
+
+        match = self.SELECTOR.match(expression, self._skip(expression, pos))
+        if not match:
+            return None
+
+        name = match.group()
+        if "[" in name or "]" in name:
+            name = name.replace("[", "(").replace("]", ")")
+
+        return name, match.end()
+
+    # -------------------------------------------------------------------------
+    def _value(self, expression, pos):
+        """
+            Single value: number | NONE | quoted string | word
+
+            Returns:
+                the end position of the value
+        """
+
+        match = self.NUMBER.match(expression, pos)
+        if match:
+            return match.end()
+
+        if expression.startswith("NONE", pos) and \
+           expression[pos+4:pos+5] not in self.KEYWORD_CHARS:
+            return pos + 4
+
+        for quoted, quote in ((self.DQUOTED, '"'), (self.SQUOTED, "'")):
+            match = quoted.match(expression, pos)
+            if match:
+                end = match.end()
+                if expression[end:end+1] == quote:
+                    return end + 1
+
+        match = self.WORD.match(expression, pos)
+        if match:
+            return match.end()
+
+        return None
+
+    # -------------------------------------------------------------------------
+    def _keyword(self, expression, pos, keywords):
         """
-            Convert a parsed filter expression into a dict of
-            filters (S3ResourceQueries)
+            Keyword (operator or function name), must not be directly
+            followed (or preceded) by another name character
 
             Args:
-                expression: the parsed filter expression (ParseResults)
+                keywords: the acceptable keywords
 
             Returns:
-                A dict of {component_alias: filter_query}
+                tuple (keyword, end position)
         """
 
-        ParseResults = self.ParseResults
-        convert = self.convert_expression
-
-        if isinstance(expression, ParseResults):
-            first, op, second = ([None, None, None] + list(expression))[-3:]
-
-            if isinstance(first, ParseResults):
-                first = convert(first)
-            if isinstance(second, ParseResults):
-                second = convert(second)
-
-            if op == "not":
-                return self._not(second)
-            elif op == "and":
-                return self._and(first, second)
-            elif op == "or":
-                return self._or(first, second)
-            elif op in S3ResourceQuery.COMPARISON:
-                return self._query(op, first, second)
-            elif op in S3FieldSelector.OPERATORS and second:
-                selector = S3FieldSelector(second)
-                selector.op = op
-                return selector
-            elif op is None and second:
-                return S3FieldSelector(second)
-        else:
+        pos = self._skip(expression, pos)
+        if pos and expression[pos-1] in self.KEYWORD_CHARS:
             return None
 
+        match = self.KEYWORD.match(expression, pos)
+        if match:
+            keyword = match.group()
+            if keyword in keywords:
+                return keyword, match.end()
+
+        return None
+
+    # -------------------------------------------------------------------------
+    def _skip(self, expression, pos):
+        """
+            Skip whitespace
+
+            Returns:
+                the position of the next non-whitespace character
+        """
+
+        whitespace = self.WHITESPACE
+        length = len(expression)
+        while pos < length and expression[pos] in whitespace:
+            pos += 1
+        return pos
+
     # -------------------------------------------------------------------------
     def _and(self, first, second):
         """
@@ -36,6 +36,8 @@ __all__ = ("S3AxisFilter",
            "S3ResourceFilter",
            )
 
+import datetime
+import hashlib
 import json
 import sys
 
@@ -59,10 +61,12 @@ from s3dal import Expression, Field, Row, Rows, Table, S3DAL, VirtualCommand
 from .s3data import S3DataTable, S3DataList
 from .s3datetime import s3_format_datetime
 from .s3fields import s3_all_meta_field_names
+from .s3indexes import s3_query_origin
+from .s3profiler import S3RequestProfiler, s3_profiled
 from .s3query import FS, S3ResourceField, S3ResourceQuery, S3Joins, S3URLQuery
-from .s3utils import s3_get_last_record_id, s3_has_foreign_key, s3_remove_last_record_id, s3_str
+from .s3utils import S3LRUCache, s3_get_last_record_id, s3_has_foreign_key, s3_remove_last_record_id, s3_str
 from .s3validators import IS_ONE_OF
-from .s3xml import S3XMLFormat
+from .s3xml import S3CSVMapping, S3XMLFormat
 
 osetattr = object.__setattr__
 ogetattr = object.__getattribute__
@@ -70,6 +74,17 @@ ogetattr = object.__getattribute__
 MAXDEPTH = 10
 DEFAULT = lambda: None
 
+# Maximum number of entries in the count cache
+COUNT_CACHE_SIZE = 1000
+
+# Maximum number of record IDs to pass to an extra filter method at once
+EXTRA_FILTER_BATCH = 2000
+
+# Field types supported as sort keys in keyset pagination
+KEYSET_TYPES = ("id", "integer", "bigint", "reference", "double",
+                "boolean", "string", "date", "datetime", "time",
+                )
+
 # =============================================================================
 class S3Resource:
     """
@@ -223,6 +238,9 @@ class S3Resource:
         # Resource Filter
         self.rfilter = None
 
+        # Field selectors resolved by S3ResourceQuery {selector: rfield}
+        self._resolved = {}
+
         # Rows ----------------------------------------------------------------
 
         self._rows = None
@@ -464,6 +482,7 @@ class S3Resource:
     # -------------------------------------------------------------------------
     # Data access (new API)
     # -------------------------------------------------------------------------
+    @s3_query_origin
     def count(self, left=None, distinct=False):
         """
             Get the total number of available records in this resource
@@ -481,6 +500,7 @@ class S3Resource:
         return self._length
 
     # -------------------------------------------------------------------------
+    @s3_query_origin
     def select(self,
                fields,
                start = 0,
@@ -496,6 +516,7 @@ class S3Resource:
                represent = False,
                show_links = True,
                raw_data = False,
+               seek = None,
                ):
         """
             Extract data from this resource
@@ -514,6 +535,10 @@ class S3Resource:
                 as_rows: return the rows (don't extract)
                 represent: render field value representations
                 raw_data: include raw data in the result
+                seek: use keyset pagination, the last-seen sort key
+                      (list of values of the orderby-fields followed by
+                      the record ID, or an empty list for the first page),
+                      see S3ResourceData.seek_query
         """
 
         data = S3ResourceData(self,
@@ -531,12 +556,86 @@ class S3Resource:
                               represent = represent,
                               show_links = show_links,
                               raw_data = raw_data,
+                              seek = seek,
                               )
         if as_rows:
             return data.rows
         else:
             return data
 
+    # -------------------------------------------------------------------------
+    def iter_select(self,
+                    fields,
+                    chunk_size = 1000,
+                    left = None,
+                    orderby = None,
+                    distinct = False,
+                    virtual = True,
+                    represent = False,
+                    show_links = True,
+                    raw_data = False,
+                    ):
+        """
+            Extract data from this resource in chunks, so that the memory
+            required depends on the chunk size rather than on the total
+            number of records (e.g. for exports or asynchronous tasks)
+
+            Args:
+                fields: the fields to extract (selector strings)
+                chunk_size: maximum number of records per chunk
+                left: additional left joins required for filters
+                orderby: orderby-expression for DAL (the primary key is
+                         used as default and tie-breaker, to produce a
+                         stable order across chunks)
+                distinct: select distinct rows
+                virtual: include mandatory virtual fields
+                represent: render field value representations
+                show_links: allow representation functions to render
+                            links as HTML
+                raw_data: include raw data in the result
+
+            Yields:
+                lists of rows (same format as S3ResourceData.rows), each
+                chunk extracted and represented with a separate query
+
+            Note:
+                Subsequent chunks are selected by keyset pagination where
+                possible, otherwise by offset (see S3ResourceData.seek_query)
+        """
+
+        if chunk_size < 1:
+            raise ValueError("invalid chunk size: %s" % chunk_size)
+
+        if orderby is None:
+            orderby = self._id
+
+        start = 0
+        seek = []
+        while True:
+            data = S3ResourceData(self,
+                                  fields,
+                                  start = start,
+                                  limit = chunk_size,
+                                  left = left,
+                                  orderby = orderby,
+                                  distinct = distinct,
+                                  virtual = virtual,
+                                  represent = represent,
+                                  show_links = show_links,
+                                  raw_data = raw_data,
+                                  seek = seek,
+                                  )
+            rows = data.rows
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                break
+
+            # Continue behind the last record (by offset if the sort
+            # key is not available, e.g. due to virtual filters)
+            start += len(rows)
+            seek = data.seek
+
     # -------------------------------------------------------------------------
     def insert(self, **fields):
         """
@@ -707,10 +806,12 @@ class S3Resource:
         # Determine which components to approve
         # NB: Components are pre-filtered with the master filter, too
         if components:
-            # FIXME this is probably wrong => should load
-            #       the components which are to be approved
-            cdict = self.components.exposed
-            components = [cdict[k] for k in cdict if k in components]
+            # Load only the exposed components which are to be approved
+            exposed_aliases = self.components.exposed_aliases
+            get_component = self.components.get
+            components = [get_component(alias) for alias in components
+                          if alias in exposed_aliases]
+            components = [c for c in components if c is not None]
         else:
             # Approve all currently attached components
             # FIXME use exposed.values()
@@ -898,6 +999,8 @@ class S3Resource:
                   left = None,
                   orderby = None,
                   distinct = False,
+                  seek = None,
+                  estimate = False,
                   ):
         """
             Generate a data table of this resource
@@ -909,6 +1012,12 @@ class S3Resource:
                 left: additional left joins for DB query
                 orderby: orderby for DB query
                 distinct: distinct-flag for DB query
+                seek: the last-seen sort key for keyset pagination
+                      (see S3ResourceData.seek_query), None to use
+                      OFFSET/LIMIT pagination
+                estimate: allow an estimate for the total number of
+                          matching rows if the exact number is not known
+                          yet (see S3ResourceFilter.estimate)
 
             Returns:
                 tuple (S3DataTable, numrows), where numrows represents
@@ -945,6 +1054,17 @@ class S3Resource:
         id_repr = table_id.represent
         table_id.represent = None
 
+        # Count separately if an estimate is acceptable
+        if self.rfilter is None:
+            self.build_query()
+        estimate = estimate and not distinct and limit is not None and \
+                   self.get_filter() is None and \
+                   not self.rfilter.get_extra_filters()
+        if estimate:
+            numrows, exact = self.rfilter.estimate(left=left)
+        else:
+            numrows, exact = None, True
+
         # Extract the data
         data = self.select(selectors,
                            start = start,
@@ -952,12 +1072,15 @@ class S3Resource:
                            orderby = orderby,
                            left = left,
                            distinct = distinct,
-                           count = True,
+                           count = not estimate,
                            getids = False,
                            represent = True,
+                           seek = seek,
                            )
 
         rows = data.rows
+        if not estimate:
+            numrows = data.numrows
 
         # Restore ID representation
         table_id.represent = id_repr
@@ -982,9 +1105,11 @@ class S3Resource:
                          rows,
                          orderby = orderby,
                          empty = empty,
+                         seek = data.seek,
+                         estimated = not exact,
                          )
 
-        return dt, data.numrows
+        return dt, numrows
 
     # -------------------------------------------------------------------------
     def datalist(self,
@@ -1608,14 +1733,7 @@ class S3Resource:
 
         # XSLT transformation
         if tree and xmlformat is not None:
-            import uuid
-            args.update(domain = xml.domain,
-                        base_url = current.response.s3.base_url,
-                        prefix = self.prefix,
-                        name = self.name,
-                        utcnow = s3_format_datetime(),
-                        msguid = uuid.uuid4().urn,
-                        )
+            self.__stylesheet_args(args)
             tree = xmlformat.transform(tree, **args)
 
         # Convert into the requested format
@@ -1630,6 +1748,296 @@ class S3Resource:
 
         return output
 
+    # -------------------------------------------------------------------------
+    def export_stream(self,
+                      output,
+                      page_size = None,
+                      start = None,
+                      limit = None,
+                      msince = None,
+                      fields = None,
+                      dereference = True,
+                      maxdepth = MAXDEPTH,
+                      mcomponents = DEFAULT,
+                      rcomponents = None,
+                      references = None,
+                      mdata = False,
+                      stylesheet = None,
+                      maxbounds = False,
+                      filters = None,
+                      pretty_print = False,
+                      location_data = None,
+                      map_data = None,
+                      target = None,
+                      **args
+                      ):
+        """
+            Export this resource as S3XML, incrementally: builds the tree
+            for one page of master records at a time and writes its
+            <resource> elements to the output as they are produced, so
+            that memory use does not depend on the number of records
+
+            Args:
+                output: writable file-like object (binary), e.g. a
+                        temporary file or the HTTP response body
+                page_size: number of master records per page
+                           (default: settings.base.export_page_size)
+                stylesheet: path to the XSLT stylesheet (if required),
+                            applied page by page if it declares streaming
+                            (see S3XMLFormat.get_streaming), otherwise
+                            the complete tree is built and transformed
+                other args: see export_xml
+
+            Returns:
+                the number of exported master records, or None if the
+                XSLT transformation failed (error in current.xml.error)
+
+            Note:
+                - record identities are remembered across pages so that
+                  referenced records are exported only once, and references
+                  to records in previous pages can still be resolved - except
+                  when transforming page by page, as the stylesheet sees only
+                  one page at a time
+                - the master records are selected from a copy of this
+                  resource with the export filters added, and each page is
+                  exported from a new resource with the component filters
+                  of this resource (URL filters, component ID), so this
+                  resource remains unchanged
+        """
+
+        xml = current.xml
+        s3db = current.s3db
+
+        args = Storage(args)
+
+        if page_size is None:
+            page_size = current.deployment_settings.get_base_export_page_size()
+        if not page_size or page_size < 1:
+            raise ValueError("invalid page size: %s" % page_size)
+
+        if mcomponents is DEFAULT:
+            mcomponents = []
+
+        from .s3rtb import S3ResourceTree
+
+        # Stylesheet
+        if stylesheet:
+            xmlformat = S3XMLFormat(stylesheet)
+            streaming = xmlformat.get_streaming()
+            if streaming is None:
+                # Stylesheet requires the complete tree
+                result = self.export_xml(start = start,
+                                         limit = limit,
+                                         msince = msince,
+                                         fields = fields,
+                                         dereference = dereference,
+                                         maxdepth = maxdepth,
+                                         mcomponents = mcomponents,
+                                         rcomponents = rcomponents,
+                                         references = references,
+                                         mdata = mdata,
+                                         stylesheet = stylesheet,
+                                         maxbounds = maxbounds,
+                                         filters = filters,
+                                         pretty_print = pretty_print,
+                                         location_data = location_data,
+                                         map_data = map_data,
+                                         target = target,
+                                         **args)
+                if not result:
+                    return None
+                output.write(result)
+                return self.results
+            self.__stylesheet_args(args)
+        else:
+            xmlformat = streaming = None
+
+        rfilter = self.rfilter
+        if rfilter is None:
+            rfilter = self.build_query()
+        exposed = self.components.exposed_aliases
+
+        def copy(record_ids=None):
+            """
+                Copy this resource, with the component filters
+
+                Args:
+                    record_ids: the master record IDs, None to copy
+                                all filters of the master resource
+
+                Returns:
+                    the new S3Resource
+            """
+
+            resource = s3db.resource(self.tablename,
+                                     id = record_ids,
+                                     components = exposed,
+                                     include_deleted = self.include_deleted,
+                                     approved = self._approved,
+                                     unapproved = self._unapproved,
+                                     )
+            rfilter.copy_to(resource, components_only=record_ids is not None)
+            return resource
+
+        # Apply the export filters once (to a copy of this resource), and
+        # select the master record IDs page by page with the same order
+        # as S3ResourceTree.load_records
+        table = self.table
+        selection = copy()
+        S3ResourceTree.add_filters(selection,
+                                   msince = msince,
+                                   sync_filters = filters,
+                                   )
+        MTIME = xml.MTIME
+        if msince and MTIME in table.fields:
+            # Record ID as tie-breaker, as MTIME is neither unique
+            # nor NOT NULL (so pages are selected with OFFSET)
+            orderby = [table[MTIME], table._id]
+        else:
+            orderby = table._id
+
+        # Total number of results
+        offset = start if start else 0
+        results = max(selection.count() - offset, 0)
+        if limit is not None:
+            results = min(results, limit)
+
+        # Shared map of exported record identities
+        exported = {}
+
+        def pages():
+            """
+                Build the trees for all pages of master records
+
+                Yields:
+                    ElementTree (S3XML) per page, at least one
+            """
+
+            colname = str(selection._id)
+
+            position = offset
+            remaining = results
+            seek = None if position else []
+            while True:
+                size = min(page_size, remaining)
+                if size > 0:
+                    data = selection.select([table._id.name],
+                                            start = position,
+                                            limit = size,
+                                            orderby = orderby,
+                                            virtual = False,
+                                            seek = seek,
+                                            )
+                    record_ids = [row[colname] for row in data.rows]
+                else:
+                    data, record_ids = None, []
+                if record_ids:
+                    resource = copy(record_ids)
+                elif position != offset:
+                    break
+                else:
+                    # No records => build an empty tree
+                    resource = copy([])
+
+                rtree = S3ResourceTree(resource,
+                                       location_data = location_data,
+                                       map_data = map_data,
+                                       )
+                if streaming is None:
+                    rtree.exported = exported
+                yield rtree.build(msince = msince,
+                                  fields = fields,
+                                  dereference = dereference,
+                                  maxdepth = maxdepth,
+                                  mcomponents = mcomponents,
+                                  rcomponents = rcomponents,
+                                  references = references,
+                                  sync_filters = filters,
+                                  mdata = mdata,
+                                  xmlformat = xmlformat,
+                                  target = target,
+                                  )
+
+                if len(record_ids) < size or not record_ids:
+                    break
+
+                # Continue behind the last record (by offset if keyset
+                # pagination is not possible with this orderby)
+                position += len(record_ids)
+                remaining -= len(record_ids)
+                seek = data.seek if seek is not None else None
+
+        if streaming is None:
+            # Root element with the attributes of the complete export
+            root = xml.tree(None,
+                            root = etree.Element(xml.TAG.root),
+                            domain = xml.domain,
+                            url = current.response.s3.base_url if xml.show_urls else None,
+                            results = results,
+                            start = start,
+                            limit = limit,
+                            maxbounds = maxbounds,
+                            ).getroot()
+            root.set(xml.ATTRIBUTE.success, json.dumps(bool(results)))
+            if map_data:
+                root.set("map", json.dumps(map_data))
+
+            with etree.xmlfile(output, encoding="utf-8") as xf:
+                xf.write_declaration()
+                with xf.element(root.tag, dict(root.attrib)):
+                    for page in pages():
+                        for element in page.getroot():
+                            xf.write(element, pretty_print=pretty_print)
+        else:
+            # Transform page by page
+            items = streaming.get("items")
+
+            page_trees = pages()
+            tree = xmlformat.transform(next(page_trees), **args)
+            root = tree.getroot() if tree is not None else None
+            if root is None:
+                return None
+
+            with etree.xmlfile(output, encoding="utf-8") as xf:
+                xf.write_declaration()
+                with xf.element(root.tag, dict(root.attrib), nsmap=root.nsmap):
+                    for element in root:
+                        xf.write(element, pretty_print=pretty_print)
+                    for page in page_trees:
+                        tree = xmlformat.transform(page, **args)
+                        root = tree.getroot() if tree is not None else None
+                        if root is None:
+                            # Abort (incomplete output)
+                            results = None
+                            break
+                        for element in root:
+                            if not isinstance(element.tag, str):
+                                continue
+                            if items and etree.QName(element).localname != items:
+                                continue
+                            xf.write(element, pretty_print=pretty_print)
+
+        self.results = results
+        return results
+
+    # -------------------------------------------------------------------------
+    def __stylesheet_args(self, args):
+        """
+            Add the standard parameters for export stylesheets
+
+            Args:
+                args: the stylesheet parameters (dict, updated in-place)
+        """
+
+        import uuid
+        args.update(domain = current.xml.domain,
+                    base_url = current.response.s3.base_url,
+                    prefix = self.prefix,
+                    name = self.name,
+                    utcnow = s3_format_datetime(),
+                    msguid = uuid.uuid4().urn,
+                    )
+
     # -------------------------------------------------------------------------
     # XML Import
     # -------------------------------------------------------------------------
@@ -1648,6 +2056,7 @@ class S3Resource:
                    conflict_policy = None,
                    last_sync = None,
                    onconflict = None,
+                   stream = False,
                    **args
                    ):
         """
@@ -1671,6 +2080,11 @@ class S3Resource:
                 conflict_policy: policy for conflict resolution (sync)
                 last_sync: last synchronization datetime (sync)
                 onconflict: callback hook for conflict resolution (sync)
+                stream: parse and import the source incrementally in
+                        batches (see import_stream), for very large S3XML
+                        sources (ignored for other formats, or if a
+                        stylesheet or job_id is given, or commit_job
+                        is False)
                 args: parameters to pass to the transformation stylesheet
         """
 
@@ -1685,7 +2099,21 @@ class S3Resource:
         tree = None
         self.job = None
 
-        if not job_id:
+        if stream:
+            # Streaming only for a single S3XML source without transformation
+            stream = format == "xml" and stylesheet is None and \
+                     not job_id and commit_job and \
+                     not isinstance(source, (list, tuple))
+            if files is not None and isinstance(files, dict):
+                self.files = Storage(files)
+
+        if not job_id and not stream:
+
+            # Use the declarative CSV mapping instead of the stylesheet
+            # if available (requires no stylesheet parameters)
+            mapping = None
+            if format == "csv" and not args:
+                mapping = S3CSVMapping.lookup(stylesheet)
 
             # Additional stylesheet parameters
             args.update(domain = xml.domain,
@@ -1703,6 +2131,7 @@ class S3Resource:
                     resourcename, s = item[:2]
                 else:
                     resourcename, s = None, item
+                mapped = False
                 if isinstance(s, etree._ElementTree):
                     t = s
                 elif format == "json":
@@ -1711,6 +2140,9 @@ class S3Resource:
                         t = xml.json2tree(s)
                     else:
                         t = xml.json2tree(s)
+                elif format == "csv" and mapping and not resourcename:
+                    t = mapping.tree(s, extra_data=extra_data)
+                    mapped = True
                 elif format == "csv":
                     t = xml.csv2tree(s,
                                      resourcename = resourcename,
@@ -1731,7 +2163,7 @@ class S3Resource:
                     else:
                         raise SyntaxError("Invalid source")
 
-                if stylesheet is not None:
+                if stylesheet is not None and not mapped:
                     t = xml.transform(t, stylesheet, **args)
                     if not t:
                         raise SyntaxError(xml.error)
@@ -1754,17 +2186,27 @@ class S3Resource:
         response = current.response
         # Flag to let onvalidation/onaccept know this is coming from a Bulk Import
         response.s3.bulk = True
-        success = self.import_tree(id, tree,
-                                   ignore_errors = ignore_errors,
-                                   job_id = job_id,
-                                   commit_job = commit_job,
-                                   delete_job = delete_job,
-                                   strategy = strategy,
-                                   update_policy = update_policy,
-                                   conflict_policy = conflict_policy,
-                                   last_sync = last_sync,
-                                   onconflict = onconflict,
-                                   )
+        if stream:
+            success = self.import_stream(source,
+                                         ignore_errors = ignore_errors,
+                                         strategy = strategy,
+                                         update_policy = update_policy,
+                                         conflict_policy = conflict_policy,
+                                         last_sync = last_sync,
+                                         onconflict = onconflict,
+                                         )
+        else:
+            success = self.import_tree(id, tree,
+                                       ignore_errors = ignore_errors,
+                                       job_id = job_id,
+                                       commit_job = commit_job,
+                                       delete_job = delete_job,
+                                       strategy = strategy,
+                                       update_policy = update_policy,
+                                       conflict_policy = conflict_policy,
+                                       last_sync = last_sync,
+                                       onconflict = onconflict,
+                                       )
         response.s3.bulk = False
 
         self.files = Storage()
@@ -1833,6 +2275,7 @@ class S3Resource:
                     conflict_policy = None,
                     last_sync = None,
                     onconflict = None,
+                    batches = None,
                     ):
         """
             Import data from an S3XML element tree.
@@ -1844,6 +2287,8 @@ class S3Resource:
                 ignore_errors: continue at errors (=skip invalid elements)
                 delete_job: delete the import job from the job table
                 commit_job: commit the job (default)
+                batches: the S3ImportBatches state, if the tree is
+                         a batch of a streaming import
 
             TODO:
                 Update for link table support
@@ -1946,6 +2391,8 @@ class S3Resource:
             elements = xml.select_resources(tree, tablename)
             if not elements:
                 # nothing to import => still ok
+                if batches is not None:
+                    batches.update(None, tree, tablename)
                 return True
 
             # Find matching elements, if a target record ID is given
@@ -1986,6 +2433,7 @@ class S3Resource:
                                      conflict_policy = conflict_policy,
                                      last_sync = last_sync,
                                      onconflict = onconflict,
+                                     resolved = batches.resolved if batches else None,
                                      )
             add_item = import_job.add_item
             exposed_aliases = self.components.exposed_aliases
@@ -2002,8 +2450,11 @@ class S3Resource:
         # Commit the import job
         auth = current.auth
         auth.rollback = not commit_job
+        bulk = current.deployment_settings.get_base_import_bulk_commit()
         success = import_job.commit(ignore_errors = ignore_errors,
-                                    log_items = self.get_config("oncommit_import_item"))
+                                    log_items = self.get_config("oncommit_import_item"),
+                                    bulk = bulk,
+                                    )
         auth.rollback = False
         self.error = import_job.error
         self.import_count += import_job.count
@@ -2026,6 +2477,8 @@ class S3Resource:
             raise RuntimeError("Import failed without error message")
         if not success or not commit_job:
             db.rollback()
+            if batches is not None:
+                batches.failed = True
         if not commit_job:
             import_job.store()
             return import_job
@@ -2033,9 +2486,116 @@ class S3Resource:
             # Remove the job when committed
             if job_id is not None:
                 import_job.delete()
+            elif batches is not None and success:
+                batches.update(import_job, tree, tablename)
 
         return self.error is None or ignore_errors
 
+    # -------------------------------------------------------------------------
+    def import_stream(self, source,
+                      batch_size = None,
+                      ignore_errors = False,
+                      strategy = None,
+                      update_policy = None,
+                      conflict_policy = None,
+                      last_sync = None,
+                      onconflict = None,
+                      ):
+        """
+            Import data from a (very large) S3XML source, parsing and
+            importing the source incrementally in batches of top-level
+            elements, so that memory use depends on the batch size rather
+            than on the size of the source
+
+            Args:
+                source: the S3XML source (file-like object or filename)
+                batch_size: number of top-level elements per batch,
+                            default from settings.base.import_batch_size
+                ignore_errors: continue at errors (=skip invalid elements)
+                strategy: tuple of allowed import methods (create/update/delete)
+                update_policy: policy for updates (sync)
+                conflict_policy: policy for conflict resolution (sync)
+                last_sync: last synchronization datetime (sync)
+                onconflict: callback hook for conflict resolution (sync)
+
+            Returns:
+                True if successful, otherwise False
+
+            Note:
+                - each batch is imported as a separate import job, with
+                  references to elements of earlier batches resolved
+                  through the records imported from them (S3ImportBatches)
+                - forward references (to elements of later batches) can
+                  only be resolved if the record exists in the database
+                - if a batch fails (and ignore_errors is False), the
+                  import stops and the transaction is rolled back
+                - elements of other tables which have not been referenced
+                  are kept for later batches, but only up to batch_size
+                  elements: beyond that, they are imported into their
+                  tables even if they are never referenced
+        """
+
+        from .s3import import S3ImportBatches
+
+        xml = current.xml
+
+        if batch_size is None:
+            batch_size = current.deployment_settings.get_base_import_batch_size()
+
+        batches = S3ImportBatches(max_pending=batch_size)
+
+        args = {"ignore_errors": ignore_errors,
+                "strategy": strategy,
+                "update_policy": update_policy,
+                "conflict_policy": conflict_policy,
+                "last_sync": last_sync,
+                "onconflict": onconflict,
+                }
+
+        errors = {"error": None, "error_tree": None}
+        def collect(resource):
+            # Collect the errors of all batches
+            if resource.error:
+                errors["error"] = resource.error
+            if resource.error_tree is not None and len(resource.error_tree):
+                error_tree = errors["error_tree"]
+                if error_tree is None:
+                    error_tree = errors["error_tree"] = etree.Element(xml.TAG.root)
+                error_tree.extend(list(resource.error_tree))
+
+        success = True
+        for root in xml.iterparse(source, batch_size=batch_size):
+
+            batches.prepare(root)
+            success = self.import_tree(None, root, batches=batches, **args)
+            collect(self)
+
+            # Release pending elements of other tables
+            if success and not batches.failed and batches.exceeded():
+                for resource in batches.flush(**args):
+                    collect(resource)
+
+            if not success or batches.failed:
+                success = False
+                break
+
+        error = errors["error"]
+        error_tree = errors["error_tree"]
+
+        if success and xml.error:
+            # Source parse error
+            error = xml.error
+            success = False
+
+        if not success:
+            # Roll back all batches
+            current.db.rollback()
+
+        self.error = error
+        self.error_tree = error_tree
+
+        return success
+
     # -------------------------------------------------------------------------
     # XML introspection
     # -------------------------------------------------------------------------
@@ -3373,20 +3933,44 @@ class S3Components:
 
         self.master = master
 
-        if expose is None:
-            hooks = current.s3db.get_hooks(master.tablename)[1]
-            if hooks:
-                self.exposed_aliases = set(hooks.keys())
-            else:
-                self.exposed_aliases = set()
-        else:
-            self.exposed_aliases = set(expose)
+        # Exposed aliases are determined on first use, so that
+        # instantiating a resource does not require the component
+        # hooks to be compiled
+        self._exposed_aliases = None if expose is None else set(expose)
 
         self._components = {}
         self._exposed = {}
 
         self.links = {}
 
+    # -------------------------------------------------------------------------
+    @property
+    def exposed_aliases(self):
+        """
+            The aliases of all exposed components (determined on first
+            access, defaults to all configured components)
+
+            Returns:
+                set of aliases
+        """
+
+        aliases = self._exposed_aliases
+        if aliases is None:
+            hooks = current.s3db.component_index(self.master.tablename)["hooks"]
+            aliases = self._exposed_aliases = set(hooks.keys())
+        return aliases
+
+    @exposed_aliases.setter
+    def exposed_aliases(self, aliases):
+        """
+            Set the aliases of exposed components
+
+            Args:
+                aliases: set of aliases, None for all configured components
+        """
+
+        self._exposed_aliases = aliases
+
     # -------------------------------------------------------------------------
     def get(self, alias, default=None):
         """
@@ -3448,10 +4032,12 @@ class S3Components:
                 True|False whether the component is defined
         """
 
-        if self.get(alias):
+        if alias in self._components:
             return True
-        else:
-            return False
+
+        # Look up the hook rather than instantiating the component
+        hooks = current.s3db.get_components(self.master.table, names=(alias,))
+        return bool(hooks) and alias in hooks
 
     # -------------------------------------------------------------------------
     @property
@@ -3666,12 +4252,31 @@ class S3Components:
 
             # Register the component
             components[alias] = component
+            self.count()
 
             if alias in exposed_aliases:
                 exposed[alias] = component
 
         return components
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def count():
+        """
+            Count an instantiated component resource, both in the
+            current response (response.s3.component_resources) and,
+            if the request is profiled, in the request profiler
+        """
+
+        response = getattr(current, "response", None)
+        if response is None:
+            return
+
+        s3 = response.s3
+        s3.component_resources = (s3.component_resources or 0) + 1
+
+        S3RequestProfiler.count("components")
+
     # -------------------------------------------------------------------------
     def reset(self, aliases=None, expose=DEFAULT):
         """
@@ -3685,14 +4290,7 @@ class S3Components:
         """
 
         if expose is not DEFAULT:
-            if expose is None:
-                hooks = current.s3db.get_hooks(self.master.tablename)[1]
-                if hooks:
-                    self.exposed_aliases = set(hooks.keys())
-                else:
-                    self.exposed_aliases = set()
-            else:
-                self.exposed_aliases = set(expose)
+            self.exposed_aliases = None if expose is None else set(expose)
 
         if aliases:
 
@@ -3714,6 +4312,11 @@ class S3Components:
 
             self.links.clear()
 
+        # Field selectors may resolve differently with the new components
+        resolved = getattr(self.master, "_resolved", None)
+        if resolved:
+            resolved.clear()
+
 # =============================================================================
 class S3AxisFilter:
     """
@@ -3933,6 +4536,8 @@ class S3ResourceFilter:
 
         # Extra filters
         self._extra_filter_methods = None
+        self.equeries = []
+        self.efstats = {}
         if extra_filters:
             self.set_extra_filters(extra_filters)
         else:
@@ -3942,6 +4547,10 @@ class S3ResourceFilter:
         self.rfltr = None
         self.vfltr = None
 
+        # Semi-joins (filters for multi-valued components)
+        self.sfltr = None
+        self.stables = {}
+
         self.transformed = None
 
         self.multiple = True
@@ -4068,8 +4677,21 @@ class S3ResourceFilter:
             Returns:
                 dict {name: callable} of known named filter methods
 
-            TODO:
-                document the expected signature of filter methods
+            Note:
+                Filter methods have the signature:
+
+                    method(resource, ids, expression)
+
+                ...and return the subset (list) of ids matching the
+                filter expression. Filter methods can optionally have
+                a "query" attribute:
+
+                    method.query(resource, expression)
+
+                ...returning a DAL query (e.g. a subselect), or a set
+                of matching record IDs, which can be added to the master
+                query instead of applying the filter post-query - or None
+                if the expression cannot be translated
         """
 
         methods = self._extra_filter_methods
@@ -4138,6 +4760,7 @@ class S3ResourceFilter:
         efilters = self.efilters
         efilters.append((method, expression))
 
+        self.query = None
         return efilters
 
     # -------------------------------------------------------------------------
@@ -4151,6 +4774,8 @@ class S3ResourceFilter:
         """
 
         self.efilters = []
+        self.equeries = []
+        self.query = None
         if filters:
             add = self.add_extra_filter
             for method, expression in filters:
@@ -4158,6 +4783,49 @@ class S3ResourceFilter:
 
         return self.efilters
 
+    # -------------------------------------------------------------------------
+    def copy_to(self, resource, components_only=False):
+        """
+            Add the filters of this resource filter to another master
+            resource of the same table, e.g. to apply additional filters
+            without changing this one
+
+            Args:
+                resource: the other S3Resource (with no components
+                          attached yet)
+                components_only: copy only the component filters (URL
+                                 filters and add_component_filter), but
+                                 not the filters of the master resource
+        """
+
+        rfilter = resource.rfilter
+        if rfilter is None:
+            rfilter = resource.build_query()
+
+        if not components_only:
+            rfilter.mquery &= self.mquery
+            rfilter.queries.extend(self.queries)
+            rfilter.filters.extend(self.filters)
+            for method, expression in self.efilters:
+                rfilter.add_extra_filter(method, expression)
+            # Extra filters already pushed down into the query
+            rfilter.equeries.extend(self.equeries)
+            rfilter.ijoins.update(self.ijoins)
+            rfilter.ljoins.update(self.ljoins)
+            rfilter.distinct |= self.distinct
+            rfilter.transformed = None
+
+        for name in ("cqueries", "cfilters"):
+            cfilters = getattr(rfilter, name)
+            for alias, queries in getattr(self, name).items():
+                if alias in cfilters:
+                    cfilters[alias].extend(queries)
+                else:
+                    cfilters[alias] = list(queries)
+
+        rfilter.query = None
+        resource.clear()
+
     # -------------------------------------------------------------------------
     # Getters
     # -------------------------------------------------------------------------
@@ -4169,7 +4837,14 @@ class S3ResourceFilter:
 
         resource = self.resource
 
-        query = reduce(lambda x, y: x & y, self.queries, self.mquery)
+        # Add extra filters that can be translated into DAL queries
+        if self.efilters:
+            self.pushdown_extra_filters()
+
+        query = reduce(lambda x, y: x & y,
+                       self.queries + self.equeries,
+                       self.mquery,
+                       )
         if self.filters:
             if self.transformed is None:
 
@@ -4183,6 +4858,28 @@ class S3ResourceFilter:
                 # Split DAL and virtual filters
                 self.rfltr, self.vfltr = transformed.split(resource)
 
+                # Separate filters for multi-valued components
+                self.sfltr = None
+                settings = current.deployment_settings
+                semijoins = resource.get_config("semijoin_filters",
+                                                settings.get_base_semijoin_filters(),
+                                                )
+                if semijoins and not resource.parent and \
+                   isinstance(self.rfltr, S3ResourceQuery):
+                    self.rfltr, self.sfltr = self.split_semijoins(self.rfltr)
+                    self.distinct = any(f._joins(resource)[1]
+                                        for f in (self.rfltr, self.vfltr)
+                                        if isinstance(f, S3ResourceQuery))
+
+            # Add semi-joins to query
+            if self.sfltr is not None:
+                stables = self.stables = {}
+                for sfltr in self.sfltr:
+                    sq, tables = sfltr.semijoin(resource)
+                    if sq is not False:
+                        query &= sq
+                        stables.update(tables)
+
             # Add to query
             rfltr = self.rfltr
             if isinstance(rfltr, S3ResourceQuery):
@@ -4199,6 +4896,8 @@ class S3ResourceFilter:
 
                 # Combination of virtual field filter and web2py Query
                 query &= rfltr
+        else:
+            self.sfltr = None
 
         self.query = query
         return query
@@ -4218,8 +4917,14 @@ class S3ResourceFilter:
 
             Returns:
                 list of tuples (method, expression)
+
+            Note:
+                Excludes extra filters that have been added to the
+                query (see pushdown_extra_filters)
         """
 
+        if self.query is None:
+            self.get_query()
         return list(self.efilters)
 
     # -------------------------------------------------------------------------
@@ -4237,8 +4942,15 @@ class S3ResourceFilter:
 
         joins = dict(self.ljoins if left else self.ijoins)
 
+        if self.sfltr is not None:
+            # Semi-joins don't need joins in the master query
+            filters = [f for f in (self.rfltr, self.vfltr)
+                         if isinstance(f, S3ResourceQuery)]
+        else:
+            filters = self.filters
+
         resource = self.resource
-        for q in self.filters:
+        for q in filters:
             subjoins = q._joins(resource, left=left)[0]
             joins.update(subjoins)
 
@@ -4279,6 +4991,121 @@ class S3ResourceFilter:
 
     # -------------------------------------------------------------------------
     # Filtering
+    # -------------------------------------------------------------------------
+    def resolve_extra_filters(self, efilters):
+        """
+            Resolve the methods of extra filters
+
+            Args:
+                efilters: list of tuples (method, expression), with
+                          method being a callable or the name of a
+                          known filter method
+
+            Returns:
+                list of tuples (name, callable, expression)
+        """
+
+        methods = self.extra_filter_methods
+
+        filters = []
+        append = filters.append
+        for method, expression in efilters:
+            if callable(method):
+                name = getattr(method, "__name__", str(method))
+                append((name, method, expression))
+            else:
+                name = method
+                method = methods.get(name)
+                if method:
+                    append((name, method, expression))
+                else:
+                    current.log.warning("Unknown filter method: %s" % name)
+        return filters
+
+    # -------------------------------------------------------------------------
+    def pushdown_extra_filters(self):
+        """
+            Add extra filters that can be expressed as DAL queries (i.e.
+            which have a query-method, see extra_filter_methods) to the
+            master query, so that they needn't be applied post-query;
+            removes these filters from the extra filters
+        """
+
+        resource = self.resource
+        table = resource.table
+
+        remaining = []
+        for efilter in self.efilters:
+            resolved = self.resolve_extra_filters([efilter])
+            if not resolved:
+                remaining.append(efilter)
+                continue
+            name, method, expression = resolved[0]
+
+            query = None
+            get_query = getattr(method, "query", None)
+            if callable(get_query):
+                query = get_query(resource, expression)
+                if isinstance(query, (set, list, tuple)):
+                    query = table._id.belongs(set(query))
+
+            if query is None:
+                remaining.append(efilter)
+            else:
+                self.equeries.append(query)
+                self.efstats[name] = {"pushdown": True}
+
+        self.efilters = remaining
+
+    # -------------------------------------------------------------------------
+    def split_semijoins(self, query):
+        """
+            Separate the parts of a filter query that require joins with
+            multi-valued components, so that they can be applied as
+            semi-joins (see S3ResourceQuery.semijoin) rather than joining
+            the components into the master query and selecting DISTINCT
+
+            Args:
+                query: the DAL-translatable filter query (S3ResourceQuery)
+
+            Returns:
+                tuple (query, semijoins), with the remaining query (or None),
+                and a list of S3ResourceQuery to apply as semi-joins
+
+            Note:
+                Terms that share any multi-valued joins must be applied in
+                the same semi-join, since they are to be true for the same
+                component record
+        """
+
+        resource = self.resource
+
+        terms, groups = [], []
+        for term in query.conjuncts():
+
+            if not isinstance(term, S3ResourceQuery):
+                terms.append(term)
+                continue
+
+            joins, distinct = term._joins(resource, left=True)
+            if not distinct:
+                terms.append(term)
+                continue
+
+            # Merge with all groups sharing any of the joins
+            tables, group = set(joins), [term]
+            for other in list(groups):
+                if tables & other[0]:
+                    tables |= other[0]
+                    group = other[1] + group
+                    groups.remove(other)
+            groups.append((tables, group))
+
+        combine = lambda x, y: x & y
+        query = reduce(combine, terms) if terms else None
+
+        return query, [reduce(combine, group) for _, group in groups]
+
     # -------------------------------------------------------------------------
     def __call__(self, rows, start=None, limit=None):
         """
@@ -4345,18 +5172,7 @@ class S3ResourceFilter:
         efilters = self.efilters
 
         # Resolve filter methods
-        methods = self.extra_filter_methods
-        filters = []
-        append = filters.append
-        for method, expression in efilters:
-            if callable(method):
-                append((method, expression))
-            else:
-                method = methods.get(method)
-                if method:
-                    append((method, expression))
-                else:
-                    current.log.warning("Unknown filter method: %s" % method)
+        filters = self.resolve_extra_filters(efilters)
         if not filters:
             # No applicable filters
             return ids
@@ -4366,24 +5182,35 @@ class S3ResourceFilter:
         # uses resource.select)
         self.efilters = []
 
+        # Initialize statistics
+        stats = self.efstats
+        for name, _, _ in filters:
+            stats[name] = {"pushdown": False, "calls": 0, "ids": 0, "matches": 0}
+
         # Initialize subset
         subset = set()
         tail = ids
-        limit_ = limit
+        batch = limit
+        processed = 0
 
         while tail:
 
             if limit:
-                head, tail = tail[:limit_], tail[limit_:]
+                head, tail = tail[:batch], tail[batch:]
             else:
                 head, tail = tail, None
+            processed += len(head)
 
             match = head
-            for method, expression in filters:
+            for name, method, expression in filters:
                 # Apply filter
+                stat = stats[name]
+                stat["calls"] += 1
+                stat["ids"] += len(match)
                 match = method(resource, match, expression)
                 if not match:
                     break
+                stat["matches"] += len(set(match))
 
             if match:
                 subset |= set(match)
@@ -4391,9 +5218,15 @@ class S3ResourceFilter:
             found = len(subset)
 
             if limit:
-                if found < limit:
-                    # Need more
-                    limit_ = limit - found
+                missing = limit - found
+                if missing > 0:
+                    # Need more: extrapolate the next batch size from
+                    # the hit rate so far, to reduce the round trips
+                    if found:
+                        batch = int(missing * processed / found * 1.2) + 1
+                    else:
+                        batch = processed
+                    batch = max(missing, min(batch, EXTRA_FILTER_BATCH))
                 else:
                     # Found all
                     tail = None
@@ -4401,10 +5234,25 @@ class S3ResourceFilter:
         # Restore order
         subset = [item for item in ids if item in subset]
 
+        # Batches can overshoot the limit
+        if limit:
+            subset = subset[:limit]
+
         # Select start
         if start:
             subset = subset[start:]
 
+        # Report round trips
+        for name, _, _ in filters:
+            stat = stats[name]
+            current.log.debug("Extra filter %s on %s: %s calls, %s ids, %s matches" % \
+                              (name,
+                               resource.tablename,
+                               stat["calls"],
+                               stat["ids"],
+                               stat["matches"],
+                               ))
+
         # Restore extra filters
         self.efilters = efilters
 
@@ -4420,8 +5268,6 @@ class S3ResourceFilter:
                 distinct: count only distinct rows
         """
 
-        distinct |= self.distinct
-
         resource = self.resource
         if resource is None:
             return 0
@@ -4429,26 +5275,19 @@ class S3ResourceFilter:
         table = resource.table
 
         vfltr = self.get_filter()
+        distinct |= self.distinct
 
         if vfltr is None and not distinct:
 
-            tablename = table._tablename
-
-            ijoins = S3Joins(tablename, self.get_joins(left=False))
-            ljoins = S3Joins(tablename, self.get_joins(left=True))
-            ljoins.add(left)
+            join, left = self.count_joins(left)
 
-            join = ijoins.as_list(prefer=ljoins)
-            left = ljoins.as_list()
-
-            cnt = table._id.count()
-            row = current.db(self.query).select(cnt,
-                                                join=join,
-                                                left=left).first()
-            if row:
-                return row[cnt]
-            else:
-                return 0
+            return self.count_records(table,
+                                      self.query,
+                                      join = join,
+                                      left = left,
+                                      distinct = False,
+                                      tables = self.stables,
+                                      )
 
         else:
             data = resource.select([table._id.name],
@@ -4458,6 +5297,254 @@ class S3ResourceFilter:
                                    count=True)
             return data["numrows"]
 
+    # -------------------------------------------------------------------------
+    def estimate(self, left=None):
+        """
+            Get the (approximate) number of matching records: where the
+            exact number is not known from the count cache, and the
+            database supports it (PostgreSQL), use the row estimate of
+            the query planner rather than counting the records
+
+            Args:
+                left: left outer joins
+
+            Returns:
+                tuple (number, exact), where exact indicates whether the
+                number is exact (or an estimate)
+        """
+
+        resource = self.resource
+        if resource is None:
+            return 0, True
+
+        if not current.deployment_settings.get_base_count_estimate() or \
+           self.get_filter() is not None or self.efilters:
+            # Can only be counted exactly
+            return self.count(left=left), True
+
+        table = resource.table
+        join, left = self.count_joins(left)
+
+        # Exact number already known? (same key as in count())
+        cache = self.count_cache()
+        if cache is not None and not self.distinct:
+            key = self.count_key(table, self.query, join, left, False,
+                                 tables = self.stables,
+                                 )
+            if key:
+                number = cache.get(key)
+                if number is not None:
+                    return number, True
+
+        number = self.estimate_records(table, self.query, join=join, left=left)
+        if number is None:
+            return self.count(left=left), True
+
+        return number, False
+
+    # -------------------------------------------------------------------------
+    def count_joins(self, left=None):
+        """
+            Get the joins for counting the matching records
+
+            Args:
+                left: additional left joins
+
+            Returns:
+                tuple (join, left) of lists of inner/left joins
+        """
+
+        tablename = self.resource.table._tablename
+
+        ijoins = S3Joins(tablename, self.get_joins(left=False))
+        ljoins = S3Joins(tablename, self.get_joins(left=True))
+        ljoins.add(left)
+
+        return ijoins.as_list(prefer=ljoins), ljoins.as_list()
+
+    # -------------------------------------------------------------------------
+    # Count cache
+    # -------------------------------------------------------------------------
+    _count_cache = None
+
+    @classmethod
+    def count_cache(cls):
+        """
+            Get the process-wide count cache
+
+            Returns:
+                S3LRUCache, or None if the count cache is disabled
+        """
+
+        ttl = current.deployment_settings.get_base_count_cache()
+        if not ttl:
+            return None
+
+        cache = cls._count_cache
+        if cache is None or cache.ttl != ttl:
+            cache = cls._count_cache = S3LRUCache(maxsize = COUNT_CACHE_SIZE,
+                                                  ttl = ttl,
+                                                  )
+        return cache
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def count_records(cls,
+                      table,
+                      query,
+                      join = None,
+                      left = None,
+                      distinct = True,
+                      tables = None,
+                      ):
+        """
+            Count the records matching a query, using the count cache
+            if enabled
+
+            Args:
+                table: the Table
+                query: the Query
+                join: list of inner joins
+                left: list of left joins
+                distinct: count distinct record IDs
+                tables: dict {tablename: Table} of further tables
+                        involved in sub-selects of the query
+
+            Returns:
+                the number of matching records
+        """
+
+        def count():
+            cnt = table._id.count(distinct=distinct)
+            row = current.db(query).select(cnt,
+                                           join = join,
+                                           left = left,
+                                           cacheable = True,
+                                           ).first()
+            return row[cnt] if row else 0
+
+        cache = cls.count_cache()
+        if cache is not None:
+            key = cls.count_key(table, query, join, left, distinct,
+                                tables = tables,
+                                )
+            if key:
+                return cache(key, count)
+
+        return count()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def count_key(table, query, join=None, left=None, distinct=True, tables=None):
+        """
+            Construct the count cache key for a query, which includes the
+            modified_on high-water marks and maximum record IDs of all
+            tables involved, so that any insert or update invalidates the
+            cached number; for tables where records are deleted rather
+            than archived (no deleted-flag, or archive_not_delete disabled),
+            the key also includes the number of records, so that hard
+            deletions invalidate the cached number too
+
+            Args:
+                table: the Table
+                query: the Query
+                join: list of inner joins
+                left: list of left joins
+                distinct: count distinct record IDs
+                tables: dict {tablename: Table} of further tables
+                        involved in sub-selects of the query
+
+            Returns:
+                the cache key (string), or None if the number can not
+                be cached (e.g. if any table has no modified_on field)
+
+            Note:
+                The high-water marks are looked up with one aggregate query
+                per table, which requires an index on modified_on to be
+                efficient - but counting the records of hard-deleting
+                tables always requires a table scan
+        """
+
+        db = current.db
+        archive = current.deployment_settings.get_security_archive_not_delete()
+
+        # All tables involved in the query
+        tables = dict(tables) if tables else {}
+        tables[table._tablename] = table
+        try:
+            tables.update(db._adapter.tables(query))
+        except (AttributeError, TypeError):
+            pass
+        joins = list(join or []) + list(left or [])
+        for j in joins:
+            jtable = getattr(j, "first", None)
+            if isinstance(jtable, Table):
+                tables[jtable._tablename] = jtable
+
+        # High-water marks (modified_on for updates, and also
+        # the maximum record ID for inserts in the same second),
+        # plus the number of records in hard-deleting tables
+        mtimes = []
+        for tablename in sorted(tables):
+            jtable = tables[tablename]
+            if "modified_on" not in jtable.fields:
+                return None
+            aggregates = [jtable.modified_on.max(), jtable._id.max()]
+            if not archive or "deleted" not in jtable.fields:
+                aggregates.append(jtable._id.count())
+            row = db(jtable._id > 0).select(*aggregates).first()
+            if row:
+                mtimes.append("%s=%s" % (tablename,
+                                         "/".join(str(row[a]) for a in aggregates),
+                                         ))
+            else:
+                mtimes.append("%s=None" % tablename)
+
+        key = "%s|%s|%s|%s|%s" % (table._tablename,
+                                  query,
+                                  ",".join(str(j) for j in joins),
+                                  distinct,
+                                  ";".join(mtimes),
+                                  )
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def estimate_records(table, query, join=None, left=None):
+        """
+            Get the query planner's estimate for the number of records
+            matching a query (PostgreSQL only)
+
+            Args:
+                table: the Table
+                query: the Query
+                join: list of inner joins
+                left: list of left joins
+
+            Returns:
+                the estimated number of records, or None if not available
+        """
+
+        db = current.db
+        if db._dbname != "postgres":
+            return None
+
+        sql = db(query)._select(table._id,
+                                join = join,
+                                left = left,
+                                distinct = True,
+                                )
+        try:
+            plan = db.executesql("EXPLAIN (FORMAT JSON) %s" % sql.rstrip(";"))[0][0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            number = int(plan[0]["Plan"]["Plan Rows"])
+        except Exception:
+            current.log.error("Query plan estimate failed: %s" % sys.exc_info()[1])
+            return None
+
+        return number
+
     # -------------------------------------------------------------------------
     # Utility Methods
     # -------------------------------------------------------------------------
@@ -4692,6 +5779,7 @@ class S3ResourceFilter:
 class S3ResourceData:
     """ Class representing data in a resource """
 
+    @s3_profiled("extract")
     def __init__(self,
                  resource,
                  fields,
@@ -4708,6 +5796,7 @@ class S3ResourceData:
                  represent = False,
                  show_links = True,
                  raw_data = False,
+                 seek = None,
                  ):
         """
             Extracts (and represents) data from a resource
@@ -4727,6 +5816,8 @@ class S3ResourceData:
                 as_rows: return the rows (don't extract/represent)
                 represent: render field value representations
                 raw_data: include raw data in the result
+                seek: the last-seen sort key for keyset pagination,
+                      see seek_query
 
             Note:
                 as_rows / groupby prevent automatic splitting of
@@ -4836,6 +5927,40 @@ class S3ResourceData:
         # Extra filters
         efilter = rfilter.get_extra_filters()
 
+        # Keyset pagination:
+        # If the caller has provided the last-seen sort key, then
+        # seek to the page with an indexable predicate rather than
+        # skipping start rows with OFFSET (not possible with virtual
+        # or extra filters, which can only be applied post-query)
+        self.seek = None
+        keyset = seek_total = None
+        if seek is not None and limit and not (groupby or vfilter or efilter):
+            keyset = self.seek_query(orderby, seek)
+        if keyset:
+            seek_query, seek_fields, tiebreaker = keyset
+            if tiebreaker is not None:
+                # Add the primary key to ORDERBY for a total order
+                orderby = (orderby or []) + [tiebreaker]
+                orderby_aggr = (orderby_aggr or []) + [tiebreaker]
+            if seek_query is not None:
+                if count:
+                    # Count separately, as the seek predicate
+                    # would restrict the count to subsequent pages
+                    seek_total = self.filter_query(query,
+                                                   join = filter_ijoins,
+                                                   left = filter_ljoins,
+                                                   )[0]
+                    count = False
+                master_query = query = query & seek_query
+            start = 0
+        elif seek is not None and orderby:
+            # Falling back to OFFSET: add the primary key to ORDERBY
+            # so that records with equal sort keys have a stable order
+            # across pages
+            if not any(str(f) == pkey for f in orderby_fields):
+                orderby = orderby + [table._id]
+                orderby_aggr = orderby_aggr + [table._id]
+
         # Is this a paginated request?
         pagination = limit is not None or start
 
@@ -4856,7 +5981,9 @@ class S3ResourceData:
                 count_only = False
 
         # Shall we use scalability-optimized strategies?
-        bigtable = current.deployment_settings.get_base_bigtable()
+        # - always with keyset pagination (the whole point of which
+        #   is to not extract all preceding or subsequent records)
+        bigtable = bool(keyset) or current.deployment_settings.get_base_bigtable()
 
         # Filter Query:
         # If we need to determine the number and/or ids of all matching
@@ -4875,6 +6002,7 @@ class S3ResourceData:
                                                getids = not count_only,
                                                orderby = orderby_aggr,
                                                limitby = limitby,
+                                               count = seek_total is None,
                                                )
 
         # Simplify the master query if possible
@@ -5110,6 +6238,8 @@ class S3ResourceData:
                 totalrows = len(ids)
 
         # Build the result
+        if seek_total is not None:
+            totalrows = seek_total
         self.rfields = dfields
         self.numrows = 0 if totalrows is None else totalrows
         self.ids = ids
@@ -5189,6 +6319,11 @@ class S3ResourceData:
 
             self.rows = [results[record_id] for record_id in page]
 
+            # Sort key of the last record on the page (=where to
+            # seek for the next page)
+            if keyset and page:
+                self.seek = self.seek_key(page[-1], seek_fields)
+
         if rname:
             # Restore referee name
             db._referee_name = rname
@@ -5368,6 +6503,174 @@ class S3ResourceData:
 
         return expr, aggr, fields, tables
 
+    # -------------------------------------------------------------------------
+    def seek_query(self, orderby, seek):
+        """
+            Construct the predicate for keyset pagination, i.e. to seek
+            to the first record behind the last-seen sort key rather than
+            skipping all preceding records with OFFSET (which requires
+            the database to scan and discard them, so that the effort
+            grows linearly with the page index)
+
+            Args:
+                orderby: the resolved ORDERBY expression (see resolve_orderby)
+                seek: the last-seen sort key, a list of the values of the
+                      ORDERBY fields in the last record of the previous page,
+                      followed by its record ID; or an empty list for the
+                      first page
+
+            Returns:
+                tuple (query, fields, tiebreaker):
+                 query: the seek predicate (None for the first page)
+                 fields: the Fields in the sort key
+                 tiebreaker: ORDERBY expression for the primary key to
+                             append to the orderby (if not included yet)
+                or None if keyset pagination is not possible with this
+                ORDERBY (=fall back to OFFSET/LIMIT)
+
+            Note:
+                Only ORDERBY fields in the master table are supported,
+                which must be NOT NULL (records with NULL values would
+                otherwise be skipped)
+        """
+
+        table = self.table
+        tablename = table._tablename
+        pkey = table._id
+
+        INVERT = S3DAL().INVERT
+
+        # Determine the fields and sorting directions in the sort key
+        keys = []
+        for item in (orderby or []):
+            if isinstance(item, Field):
+                field, desc = item, False
+            elif type(item) is Expression and item.op == INVERT and \
+                 isinstance(item.first, Field):
+                field, desc = item.first, True
+            else:
+                # Not a plain field
+                return None
+            if str(field).split(".", 1)[0] != tablename:
+                # Field in joined table
+                return None
+            if field.name == pkey.name:
+                keys.append((pkey, desc))
+                break
+            if not field.notnull or \
+               field.type.split(" ", 1)[0] not in KEYSET_TYPES:
+                # Field is nullable or can't be compared by value
+                return None
+            keys.append((field, desc))
+
+        # Use the primary key as tie-breaker
+        if keys and keys[-1][0] is pkey:
+            tiebreaker = None
+        else:
+            desc = keys[-1][1] if keys else False
+            keys.append((pkey, desc))
+            tiebreaker = ~pkey if desc else pkey
+
+        fields = [key[0] for key in keys]
+        if not seek:
+            # First page
+            return None, fields, tiebreaker
+
+        if not isinstance(seek, (list, tuple)) or len(seek) != len(keys):
+            # Sort key doesn't match the orderby
+            return None
+
+        # Decode the sort key
+        values = []
+        for (field, _), value in zip(keys, seek):
+            try:
+                value = self.seek_value(field, value)
+            except (TypeError, ValueError):
+                return None
+            if value is None:
+                return None
+            values.append(value)
+
+        # Build the predicate:
+        # (a > x) OR (a == x AND b > y) OR (a == x AND b == y AND id > z)
+        query = None
+        equal = None
+        for (field, desc), value in zip(keys, values):
+            subquery = (field < value) if desc else (field > value)
+            if equal is not None:
+                subquery = equal & subquery
+            query = subquery if query is None else query | subquery
+            eq = field == value
+            equal = eq if equal is None else equal & eq
+
+        return query, fields, tiebreaker
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def seek_value(field, value):
+        """
+            Decode a value in a sort key for keyset pagination
+
+            Args:
+                field: the Field
+                value: the JSON value
+
+            Returns:
+                the field value
+
+            Raises:
+                TypeError/ValueError if the value is invalid for the field
+        """
+
+        if value is None:
+            return None
+
+        ftype = field.type.split(" ", 1)[0]
+        if ftype in ("id", "integer", "bigint", "reference"):
+            value = int(value)
+        elif ftype == "double":
+            value = float(value)
+        elif ftype == "boolean":
+            value = bool(value)
+        elif ftype == "date":
+            value = datetime.date.fromisoformat(value)
+        elif ftype == "datetime":
+            value = datetime.datetime.fromisoformat(value)
+        elif ftype == "time":
+            value = datetime.time.fromisoformat(value)
+        elif not isinstance(value, str):
+            raise TypeError("invalid value type for %s" % field)
+        return value
+
+    # -------------------------------------------------------------------------
+    def seek_key(self, record_id, fields):
+        """
+            Look up the sort key of a record, for keyset pagination
+
+            Args:
+                record_id: the record ID
+                fields: the Fields in the sort key
+
+            Returns:
+                the sort key as JSON-serializable list of values
+        """
+
+        table = self.table
+
+        row = current.db(table._id == record_id).select(limitby = (0, 1),
+                                                       *fields).first()
+        if not row:
+            return None
+
+        key = []
+        for field in fields:
+            value = row[field]
+            if isinstance(value, (datetime.date, datetime.time)):
+                value = value.isoformat()
+            key.append(value)
+
+        return key
+
     # -------------------------------------------------------------------------
     def filter_query(self,
                      query,
@@ -5376,6 +6679,7 @@ class S3ResourceData:
                      getids = False,
                      limitby = None,
                      orderby = None,
+                     count = True,
                      ):
         """
             Execute a query to determine the number/record IDs of all
@@ -5389,6 +6693,10 @@ class S3ResourceData:
                 limitby: tuple of indices (start, end) to extract only
                          a limited set of IDs
                 orderby: ORDERBY expression for the query
+                count: count all matching records even if only a
+                       limited set of IDs is extracted (otherwise
+                       the total number is the minimum number known
+                       to match, e.g. if counted separately)
 
             Returns:
                 tuple of (TotalNumberOfRecords, RecordIDs)
@@ -5398,6 +6706,10 @@ class S3ResourceData:
 
         table = self.table
 
+        # Tables in sub-selects of the filter query
+        rfilter = self.resource.rfilter
+        stables = rfilter.stables if rfilter else None
+
         # Temporarily deactivate virtual fields
         vf = table.virtualfields
         osetattr(table, "virtualfields", [])
@@ -5431,15 +6743,15 @@ class S3ResourceData:
             ids = [row[pkey] for row in results]
 
             totalids = len(rows)
-            if limit and totalids >= maxids or start != 0 and not totalids:
+            if count and \
+               (limit and totalids >= maxids or start != 0 and not totalids):
                 # Count all matching records
-                cnt = table._id.count(distinct=True)
-                row = db(query).select(cnt,
-                                       join = join,
-                                       left = left,
-                                       cacheable = True,
-                                       ).first()
-                totalrows = row[cnt]
+                totalrows = S3ResourceFilter.count_records(table,
+                                                           query,
+                                                           join = join,
+                                                           left = left,
+                                                           tables = stables,
+                                                           )
             else:
                 # We already know how many there are
                 totalrows = start + totalids
@@ -5462,14 +6774,13 @@ class S3ResourceData:
 
         else:
             # Only count, do not extract any IDs (constant effort)
-            field = table._id.count(distinct = True)
-            rows = db(query).select(field,
-                                    join = join,
-                                    left = left,
-                                    cacheable = True,
-                                    )
             ids = None
-            totalrows = rows.first()[field]
+            totalrows = S3ResourceFilter.count_records(table,
+                                                       query,
+                                                       join = join,
+                                                       left = left,
+                                                       tables = stables,
+                                                       )
 
         # Restore the virtual fields
         osetattr(table, "virtualfields", vf)
@@ -5788,6 +7099,7 @@ class S3ResourceData:
         return records
 
     # -------------------------------------------------------------------------
+    @s3_profiled("represent")
     def render(self,
                rfield,
                results,
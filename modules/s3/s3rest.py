@@ -45,8 +45,10 @@ from gluon import current, redirect, HTTP, URL
 from gluon.storage import Storage
 
 from .s3datetime import s3_parse_datetime
+from .s3profiler import S3RequestProfiler, s3_profiled
 from .s3resource import S3Resource
 from .s3utils import s3_get_extension, s3_keep_messages, s3_remove_last_record_id, s3_store_last_record_id, s3_str
+from .s3xml import S3XMLFormat
 
 REGEX_FILTER = re.compile(r".+\..+|.*\(.+\).*")
 HTTP_METHODS = ("GET", "PUT", "POST", "DELETE")
@@ -70,6 +72,7 @@ class S3Request:
     DEFAULT_REPRESENTATION = "html"
 
     # -------------------------------------------------------------------------
+    @s3_profiled("request")
     def __init__(self,
                  prefix = None,
                  name = None,
@@ -310,6 +313,13 @@ class S3Request:
         if self.component is not None:
             self.component.crud(self, method="_init")
 
+        # Identify the request method for the profiler
+        profiler = S3RequestProfiler.active()
+        if profiler and not profiler.method:
+            profiler.method = "%s.%s" % (self.method or self.http,
+                                         self.representation,
+                                         )
+
     # -------------------------------------------------------------------------
     # Method handler configuration
     # -------------------------------------------------------------------------
@@ -1000,6 +1010,45 @@ class S3Request:
         if target == resource.tablename:
             # Master resource targetted
             target = None
+
+        # Incremental export if the result may span multiple pages
+        page_size = current.deployment_settings.get_base_export_page_size()
+        if page_size and not as_json and (limit is None or limit > page_size):
+            if stylesheet is not None:
+                stream = S3XMLFormat(stylesheet).get_streaming() is not None
+            else:
+                stream = True
+        else:
+            stream = False
+
+        if stream:
+            # Write to a temporary file (rather than to the response
+            # body directly, as the DB connection is released before
+            # the body is iterated), keep small exports in memory
+            from tempfile import SpooledTemporaryFile
+            output = SpooledTemporaryFile(max_size=1048576)
+            results = resource.export_stream(output,
+                                             page_size = page_size,
+                                             start = start,
+                                             limit = limit,
+                                             msince = msince,
+                                             fields = fields,
+                                             dereference = True,
+                                             # maxdepth in args
+                                             references = references,
+                                             mdata = mdata,
+                                             mcomponents = mcomponents,
+                                             rcomponents = rcomponents,
+                                             stylesheet = stylesheet,
+                                             maxbounds = maxbounds,
+                                             target = target,
+                                             **args)
+            if results is None:
+                output.close()
+                r.error(400, "XSLT Transformation Error: %s " % current.xml.error)
+            output.seek(0)
+            return response.stream(output)
+
         output = resource.export_xml(start = start,
                                      limit = limit,
                                      msince = msince,
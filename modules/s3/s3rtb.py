@@ -520,24 +520,15 @@ class S3ResourceTree:
         table = resource.table
         tablename = resource.tablename
 
-        xml = current.xml
-        MCI = xml.MCI
-        MTIME = xml.MTIME
-
-        # MCI filter
-        if xml.filter_mci and MCI in table.fields:
-            resource.add_filter(FS(MCI) >= 0)
-
-        # Sync filters
-        if sync_filters and tablename in sync_filters:
-            parsed_filters = S3URLQuery.parse(resource, sync_filters[tablename])
-            for queries in parsed_filters.values():
-                for query in queries:
-                    resource.add_filter(query)
+        MTIME = current.xml.MTIME
 
-        # Msince filter
-        if msince and (resource.alias != hierarchy_link or add) and MTIME in table.fields:
-            resource.add_filter(FS(MTIME) >= msince)
+        # Export filters
+        S3ResourceTree.add_filters(resource,
+                                   msince = msince,
+                                   sync_filters = sync_filters,
+                                   hierarchy_link = hierarchy_link,
+                                   add = add,
+                                   )
 
         # Order by modified_on if msince is requested
         if msince and MTIME in table.fields:
@@ -563,6 +554,56 @@ class S3ResourceTree:
                       cacheable = True,
                       )
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def add_filters(resource,
+                    msince = None,
+                    sync_filters = None,
+                    hierarchy_link = None,
+                    add = True,
+                    ):
+        """
+            Add the export filters (MCI, sync filters and msince) to
+            a resource
+
+            Args:
+                resource: the S3Resource
+                msince: export only records which have been modified
+                        after this datetime
+                sync_filters: additional URL filters (Sync), as dict
+                              {tablename: {url_var: string}}
+                hierarchy_link: the alias of the component representing
+                                the parent node in a link-table based
+                                hierarchy (see S3Model.hierarchy_link)
+                add: the preliminary msince-decision for the master record
+                     (if resource is a component); if the master would not
+                     be exported, the msince filter is not applied to the
+                     hierarchy_link component, so that the parent node is
+                     exported regardless of its modification time
+        """
+
+        table = resource.table
+        tablename = resource.tablename
+
+        xml = current.xml
+        MCI = xml.MCI
+        MTIME = xml.MTIME
+
+        # MCI filter
+        if xml.filter_mci and MCI in table.fields:
+            resource.add_filter(FS(MCI) >= 0)
+
+        # Sync filters
+        if sync_filters and tablename in sync_filters:
+            parsed_filters = S3URLQuery.parse(resource, sync_filters[tablename])
+            for queries in parsed_filters.values():
+                for query in queries:
+                    resource.add_filter(query)
+
+        # Msince filter
+        if msince and (resource.alias != hierarchy_link or add) and MTIME in table.fields:
+            resource.add_filter(FS(MTIME) >= msince)
+
     # -------------------------------------------------------------------------
     @staticmethod
     def get_component_records(data, alias, master_id, component):
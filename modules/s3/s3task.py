@@ -45,6 +45,7 @@ __all__ = ("S3Task",)
 
 import datetime
 import json
+import sys
 
 from gluon import current, IS_EMPTY_OR, IS_INT_IN_RANGE
 from gluon.storage import Storage
@@ -511,4 +512,24 @@ class S3Task:
 
         current.auth.s3_impersonate(user_id)
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def progress(message):
+        """
+            Report the progress of a long-running task
+            - run from within the task
+
+            Args:
+                message: the progress message
+
+            Note:
+                The scheduler captures the output of the task as run_output,
+                and the "!clear!" prefix replaces all previous output, so
+                that run_output always shows the latest progress message
+        """
+
+        if current.request.is_scheduler:
+            sys.stdout.write("!clear!%s\n" % message)
+            sys.stdout.flush()
+
 # END =========================================================================
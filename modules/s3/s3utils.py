@@ -35,6 +35,7 @@ import datetime
 import os
 import re
 import sys
+import threading
 import time
 
 from collections import OrderedDict
@@ -59,6 +60,7 @@ URLSCHEMA = re.compile(r"((?:(())(www\.([^/?#\s]*))|((http(s)?|ftp):)"
 __all__ = ("NONE", # Consistency & RAD
            "OrderedDict", # RAD
            "S3CustomController",
+           "S3LRUCache",
            "S3MarkupStripper",
            "S3MultiPath",
            "S3PriorityRepresent",
@@ -421,6 +423,22 @@ def s3_dev_toolbar():
             return None
         return key
 
+    # Request profile (if the request is profiled)
+    from .s3profiler import S3RequestProfiler
+    profiler = S3RequestProfiler.active()
+    if profiler:
+        profile = (BUTTON("profile",
+                          _onclick = "$('#profile-%s').slideToggle().removeClass('hide')" % u,
+                          ),
+                   DIV(BEAUTIFY(profiler.summary()),
+                       backtotop,
+                       _class = "hide",
+                       _id = "profile-%s" % u,
+                       ),
+                   )
+    else:
+        profile = ("", "")
+
     return DIV(
         #BUTTON("design",
         #        _onclick = "document.location='%s'" % admin,
@@ -440,6 +458,7 @@ def s3_dev_toolbar():
         BUTTON("db stats",
                _onclick = "$('#db-stats-%s').slideToggle().removeClass('hide')" % u,
                ),
+        profile[0],
         DIV(BEAUTIFY(request),
             backtotop,
             _class = "hide",
@@ -465,6 +484,7 @@ def s3_dev_toolbar():
             _class = "hide",
             _id = "db-stats-%s" % u,
             ),
+        profile[1],
         _id = "totop-%s" % u
         )
 
@@ -2199,6 +2219,167 @@ class S3PriorityRepresent:
 
         return self(value, row=row)
 
+# =============================================================================
+class S3LRUCache:
+    """
+        Thread-safe, size-bounded in-process cache with least-recently-used
+        eviction and optional expiry, to share expensive lookup results
+        between requests (unlike current.cache.ram, entries can be looked
+        up without computing them, and hit/miss rates are counted)
+
+        Example:
+            cache = S3LRUCache(maxsize=500, ttl=60)
+            value = cache(key, lambda: lookup(key))
+    """
+
+    def __init__(self, maxsize=1000, ttl=None):
+        """
+            Args:
+                maxsize: the maximum number of entries
+                ttl: the maximum age of entries in seconds,
+                     None for no expiry
+        """
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+    # -------------------------------------------------------------------------
+    def get(self, key, default=None):
+        """
+            Look up an entry
+
+            Args:
+                key: the key
+                default: the value to return if there is no (valid) entry
+
+            Returns:
+                the cached value, or default
+        """
+
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires is None or expires > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+
+        return default
+
+    # -------------------------------------------------------------------------
+    def set(self, key, value):
+        """
+            Store an entry, evicting the least-recently used entries
+            if the cache is full
+
+            Args:
+                key: the key
+                value: the value
+        """
+
+        ttl = self.ttl
+        expires = time.time() + ttl if ttl else None
+
+        with self._lock:
+            data = self._data
+            data[key] = (expires, value)
+            data.move_to_end(key)
+            while len(data) > self.maxsize:
+                data.popitem(last=False)
+
+    # -------------------------------------------------------------------------
+    def __call__(self, key, f):
+        """
+            Look up an entry, computing and storing it if not found
+
+            Args:
+                key: the key
+                f: function to compute the value (no parameters)
+
+            Returns:
+                the value
+        """
+
+        missing = self._data # sentinel, never a cached value
+        value = self.get(key, missing)
+        if value is missing:
+            value = f()
+            self.set(key, value)
+        return value
+
+    # -------------------------------------------------------------------------
+    def pop(self, key):
+        """
+            Remove an entry
+
+            Args:
+                key: the key
+        """
+
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[1] if item is not None else None
+
+    # -------------------------------------------------------------------------
+    def clear(self, condition=None):
+        """
+            Remove entries
+
+            Args:
+                condition: function (key) => bool to select the entries
+                           to remove, None to remove all entries
+        """
+
+        with self._lock:
+            data = self._data
+            if condition is None:
+                data.clear()
+            else:
+                for key in [k for k in data if condition(k)]:
+                    del data[key]
+
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+            Get cache statistics
+
+            Returns:
+                dict {"size", "maxsize", "hits", "misses", "ratio"}
+        """
+
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            size = len(self._data)
+
+        total = hits + misses
+        return {"size": size,
+                "maxsize": self.maxsize,
+                "hits": hits,
+                "misses": misses,
+                "ratio": float(hits) / total if total else None,
+                }
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+
+        return len(self._data)
+
+    # -------------------------------------------------------------------------
+    def __contains__(self, key):
+
+        with self._lock:
+            item = self._data.get(key)
+        return item is not None and (item[0] is None or item[0] > time.time())
+
 # =============================================================================
 class Traceback:
     """ Generate the traceback for viewing error Tickets """
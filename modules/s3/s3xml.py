@@ -36,6 +36,8 @@ import json
 import os
 import re
 import sys
+import threading
+import time
 
 from urllib import parse as urlparse
 from urllib.request import urlopen
@@ -51,7 +53,8 @@ from gluon.storage import Storage
 from .s3codec import S3Codec
 from .s3datetime import s3_decode_iso_datetime, s3_encode_iso_datetime, s3_utc
 from .s3fields import S3RepresentLazy
-from .s3utils import s3_get_foreign_key, s3_represent_value, s3_str, s3_strip_markup, s3_validate
+from .s3profiler import s3_profile
+from .s3utils import S3LRUCache, s3_get_foreign_key, s3_represent_value, s3_str, s3_strip_markup, s3_validate
 
 ogetattr = object.__getattribute__
 
@@ -60,6 +63,7 @@ SEPARATORS = (",", ":")
 
 __all__ = ("SEPARATORS", # Consistency & RAD
            "S3XML",
+           "S3CSVMapping",
            #"S3EntityResolver",
            "S3XMLFormat",
            )
@@ -208,6 +212,17 @@ class S3XML(S3Codec):
         text = "$",
         )
 
+    # Process-wide cache of compiled XSLT stylesheets
+    _xslt_cache = None
+
+    # Process-wide XSLT counters
+    _xslt_lock = threading.Lock()
+    _xslt_stats = {"compiled": 0,
+                   "compile_time": 0.0,
+                   "transforms": 0,
+                   "transform_time": 0.0,
+                   }
+
     # -------------------------------------------------------------------------
     def __init__(self):
 
@@ -249,6 +264,271 @@ class S3XML(S3Codec):
             self.error = "XML Parse error: %s" % sys.exc_info()[1]
             return None
 
+    # -------------------------------------------------------------------------
+    def iterparse(self, source, batch_size=1000):
+        """
+            Parse an S3XML source incrementally, in batches of top-level
+            <resource> elements; the elements of a batch are moved out of
+            the parsed tree as soon as they are complete, and released
+            once the next batch is requested, so that memory use depends
+            on the batch size rather than the source size
+
+            Args:
+                source: the S3XML source (file-like object or filename)
+                batch_size: the maximum number of top-level <resource>
+                            elements per batch
+
+            Yields:
+                a root element (with the tag and attributes of the source
+                root element), containing the elements of the current batch
+
+            Note:
+                - XML parse errors are reported in self.error and end the
+                  iteration
+                - the parser reads ahead, so the parsed tree can contain
+                  incomplete elements after the current one - only elements
+                  which have been completely parsed (end event) are moved
+                  into the batch
+        """
+
+        self.error = None
+
+        RESOURCE = self.TAG.resource
+
+        try:
+            context = etree.iterparse(source,
+                                      events = ("start", "end"),
+                                      huge_tree = True, # Support large WKT fields
+                                      no_network = True,
+                                      remove_blank_text = True,
+                                      resolve_entities = False,
+                                      )
+            root = batch = None
+            depth = 0
+            for event, element in context:
+                if event == "start":
+                    if root is None:
+                        root = element
+                        batch = etree.Element(root.tag, nsmap=root.nsmap)
+                        batch.attrib.update(root.attrib)
+                    depth += 1
+                    continue
+
+                depth -= 1
+                if depth != 1:
+                    continue
+
+                # Element is complete => move it out of the parsed tree
+                # (NB only preceding siblings of incomplete elements
+                #     can safely be removed)
+                if element.tag != RESOURCE:
+                    # Not a resource => drop
+                    root.remove(element)
+                    continue
+                batch.append(element)
+
+                if len(batch) == batch_size:
+                    yield batch
+                    # Release the processed elements
+                    for processed in batch:
+                        processed.clear()
+                    batch = etree.Element(root.tag, nsmap=root.nsmap)
+                    batch.attrib.update(root.attrib)
+
+            if batch is not None and len(batch):
+                yield batch
+
+        except etree.XMLSyntaxError:
+            self.error = "XML Parse error: %s" % sys.exc_info()[1]
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def xslt_cache(cls):
+        """
+            Get the process-wide cache for compiled XSLT stylesheets
+
+            Returns:
+                S3LRUCache, or None if disabled by deployment setting
+        """
+
+        cache = S3XML._xslt_cache
+        if cache is None:
+            maxsize = current.deployment_settings.get_base_xslt_cache()
+            if maxsize:
+                cache = S3XML._xslt_cache = S3LRUCache(maxsize=maxsize)
+        return cache
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def xslt_count(cls, counter, duration):
+        """
+            Count an XSLT compilation or transformation
+
+            Args:
+                counter: the counter ("compiled"|"transforms")
+                duration: the time spent (seconds)
+        """
+
+        stats = cls._xslt_stats
+        timer = "compile_time" if counter == "compiled" else "transform_time"
+        with cls._xslt_lock:
+            stats[counter] += 1
+            stats[timer] += duration
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def xslt_statistics(cls):
+        """
+            Statistics of XSLT compilations and transformations in this
+            process
+
+            Returns:
+                a dict {"compiled": number of compiled stylesheets,
+                        "compile_time": total compilation time (seconds),
+                        "transforms": number of transformations,
+                        "transform_time": total transformation time (seconds),
+                        "hits": number of reused compiled stylesheets,
+                        "misses": number of cache misses,
+                        "size": number of cached stylesheets,
+                        }
+        """
+
+        with cls._xslt_lock:
+            output = dict(cls._xslt_stats)
+
+        cache = cls._xslt_cache
+        if cache is not None:
+            output.update(hits = cache.hits,
+                          misses = cache.misses,
+                          size = len(cache),
+                          )
+        return output
+
+    # -------------------------------------------------------------------------
+    def stylesheet(self, source):
+        """
+            Parse and compile an XSLT stylesheet; stylesheet files are
+            compiled only once and then reused from the process-wide
+            cache until they (or any files they import or include) are
+            modified
+
+            Args:
+                source: the stylesheet - pathname, file-like object or
+                        pre-parsed element tree
+
+            Returns:
+                tuple (stylesheet, transformer) of the parsed stylesheet
+                (element tree) and the compiled stylesheet (etree.XSLT),
+                or (None, None) if the stylesheet could not be parsed or
+                compiled
+
+            Note:
+                Compiled stylesheets are shared between threads, lxml
+                supports concurrent transformations with the same
+                etree.XSLT instance
+        """
+
+        self.error = None
+
+        path = cache = None
+        if isinstance(source, (etree._ElementTree, etree._Element)):
+            # Pre-parsed stylesheet
+            stylesheet = source
+        else:
+            if isinstance(source, str) and os.path.isfile(source):
+                cache = self.xslt_cache()
+                if cache is not None:
+                    path = os.path.abspath(source)
+                    cached = cache.get(path)
+                    if cached is not None:
+                        files, mtimes, stylesheet, transformer = cached
+                        if self.xslt_mtimes(files) == mtimes:
+                            return stylesheet, transformer
+            stylesheet = self.parse(source)
+            if stylesheet is None:
+                # Error parsing the XSL stylesheet
+                return None, None
+
+        try:
+            start = time.time()
+            with s3_profile("xslt"):
+                ac = etree.XSLTAccessControl(read_file=True, read_network=True)
+                transformer = etree.XSLT(stylesheet, access_control=ac)
+            self.xslt_count("compiled", time.time() - start)
+        except:
+            e = sys.exc_info()[1]
+            self.error = e
+            current.log.error(e)
+            return None, None
+
+        if cache is not None:
+            files = self.xslt_files(path, stylesheet)
+            mtimes = self.xslt_mtimes(files)
+            if mtimes is not None:
+                cache.set(path, (files, mtimes, stylesheet, transformer))
+
+        return stylesheet, transformer
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def xslt_files(path, stylesheet):
+        """
+            Get the pathnames of a stylesheet file and all files it
+            imports or includes (recursively), so that the cached
+            stylesheet can be invalidated when any of them is modified
+
+            Args:
+                path: the absolute pathname of the stylesheet
+                stylesheet: the parsed stylesheet (element tree)
+
+            Returns:
+                list of absolute pathnames
+        """
+
+        xsl = "{http://www.w3.org/1999/XSL/Transform}"
+        tags = ("%simport" % xsl, "%sinclude" % xsl)
+
+        files = [path]
+        pending = [(path, stylesheet)]
+        while pending:
+            filename, tree = pending.pop()
+            folder = os.path.dirname(filename)
+            for element in tree.iter(*tags):
+                href = element.get("href")
+                if not href or "://" in href:
+                    # Remote stylesheets can not be checked
+                    continue
+                included = os.path.abspath(os.path.join(folder, href))
+                if included in files or not os.path.isfile(included):
+                    continue
+                files.append(included)
+                try:
+                    pending.append((included, etree.parse(included)))
+                except etree.XMLSyntaxError:
+                    pass
+
+        return files
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def xslt_mtimes(files):
+        """
+            Get the modification times of stylesheet files
+
+            Args:
+                files: list of pathnames
+
+            Returns:
+                tuple of modification times, or None if any of the
+                files is no longer accessible
+        """
+
+        try:
+            mtimes = tuple(os.path.getmtime(filename) for filename in files)
+        except OSError:
+            mtimes = None
+        return mtimes
+
     # -------------------------------------------------------------------------
     def transform(self, tree, stylesheet_path, **args):
         """
@@ -256,31 +536,32 @@ class S3XML(S3Codec):
 
             Args:
                 tree: the element tree
-                stylesheet_path: pathname of the XSLT stylesheet
+                stylesheet_path: pathname of the XSLT stylesheet, or
+                                 a pre-parsed or compiled stylesheet
                 args: dict of arguments to pass to the stylesheet
         """
 
-        self.error = None
-
         if args:
             _args = dict((k, "'%s'" % args[k]) for k in args)
         else:
             _args = None
 
-        if isinstance(stylesheet_path, (etree._ElementTree, etree._Element)):
-            # Pre-parsed stylesheet
-            stylesheet = stylesheet_path
+        if isinstance(stylesheet_path, etree.XSLT):
+            # Pre-compiled stylesheet
+            self.error = None
+            transformer = stylesheet_path
         else:
-            stylesheet = self.parse(stylesheet_path)
+            transformer = self.stylesheet(stylesheet_path)[1]
 
-        if stylesheet is not None:
+        if transformer is not None:
             try:
-                ac = etree.XSLTAccessControl(read_file=True, read_network=True)
-                transformer = etree.XSLT(stylesheet, access_control=ac)
-                if _args:
-                    result = transformer(tree, **_args)
-                else:
-                    result = transformer(tree)
+                start = time.time()
+                with s3_profile("xslt"):
+                    if _args:
+                        result = transformer(tree, **_args)
+                    else:
+                        result = transformer(tree)
+                self.xslt_count("transforms", time.time() - start)
                 return result
             except:
                 e = sys.exc_info()[1]
@@ -292,7 +573,7 @@ class S3XML(S3Codec):
                 #outputFile.close()
                 return None
         else:
-            # Error parsing the XSL stylesheet
+            # Error parsing or compiling the XSL stylesheet
             return None
 
     # -------------------------------------------------------------------------
@@ -2786,6 +3067,41 @@ class S3XML(S3Codec):
 
         return etree.ElementTree(root)
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def utf_8_encode(source):
+        """
+            UTF-8-recode a CSV source line by line, guessing the character
+            encoding of the source.
+
+            Args:
+                source: the source (file-like object)
+        """
+
+        # Make this a list of all encodings you need to support (as long as
+        # they are supported by Python codecs), always starting with the most
+        # likely.
+        encodings = ("utf-8-sig", "iso-8859-1")
+        e = encodings[0]
+        for line in source:
+            if e:
+                try:
+                    s = s3_str(line, e)
+                    yield s
+                except:
+                    pass
+                else:
+                    continue
+            for encoding in encodings:
+                try:
+                    s = s3_str(line, encoding)
+                    yield s
+                except:
+                    continue
+                else:
+                    e = encoding
+                    break
+
     # -------------------------------------------------------------------------
     @classmethod
     def csv2tree(cls, source,
@@ -2845,40 +3161,11 @@ class S3XML(S3Codec):
             else:
                 col.text = ""
 
-        def utf_8_encode(source):
-            """
-                UTF-8-recode the source line by line, guessing the character
-                encoding of the source.
-            """
-            # Make this a list of all encodings you need to support (as long as
-            # they are supported by Python codecs), always starting with the most
-            # likely.
-            encodings = ("utf-8-sig", "iso-8859-1")
-            e = encodings[0]
-            for line in source:
-                if e:
-                    try:
-                        s = s3_str(line, e)
-                        yield s
-                    except:
-                        pass
-                    else:
-                        continue
-                for encoding in encodings:
-                    try:
-                        s = s3_str(line, encoding)
-                        yield s
-                    except:
-                        continue
-                    else:
-                        e = encoding
-                        break
-
         hashtags = dict(hashtags) if hashtags else {}
 
         def read_from_csv(source):
             try:
-                source = utf_8_encode(source)
+                source = cls.utf_8_encode(source)
                 reader = csv.DictReader(source, delimiter=delimiter, quotechar=quotechar)
                 ROW = TAG.row
                 for i, r in enumerate(reader):
@@ -2931,6 +3218,447 @@ class S3XML(S3Codec):
 
         return  etree.ElementTree(root)
 
+# =============================================================================
+class S3CSVMapping:
+    """
+        Declarative column mapping to convert CSV sources directly into
+        S3XML import trees, bypassing the intermediate table tree and the
+        XSLT transformation (fast path for simple CSV import stylesheets)
+
+        Mappings are JSON files alongside the XSLT stylesheet they replace,
+        with the same name and the extension .json, e.g.:
+
+            static/formats/s3csv/gis/marker.json
+
+            {"resource": "gis_marker",
+             "uuid": "UUID",
+             "required": ["Name"],
+             "data": {
+                "name": "Name",
+                "image": {"column": "Image",
+                          "attribute": "filename",
+                          "attributes": {"url": "local"}
+                          },
+                "comments": {"column": "Comments", "optional": true}
+                },
+             "references": {
+                "organisation_id": {"resource": "org_organisation",
+                                    "column": "Organisation",
+                                    "field": "name"
+                                    },
+                "location_id": {"resource": "gis_location",
+                                "column": "Country",
+                                "uuid": "urn:iso:std:iso:3166:-1:code:%s"
+                                }
+                }
+             }
+
+        - "uuid": the column with the record UUID
+        - "required": columns which must not be empty (rows are skipped
+                      otherwise)
+        - "data": {field: column} or {field: {"column"|"value", ...}}
+                  "value": a constant value instead of a column
+                  "optional": skip the field if the column is empty
+                  "attribute": write the value into this attribute
+                               rather than the element text
+                  "attributes": constant attributes to add
+        - "references": {field: {"resource", "column", "field"|"uuid"}}
+                  "field": look up the referenced record by this field,
+                           creates one referenced resource per value
+                  "uuid": format string for the UUID of the referenced
+                          record
+
+        Like the XSLT stylesheets, mappings produce data elements for empty
+        columns (unless optional), and references only for non-empty columns.
+    """
+
+    # Process-wide cache of parsed mappings
+    _cache = S3LRUCache(maxsize=200)
+
+    def __init__(self, mapping):
+        """
+            Args:
+                mapping: the mapping (dict)
+
+            Raises:
+                ValueError if the mapping is invalid
+        """
+
+        try:
+            self.resource = mapping["resource"]
+        except (KeyError, TypeError):
+            raise ValueError("CSV mapping without resource")
+
+        self.uuid = mapping.get("uuid")
+        self.required = mapping.get("required") or []
+
+        data = []
+        for field, spec in mapping.get("data", {}).items():
+            if not isinstance(spec, dict):
+                spec = {"column": spec}
+            if "column" not in spec and "value" not in spec:
+                raise ValueError("CSV mapping for %s.%s: column or value required" %
+                                 (self.resource, field))
+            data.append((field, spec))
+        self.data = data
+
+        references = []
+        for field, spec in mapping.get("references", {}).items():
+            if not isinstance(spec, dict) or \
+               "resource" not in spec or "column" not in spec or \
+               "field" not in spec and "uuid" not in spec:
+                raise ValueError("CSV mapping for %s.%s: resource, column and "
+                                 "field or uuid required" % (self.resource, field))
+            references.append((field, spec))
+        self.references = references
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def lookup(cls, stylesheet):
+        """
+            Find the mapping for an XSLT stylesheet
+
+            Args:
+                stylesheet: the stylesheet pathname
+
+            Returns:
+                the S3CSVMapping, or None if no (valid) mapping is available
+        """
+
+        if not isinstance(stylesheet, str) or \
+           not current.deployment_settings.get_base_csv_mappings():
+            return None
+
+        root, extension = os.path.splitext(stylesheet)
+        if extension.lower() != ".xsl":
+            return None
+        path = "%s.json" % root
+
+        try:
+            key = (os.path.abspath(path), os.path.getmtime(path))
+        except OSError:
+            return None
+
+        cache = cls._cache
+        mapping = cache.get(key)
+        if mapping is None:
+            try:
+                with open(path, "r") as f:
+                    mapping = cls(json.load(f))
+            except (IOError, ValueError):
+                current.log.error("Invalid CSV mapping %s: %s" % (path, sys.exc_info()[1]))
+                return None
+            cache.set(key, mapping)
+
+        return mapping
+
+    # -------------------------------------------------------------------------
+    def tree(self, source, extra_data=None, delimiter=",", quotechar='"'):
+        """
+            Convert a CSV source into an S3XML element tree
+
+            Args:
+                source: the source (file-like object)
+                extra_data: dict of extra cols {key:value} to add to each row
+                delimiter: delimiter for values
+                quotechar: quotation character
+
+            Returns:
+                the S3XML element tree
+        """
+
+        import csv
+
+        # Increase field size to be able to import WKTs
+        csv.field_size_limit(2**20 * 100)  # 100 megs
+
+        xml = S3XML
+        TAG = xml.TAG
+        RESOURCE = TAG.resource
+        DATA = TAG.data
+        REFERENCE = TAG.reference
+
+        ATTRIBUTE = xml.ATTRIBUTE
+        NAME = ATTRIBUTE.name
+        FIELD = ATTRIBUTE.field
+        RTABLE = ATTRIBUTE.resource
+        TUID = ATTRIBUTE.tuid
+        UID = xml.UID
+
+        SubElement = etree.SubElement
+
+        root = etree.Element(TAG.root)
+        lookups = {}
+
+        def value(row, column):
+            v = row.get(column)
+            if v:
+                v = s3_str(v).strip()
+                if v[:6].lower() in ("null", "<null>"):
+                    v = ""
+            return v or ""
+
+        tablename = self.resource
+        uuid = self.uuid
+        required = self.required
+        data = self.data
+        references = self.references
+
+        def add_row(row):
+
+            for column in required:
+                if not value(row, column):
+                    return
+
+            resource = SubElement(root, RESOURCE)
+            resource.set(NAME, tablename)
+            if uuid:
+                v = value(row, uuid)
+                if v:
+                    resource.set(UID, v)
+
+            for field, spec in data:
+                if "column" in spec:
+                    v = value(row, spec["column"])
+                else:
+                    v = s3_str(spec["value"])
+                if not v and spec.get("optional"):
+                    continue
+                element = SubElement(resource, DATA)
+                element.set(FIELD, field)
+                attribute = spec.get("attribute")
+                if attribute:
+                    element.set(attribute, v)
+                elif v:
+                    element.text = v
+                attributes = spec.get("attributes")
+                if attributes:
+                    for k, a in attributes.items():
+                        element.set(k, s3_str(a))
+
+            for field, spec in references:
+                v = value(row, spec["column"])
+                if not v:
+                    continue
+                rtablename = spec["resource"]
+                reference = SubElement(resource, REFERENCE)
+                reference.set(FIELD, field)
+                reference.set(RTABLE, rtablename)
+                if "uuid" in spec:
+                    reference.set(UID, spec["uuid"] % v)
+                    continue
+
+                tuid = "%s/%s" % (rtablename, v)
+                reference.set(TUID, tuid)
+                if tuid not in lookups:
+                    lookup = etree.Element(RESOURCE)
+                    lookup.set(NAME, rtablename)
+                    lookup.set(TUID, tuid)
+                    element = SubElement(lookup, DATA)
+                    element.set(FIELD, spec["field"])
+                    element.text = v
+                    lookups[tuid] = lookup
+
+        def read_from_csv(source):
+            del root[:]
+            lookups.clear()
+            try:
+                reader = csv.DictReader(xml.utf_8_encode(source),
+                                        delimiter = delimiter,
+                                        quotechar = quotechar,
+                                        )
+                for i, row in enumerate(reader):
+                    # Skip empty rows
+                    if not any(row.values()):
+                        continue
+                    if i == 0:
+                        # Skip hashtag row
+                        items = [s3_str(v.strip())
+                                 for k, v in row.items() if k and v and v.strip()]
+                        if all(v[0] == "#" for v in items):
+                            continue
+                    if extra_data:
+                        for key in extra_data:
+                            if key not in row:
+                                row[key] = extra_data[key]
+                    add_row(row)
+            except csv.Error:
+                e = sys.exc_info()[1]
+                raise HTTP(400, body=xml.json_message(False, 400, e))
+
+        try:
+            read_from_csv(source)
+        except UnicodeDecodeError:
+            e = sys.exc_info()[1]
+            try:
+                fname, fmode = source.name, source.mode
+            except AttributeError:
+                fname = fmode = None
+            if fname and fmode and "b" not in fmode:
+                # Perhaps a file opened in text mode with wrong encoding,
+                # => try to reopen in binary mode
+                with open(fname, "rb") as bsource:
+                    read_from_csv(bsource)
+            else:
+                raise HTTP(400, body=xml.json_message(False, 400, e))
+
+        root.extend(lookups.values())
+
+        return etree.ElementTree(root)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def from_xslt(stylesheet):
+        """
+            Generate a mapping from a simple CSV import stylesheet, i.e.
+            one that transforms each row into exactly one resource with
+            data fields from columns (optional if empty) and a UUID
+
+            Args:
+                stylesheet: the stylesheet pathname
+
+            Returns:
+                the mapping (dict), or None if the stylesheet is not simple
+                enough to be expressed as mapping
+        """
+
+        XSL = "{http://www.w3.org/1999/XSL/Transform}"
+        COLUMN = re.compile(r"^col\[@field='([^']+)'\](/text\(\))?$")
+        NOT_EMPTY = re.compile(r"^col\[@field='([^']+)'\](/text\(\))?\s*!=\s*''$")
+
+        tree = current.xml.parse(stylesheet)
+        if tree is None:
+            return None
+
+        def elements(node):
+            # Child elements without comments, or None if node has text
+            if node.text and node.text.strip():
+                return None
+            children = []
+            for child in node:
+                if not isinstance(child.tag, str):
+                    continue
+                if child.tail and child.tail.strip():
+                    return None
+                children.append(child)
+            return children
+
+        def column(node):
+            # The column in the single xsl:value-of child of node
+            children = elements(node)
+            if not children or len(children) != 1:
+                return None
+            child = children[0]
+            if child.tag != "%svalue-of" % XSL or len(child):
+                return None
+            match = COLUMN.match(child.get("select", "").strip())
+            return match.group(1) if match else None
+
+        def literal(node):
+            # The constant text of node
+            children = [child for child in node if isinstance(child.tag, str)]
+            if not children:
+                return node.text or ""
+            elif len(children) == 1 and children[0].tag == "%stext" % XSL:
+                return children[0].text or ""
+            return None
+
+        # Only the root and row templates are allowed
+        templates = {}
+        for node in elements(tree.getroot()) or []:
+            if node.tag == "%stemplate" % XSL and not node.get("name"):
+                templates[node.get("match")] = node
+            elif node.tag not in ("%soutput" % XSL, "%simport" % XSL):
+                return None
+        if set(templates) != {"/", "row"}:
+            return None
+
+        # The root template applies the row template to all rows
+        nodes = elements(templates["/"])
+        if not nodes or len(nodes) != 1 or nodes[0].tag != "s3xml":
+            return None
+        nodes = elements(nodes[0])
+        if not nodes or len(nodes) != 1 or \
+           nodes[0].tag != "%sapply-templates" % XSL or \
+           nodes[0].get("select") not in ("./table/row", "table/row", "//row"):
+            return None
+
+        # The row template produces exactly one resource
+        nodes = elements(templates["row"])
+        if not nodes or len(nodes) != 1:
+            return None
+        resource = nodes[0]
+        tablename = resource.get("name")
+        if resource.tag != "resource" or not tablename or len(resource.attrib) != 1:
+            return None
+
+        mapping = {"resource": tablename}
+        data = {}
+
+        for node in elements(resource) or []:
+
+            tag = node.tag
+            optional = False
+
+            if tag == "%sattribute" % XSL:
+                # The record UUID
+                uuid = column(node)
+                if node.get("name") != "uuid" or not uuid:
+                    return None
+                mapping["uuid"] = uuid
+                continue
+
+            if tag == "%sif" % XSL:
+                # Optional data field
+                match = NOT_EMPTY.match(node.get("test", "").strip())
+                children = elements(node)
+                if not match or not children or len(children) != 1:
+                    return None
+                node = children[0]
+                tag = node.tag
+                optional = match.group(1)
+
+            field = node.get("field")
+            if tag != "data" or not field or len(node.attrib) != 1:
+                return None
+
+            name = column(node)
+            if name:
+                spec = {"column": name}
+            else:
+                # Values in attributes
+                spec = {}
+                attributes = {}
+                for child in elements(node) or []:
+                    attribute = child.get("name")
+                    if child.tag != "%sattribute" % XSL or not attribute:
+                        return None
+                    name = column(child)
+                    if name:
+                        if "column" in spec:
+                            return None
+                        spec["column"] = name
+                        spec["attribute"] = attribute
+                    else:
+                        value = literal(child)
+                        if value is None:
+                            return None
+                        attributes[attribute] = value
+                if "column" not in spec:
+                    return None
+                if attributes:
+                    spec["attributes"] = attributes
+
+            if optional:
+                if optional != spec["column"]:
+                    return None
+                spec["optional"] = True
+
+            data[field] = spec["column"] if len(spec) == 1 else spec
+
+        mapping["data"] = data
+        return mapping
+
 # =============================================================================
 class S3EntityResolver(etree.Resolver):
     """ Safe entity resolver for S3XML.parse """
@@ -3001,7 +3729,7 @@ class S3EntityResolver(etree.Resolver):
 
 # =============================================================================
 class S3XMLFormat:
-    """ Helper class to store a pre-parsed stylesheet """
+    """ Helper class to store a pre-parsed and compiled stylesheet """
 
     def __init__(self, stylesheet):
         """
@@ -3009,13 +3737,44 @@ class S3XMLFormat:
                 stylesheet: the stylesheet (pathname or stream)
         """
 
-        self.tree = current.xml.parse(stylesheet)
+        self.tree, self.transformer = current.xml.stylesheet(stylesheet)
         if not self.tree:
             current.log.error("%s parse error: %s" %
                               (stylesheet, current.xml.error))
 
         self.select = None
         self.skip = None
+        self.streaming = None
+
+    # -------------------------------------------------------------------------
+    def get_streaming(self):
+        """
+            Get the streaming options of the stylesheet, i.e. whether
+            it can transform an export page by page
+
+            Returns:
+                dict {"items": tag name of the elements to write from
+                      subsequent pages, None for all elements}, or None
+                if the stylesheet requires the complete tree
+
+            Note:
+                Stylesheets declare this with a top-level element like:
+                <s3:streaming items="entry"/>
+                - the output of the first page is written completely,
+                  from subsequent pages only the (item) elements below
+                  the root element
+                - items must therefore be independent from each other,
+                  and must not rely on other records being in the same
+                  page (except references of the record itself)
+        """
+
+        if not self.tree:
+            return None
+
+        if self.select is None:
+            self.__inspect()
+
+        return self.streaming
 
     # -------------------------------------------------------------------------
     def get_fields(self, tablename):
@@ -3076,7 +3835,10 @@ class S3XMLFormat:
 
     # -------------------------------------------------------------------------
     def __inspect(self):
-        """ Check the fields configuration in the stylesheet (if any) """
+        """
+            Check the fields configuration and streaming options in
+            the stylesheet (if any)
+        """
 
         ALL = "ALL"
         ANY = "ANY"
@@ -3110,6 +3872,12 @@ class S3XMLFormat:
         self.select = select
         self.skip = skip
 
+        streaming = tree.xpath("./s3:streaming", namespaces=ns)
+        if streaming:
+            self.streaming = {"items": streaming[0].get("items")}
+        else:
+            self.streaming = None
+
     # -------------------------------------------------------------------------
     def transform(self, tree, **args):
         """
@@ -3120,10 +3888,10 @@ class S3XMLFormat:
                 args: parameters for the stylesheet
         """
 
-        if not self.tree:
+        if not self.transformer:
             current.log.error("XMLFormat: no stylesheet available")
             return tree
 
-        return current.xml.transform(tree, self.tree, **args)
+        return current.xml.transform(tree, self.transformer, **args)
 
 # End =========================================================================
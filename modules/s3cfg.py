@@ -968,6 +968,31 @@ class S3Config(Storage):
         """
         return self.auth.get("user_realms_include_persons", False)
 
+    def get_auth_acl_cache(self):
+        """
+            Maximum number of compiled ACLs (per user roles/realms and
+            page/table) to share between requests in the process-wide
+            ACL cache, 0 to disable
+        """
+        return self.auth.get("acl_cache", 0)
+
+    def get_auth_simplify_realm_queries(self):
+        """
+            Normalize and merge the realm and ownership predicates in
+            accessible-queries (e.g. fold roles with identical realms into
+            a single belongs, drop terms subsumed by realm permissions)
+        """
+        return self.auth.get("simplify_realm_queries", False)
+
+    def get_auth_realm_closure(self):
+        """
+            Applies only to Hierarchical Realms (Policy 7)
+            Maintain a materialized closure of the OU hierarchy
+            (pr_affiliation_closure), so that ancestors and descendants
+            of realm entities can be looked up with a single query
+        """
+        return self.auth.get("realm_closure", False)
+
     def get_auth_entity_role_manager(self):
         """
             Activate Entity Role Manager (=embedded Role Manager Tab for OrgAdmins)
@@ -1109,6 +1134,143 @@ class S3Config(Storage):
       """
         return self.base.get("bigtable", False)
 
+    def get_base_keyset_pagination(self):
+        """
+            Use keyset pagination (seek to the last-seen sort key rather
+            than using OFFSET) for server-side paginated data tables, so
+            that deep pages are as fast as the first page
+            - resource-specific override possible (keyset_pagination)
+        """
+        return self.base.get("keyset_pagination", False)
+
+    def get_base_count_cache(self):
+        """
+            Cache the number of records matching a filter, for repeated
+            counts of the same filtered resource (e.g. data table Ajax
+            refreshes)
+            - maximum age of the cached numbers in seconds (the number
+              is also invalidated by any insert or update in the tables
+              involved, i.e. a change in their modified_on high-water mark,
+              or by hard deletions), or False to disable
+            - tables counted with filters should have an index on
+              modified_on, otherwise checking the high-water mark
+              requires a table scan
+        """
+        return self.base.get("count_cache", False)
+
+    def get_base_count_estimate(self):
+        """
+            Show data tables with an estimated total number of records
+            (from query planner statistics, PostgreSQL only) until the
+            exact number has been counted
+        """
+        return self.base.get("count_estimate", False)
+
+    def get_base_semijoin_filters(self):
+        """
+            Apply filters for multi-valued components (e.g. ~.contact.value)
+            as sub-selects of matching record IDs (semi-joins), rather than
+            joining the components into the master query and selecting
+            DISTINCT
+            - can be overridden per table with s3db.configure(tablename,
+              semijoin_filters=True|False)
+        """
+        return self.base.get("semijoin_filters", False)
+
+    def get_base_filter_cache(self):
+        """
+            Maximum number of parsed URL filters (S3URLQuery) to keep
+            in the process-wide filter cache, 0 to disable
+        """
+        return self.base.get("filter_cache", 1000)
+
+    def get_base_model_manifest(self):
+        """
+            Use a model manifest (written to the cache folder when all
+            models are loaded, e.g. during first run) to look up which
+            model class defines a table, rather than searching the model
+            modules (see S3Model.manifest)
+        """
+        return self.base.get("model_manifest", False)
+
+    def get_base_profiler_sample_rate(self):
+        """
+            Fraction of requests (0.0 to 1.0) to profile with the sampling
+            request profiler (see S3RequestProfiler), 0 to disable
+        """
+        return self.base.get("profiler_sample_rate", 0)
+
+    def get_base_profiler_window(self):
+        """
+            Number of profiled requests per controller/function/method
+            to keep in the request profiler statistics
+        """
+        return self.base.get("profiler_window", 100)
+
+    def get_base_slow_query_threshold(self):
+        """
+            Minimum execution time (in seconds) for DB queries to be
+            recorded in the slow-query log of the index advisor (see
+            S3IndexAdvisor), 0 to disable
+        """
+        return self.base.get("slow_query_threshold", 0)
+
+    def get_base_xslt_cache(self):
+        """
+            Maximum number of compiled XSLT stylesheets to share between
+            requests in the process-wide stylesheet cache (stylesheets
+            are recompiled when the file is modified), 0 to disable
+        """
+        return self.base.get("xslt_cache", 100)
+
+    def get_base_csv_mappings(self):
+        """
+            Use declarative column mappings (JSON files alongside the
+            XSLT stylesheets, see S3CSVMapping) instead of the XSLT
+            stylesheets for CSV imports, where available
+        """
+        return self.base.get("csv_mappings", True)
+
+    def get_base_import_batch_size(self):
+        """
+            Number of top-level elements per batch in streaming
+            S3XML imports (see S3Resource.import_stream)
+        """
+        return self.base.get("import_batch_size", 1000)
+
+    def get_base_import_bulk_commit(self):
+        """
+            Whether to create the new records of import jobs in bulk per
+            table, with batched post-processing (see S3ImportBulkCommit),
+            e.g. to speed up prepopulate and large CSV imports
+        """
+        return self.base.get("import_bulk_commit", False)
+
+    def get_base_export_page_size(self):
+        """
+            Number of master records per page in incremental S3XML
+            exports (see S3Resource.export_stream), 0 to always build
+            the complete tree before serializing it
+        """
+        return self.base.get("export_page_size", 500)
+
+    def get_base_represent_cache(self):
+        """
+            Maximum number of foreign key representations to share between
+            requests in the process-wide representation cache (for
+            S3Represent subclasses that support it, e.g. organisations,
+            sites and persons), 0 to disable
+        """
+        return self.base.get("represent_cache", 0)
+
+    def get_base_represent_cache_ttl(self):
+        """
+            Maximum age (in seconds) of entries in the representation
+            cache, limits how long changes made by other processes can
+            go unnoticed
+        """
+        return self.base.get("represent_cache_ttl", 300)
+
     def get_base_cdn(self):
         """
             Should we use CDNs (Content Distribution Networks) to serve some common CSS/JS?
@@ -679,8 +679,11 @@ class OrganisationModel(S3Model):
         """
             * Set default root_organisation ID
             * If a logo was uploaded then create the extra versions
+            * Invalidate shared representations
         """
 
+        S3Represent.clear_cache("org_organisation")
+
         form_vars_get = form.vars.get
 
         # Set default root_organisation ID
@@ -716,6 +719,8 @@ class OrganisationModel(S3Model):
             If an Org is deleted then remove Logo
         """
 
+        S3Represent.clear_cache("org_organisation")
+
         db = current.db
         table = db.org_organisation
         deleted_row = db(table.id == row.id).select(table.logo,
@@ -927,6 +932,9 @@ class OrganisationBranchModel(S3Model):
             Remove any duplicate memberships and update affiliations
         """
 
+        # Representations include the parent organisation
+        S3Represent.clear_cache("org_organisation")
+
         link_id = form.vars.id
         db = current.db
         s3db = current.s3db
@@ -1073,6 +1081,9 @@ class OrganisationBranchModel(S3Model):
             Update affiliations
         """
 
+        # Representations include the parent organisation
+        S3Represent.clear_cache("org_organisation")
+
         db = current.db
         table = db.org_organisation_branch
         record = db(table.id == row.id).select(table.branch_id,
@@ -1671,11 +1682,16 @@ class OrganisationNameModel(S3Model):
                           s3_comments(),
                           *s3_meta_fields())
 
+        # Representations use local names
+        invalidate = S3Represent.invalidator("org_organisation")
+
         self.configure(tablename,
                        deduplicate = S3Duplicate(primary = ("organisation_id",
                                                             "language",
                                                             ),
                                                  ),
+                       onaccept = invalidate,
+                       ondelete = invalidate,
                        )
 
         # Pass names back to global scope (s3.*)
@@ -3675,6 +3691,7 @@ class SiteModel(S3Model):
         """
             Onaccept-routine for site super-records:
             - generate a unique site code
+            - invalidate shared representations
 
             Note:
                 Site code differs from instance table "code" fields in that
@@ -3685,6 +3702,8 @@ class SiteModel(S3Model):
                 field, and produce a unique site code here onaccept
         """
 
+        S3Represent.clear_cache("org_site")
+
         # Get record ID
         form_vars = form.vars
         if "site_id" in form_vars:
@@ -4343,11 +4362,16 @@ class SiteNameModel(S3Model):
                           s3_comments(),
                           *s3_meta_fields())
 
+        # Representations use local names
+        invalidate = S3Represent.invalidator("org_site")
+
         self.configure(tablename,
                        deduplicate = S3Duplicate(primary = ("language",
                                                             "site_id",
                                                             ),
                                                  ),
+                       onaccept = invalidate,
+                       ondelete = invalidate,
                        )
 
         # Pass names back to global scope (s3.*)
@@ -4564,10 +4588,15 @@ class FacilityModel(S3Model):
                                                                  ),
                                            )
 
+        # Site representations can include the facility type
+        invalidate = S3Represent.invalidator("org_site")
+
         configure(tablename,
                   deduplicate = S3Duplicate(),
                   hierarchy = hierarchy,
                   list_fields = list_fields,
+                  onaccept = invalidate,
+                  ondelete = invalidate,
                   )
 
         # ---------------------------------------------------------------------
@@ -4893,6 +4922,11 @@ class FacilityModel(S3Model):
                      facility_type_id(),
                      *s3_meta_fields())
 
+        configure(tablename,
+                  onaccept = invalidate,
+                  ondelete = invalidate,
+                  )
+
         # Pass names back to global scope (s3.*)
         return {"org_facility_type_id": facility_type_id,
                 "org_facility_geojson": self.org_facility_geojson,
@@ -5752,6 +5786,8 @@ def org_region_options(zones = False):
 class org_OrganisationRepresent(S3Represent):
     """ Representation of Organisations """
 
+    shared = True
+
     def __init__(self,
                  show_link = False,
                  linkto = None,
@@ -5902,6 +5938,18 @@ class org_OrganisationRepresent(S3Represent):
 
         return s3_str(name)
 
+    # -------------------------------------------------------------------------
+    def cache_key(self):
+        """
+            Key prefix for the shared representation cache, extended
+            by the options of this representation
+        """
+
+        key = super(org_OrganisationRepresent, self).cache_key()
+        if key is not None:
+            key += (bool(self.parent), bool(self.acronym))
+        return key
+
     # -------------------------------------------------------------------------
     def dt_orderby(self, field, direction, orderby, left):
         """
@@ -5939,6 +5987,8 @@ class org_OrganisationRepresent(S3Represent):
 class org_SiteRepresent(S3Represent):
     """ Representation of Sites """
 
+    shared = True
+
     def __init__(self,
                  show_link = False,
                  multiple = False,
@@ -6218,6 +6268,20 @@ class org_SiteRepresent(S3Represent):
 
         return s3_str(name)
 
+    # -------------------------------------------------------------------------
+    def cache_key(self):
+        """
+            Key prefix for the shared representation cache, extended
+            by the options of this representation
+        """
+
+        key = super(org_SiteRepresent, self).cache_key()
+        if key is not None:
+            instance_types = tuple(sorted((k, s3_str(v))
+                                   for k, v in self.instance_types.items()))
+            key += (bool(self.show_type), instance_types)
+        return key
+
 # =============================================================================
 class org_SiteCheckInMethod(S3Method):
     """
@@ -109,6 +109,7 @@ __all__ = (# Person Entities
            "pr_descendants",
            "pr_rebuild_path",
            "pr_role_rebuild_path",
+           "pr_update_closure",
 
            # Helper for ImageLibrary
            "pr_image_modify",
@@ -150,6 +151,7 @@ class PersonEntityModel(S3Model):
 
     names = ("pr_pentity",
              "pr_affiliation",
+             "pr_affiliation_closure",
              "pr_person_user",
              "pr_role",
              "pr_role_types",
@@ -417,6 +419,7 @@ class PersonEntityModel(S3Model):
 
         # Resource configuration
         configure(tablename,
+                  onaccept = self.pr_role_onaccept,
                   onvalidation = self.pr_role_onvalidation,
                   )
 
@@ -472,6 +475,20 @@ class PersonEntityModel(S3Model):
                   ondelete = self.pr_affiliation_ondelete,
                   )
 
+        # ---------------------------------------------------------------------
+        # Affiliation Closure
+        # - materialized ancestor/descendant relationships in the OU
+        #   hierarchy, for realm lookups in a single query
+        # - maintained by pr_update_closure (settings.auth.realm_closure)
+        #
+        tablename = "pr_affiliation_closure"
+        define_table(tablename,
+                     Field("ancestor_pe_id", "integer"),
+                     Field("descendant_pe_id", "integer"),
+                     Field("role_type", "integer"),
+                     Field("depth", "integer"),
+                     )
+
         # ---------------------------------------------------------------------
         # Pass names back to global scope (s3.*)
         #
@@ -675,6 +692,21 @@ class PersonEntityModel(S3Model):
                     form_vars["path"] = None
                 current.s3db.pr_role_rebuild_path(role_id, clear=True)
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def pr_role_onaccept(form):
+        """
+            Update the OU hierarchy closure for the affiliates of the
+            role (in case the role type has changed)
+
+            Args:
+                form: the CRUD form
+        """
+
+        role_id = form.vars.id
+        if role_id:
+            pr_update_role_closure(role_id)
+
     # -------------------------------------------------------------------------
     @staticmethod
     def pr_pentity_onaccept(form):
@@ -948,6 +980,7 @@ class PersonModel(S3Model):
                        main = "first_name",
                        extra = "last_name",
                        onaccept = self.pr_person_onaccept,
+                       ondelete = S3Represent.invalidator("pr_person"),
                        realm_components = ("address",
                                            "contact",
                                            "contact_emergency",
@@ -1342,9 +1375,12 @@ class PersonModel(S3Model):
     def pr_person_onaccept(form):
         """
             Onaccept callback
-            Update any User record associated with this person
+            - invalidate shared representations
+            - update any User record associated with this person
         """
 
+        S3Represent.clear_cache("pr_person")
+
         db = current.db
         s3db = current.s3db
 
@@ -7497,6 +7533,8 @@ class pr_PersonRepresent(S3Represent):
             link_contacts: Link to Contacts Tab (unless explicit linkto provided)
     """
 
+    shared = True
+
     def __init__(self,
                  lookup = "pr_person",
                  key = None,
@@ -7568,6 +7606,9 @@ class pr_PersonRepresentContact(pr_PersonRepresent):
         available (and permitted)
     """
 
+    # Contact information is permission-dependent
+    shared = False
+
     def __init__(self,
                  labels = None,
                  linkto = None,
@@ -9643,6 +9684,8 @@ def pr_define_role(pe_id,
             s3db.pr_role_rebuild_path(duplicate.id, clear=True)
         duplicate.update_record(**data)
         record_id = duplicate.id
+        if duplicate.role_type != role_type:
+            pr_update_role_closure(record_id)
     else:
         record_id = rtable.insert(**data)
     return record_id
@@ -9896,6 +9939,15 @@ def pr_get_ancestors(pe_id):
             list of PE IDs (as strings)
     """
 
+    ctable = pr_closure_table()
+    if ctable is not None:
+        query = (ctable.descendant_pe_id == pe_id) & \
+                (ctable.role_type == OU)
+        rows = current.db(query).select(ctable.ancestor_pe_id,
+                                        orderby = ~ctable.depth,
+                                        )
+        return [str(row.ancestor_pe_id) for row in rows]
+
     s3db = current.s3db
     atable = s3db.pr_affiliation
     rtable = s3db.pr_role
@@ -10030,6 +10082,19 @@ def pr_ancestors(entities):
     if not entities:
         return Storage()
 
+    ctable = pr_closure_table()
+    if ctable is not None:
+        query = (ctable.descendant_pe_id.belongs(entities)) & \
+                (ctable.role_type == OU)
+        rows = current.db(query).select(ctable.ancestor_pe_id,
+                                        ctable.descendant_pe_id,
+                                        orderby = ~ctable.depth,
+                                        )
+        ancestors = Storage([(pe_id, []) for pe_id in entities])
+        for row in rows:
+            ancestors[row.descendant_pe_id].append(str(row.ancestor_pe_id))
+        return ancestors
+
     s3db = current.s3db
     atable = s3db.pr_affiliation
     rtable = s3db.pr_role
@@ -10085,6 +10150,24 @@ def pr_descendants(pe_ids, skip=None, root=True, exclude_persons=True):
     if not pe_ids:
         return {}
 
+    ctable = pr_closure_table() if root else None
+    if ctable is not None:
+        # Single lookup from the closure
+        query = (ctable.ancestor_pe_id.belongs(pe_ids)) & \
+                (ctable.role_type == OU)
+        if exclude_persons:
+            etable = current.s3db.pr_pentity
+            query &= (etable.pe_id == ctable.descendant_pe_id) & \
+                     (etable.instance_type != "pr_person")
+        rows = current.db(query).select(ctable.ancestor_pe_id,
+                                        ctable.descendant_pe_id,
+                                        orderby = ctable.depth,
+                                        )
+        result = {}
+        for row in rows:
+            result.setdefault(row.ancestor_pe_id, []).append(row.descendant_pe_id)
+        return result
+
     s3db = current.s3db
     rtable = s3db.pr_role
     atable = s3db.pr_affiliation
@@ -10176,6 +10259,21 @@ def pr_get_descendants(pe_ids, entity_types=None, skip=None, ids=True):
     db = current.db
     s3db = current.s3db
     etable = s3db.pr_pentity
+
+    ctable = pr_closure_table() if ids and skip is None else None
+    if ctable is not None:
+        # Single lookup from the closure
+        query = (ctable.ancestor_pe_id.belongs(pe_ids)) & \
+                (ctable.role_type == OU)
+        if entity_types is not None:
+            if not isinstance(entity_types, (set, list, tuple)):
+                entity_types = [entity_types]
+            query &= (etable.pe_id == ctable.descendant_pe_id) & \
+                     (etable.instance_type.belongs(entity_types))
+        rows = db(query).select(ctable.descendant_pe_id,
+                                groupby = ctable.descendant_pe_id,
+                                )
+        return [row.descendant_pe_id for row in rows]
     rtable = db.pr_role
     atable = db.pr_affiliation
 
@@ -10253,6 +10351,10 @@ def pr_rebuild_path(pe_id, clear=False):
         if role.path is None:
             pr_role_rebuild_path(role, clear=clear)
 
+    if clear:
+        # Affiliations have changed => update the closure, too
+        pr_update_closure(pe_id)
+
 # =============================================================================
 def pr_role_rebuild_path(role_id, skip=None, clear=False):
     """
@@ -10326,6 +10428,194 @@ def pr_role_rebuild_path(role_id, skip=None, clear=False):
 
     return path
 
+# =============================================================================
+# OU Hierarchy Closure
+# =============================================================================
+def pr_closure_table():
+    """
+        Get the materialized closure of the OU hierarchy, if enabled by
+        settings.auth.realm_closure (builds the closure if necessary)
+
+        Returns:
+            the pr_affiliation_closure Table, or None if not enabled
+    """
+
+    if not current.deployment_settings.get_auth_realm_closure():
+        return None
+
+    ctable = current.s3db.pr_affiliation_closure
+
+    s3 = current.response.s3
+    if not s3.pr_closure:
+        # Check for the marker that the closure has been built
+        query = (ctable.ancestor_pe_id == 0) & \
+                (ctable.descendant_pe_id == 0)
+        row = current.db(query).select(ctable.id,
+                                       limitby = (0, 1),
+                                       ).first()
+        if not row:
+            pr_update_closure()
+        s3.pr_closure = True
+
+    return ctable
+
+# =============================================================================
+def pr_update_closure(pe_ids=None):
+    """
+        Update the materialized closure of the OU hierarchy for entities
+        whose OU affiliations have changed, including all their descendants
+
+        Args:
+            pe_ids: the PE ID(s) of the entities, or None to rebuild
+                    the closure for all entities
+    """
+
+    if not current.deployment_settings.get_auth_realm_closure():
+        return
+
+    db = current.db
+    s3db = current.s3db
+
+    ctable = s3db.pr_affiliation_closure
+    rtable = s3db.pr_role
+    atable = s3db.pr_affiliation
+
+    if pe_ids is None:
+        # Rebuild all
+        db(ctable.id > 0).delete()
+        pr_closure_indexes()
+        subtree = None
+    else:
+        if not isinstance(pe_ids, (list, tuple, set)):
+            pe_ids = [pe_ids]
+        subtree = set(pe_ids)
+
+        # The descendants of the entities are affected as well
+        query = (ctable.ancestor_pe_id.belongs(subtree)) & \
+                (ctable.role_type == OU)
+        rows = db(query).select(ctable.descendant_pe_id)
+        subtree |= {row.descendant_pe_id for row in rows}
+
+        query = (ctable.descendant_pe_id.belongs(subtree)) & \
+                (ctable.role_type == OU)
+        db(query).delete()
+
+    # Get the current OU affiliations of the affected entities
+    query = (atable.deleted == False) & \
+            (atable.role_id == rtable.id) & \
+            (rtable.deleted == False) & \
+            (rtable.role_type == OU)
+    if subtree is not None:
+        query &= (atable.pe_id.belongs(subtree))
+    rows = db(query).select(rtable.pe_id, atable.pe_id)
+
+    parents, children = {}, {}
+    for row in rows:
+        parent, child = row.pr_role.pe_id, row.pr_affiliation.pe_id
+        if parent == child:
+            continue
+        parents.setdefault(child, set()).add(parent)
+        children.setdefault(parent, set()).add(child)
+
+    outer = {}
+    if subtree is None:
+        subtree = set(parents)
+    else:
+        # Ancestors of the parent entities outside of the subtree
+        # have not changed => look them up from the closure
+        outside = {p for pe_id in subtree for p in parents.get(pe_id, ())
+                     if p not in subtree}
+        if outside:
+            query = (ctable.descendant_pe_id.belongs(outside)) & \
+                    (ctable.role_type == OU)
+            rows = db(query).select(ctable.ancestor_pe_id,
+                                    ctable.descendant_pe_id,
+                                    ctable.depth,
+                                    )
+            for row in rows:
+                ancestors = outer.setdefault(row.descendant_pe_id, {})
+                ancestors[row.ancestor_pe_id] = row.depth
+
+    # Propagate ancestors (with shortest distance) down the hierarchy
+    closure = {pe_id: {} for pe_id in subtree}
+    pending = list(subtree)
+    while pending:
+        pe_id = pending.pop()
+        ancestors = closure[pe_id]
+        updated = False
+        for parent in parents.get(pe_id, ()):
+            inherited = closure[parent] if parent in closure else \
+                        outer.get(parent, {})
+            items = [(parent, 0)] + list(inherited.items())
+            for ancestor, depth in items:
+                depth += 1
+                if ancestor != pe_id and \
+                   (ancestor not in ancestors or ancestors[ancestor] > depth):
+                    ancestors[ancestor] = depth
+                    updated = True
+        if updated:
+            pending.extend(c for c in children.get(pe_id, ()) if c in closure)
+
+    # Store the closure
+    items = [{"ancestor_pe_id": ancestor,
+              "descendant_pe_id": pe_id,
+              "role_type": OU,
+              "depth": depth,
+              }
+             for pe_id, ancestors in closure.items()
+             for ancestor, depth in ancestors.items()
+             ]
+    if pe_ids is None:
+        # Marker that the closure has been built
+        items.append({"ancestor_pe_id": 0,
+                      "descendant_pe_id": 0,
+                      "role_type": None,
+                      "depth": 0,
+                      })
+    if items:
+        ctable.bulk_insert(items)
+
+# =============================================================================
+def pr_update_role_closure(role_id):
+    """
+        Update the OU hierarchy closure for all affiliates of a role
+
+        Args:
+            role_id: the role ID
+    """
+
+    if not current.deployment_settings.get_auth_realm_closure():
+        return
+
+    atable = current.s3db.pr_affiliation
+    query = (atable.role_id == role_id) & \
+            (atable.deleted == False)
+    rows = current.db(query).select(atable.pe_id)
+    if rows:
+        pr_update_closure({row.pe_id for row in rows})
+
+# =============================================================================
+def pr_closure_indexes():
+    """
+        Create indexes for the pr_affiliation_closure table, for faster
+        ancestor/descendant lookups
+    """
+
+    dbtype = current.deployment_settings.get_database_type()
+
+    if dbtype in ("postgres", "sqlite"):
+        sql = "CREATE INDEX IF NOT EXISTS %(index)s ON %(table)s (%(field)s);"
+    else:
+        return
+
+    names = {"table": "pr_affiliation_closure"}
+
+    db = current.db
+    for fname in ("ancestor_pe_id", "descendant_pe_id"):
+        names["field"] = fname
+        names["index"] = "%(table)s_%(field)s_idx" % names
+        db.executesql(sql % names)
+
 # -----------------------------------------------------------------------------
 def pr_image_modify(image_file,
                     image_name,
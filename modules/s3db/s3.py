@@ -611,6 +611,7 @@ class S3HierarchyModel(S3Model):
     """ Model for stored object hierarchies """
 
     names = ("s3_hierarchy",
+             "s3_hierarchy_closure",
              )
 
     def model(self):
@@ -627,6 +628,18 @@ class S3HierarchyModel(S3Model):
                           Field("hierarchy", "json"),
                           *S3MetaFields.timestamps())
 
+        # ---------------------------------------------------------------------
+        # Closure table for stored object hierarchies
+        # - one row per pair of ancestor and descendant node (including
+        #   the node itself), to resolve subtrees in a single subquery
+        #
+        tablename = "s3_hierarchy_closure"
+        self.define_table(tablename,
+                          Field("tablename", length=64),
+                          Field("ancestor", "integer"),
+                          Field("descendant", "integer"),
+                          )
+
         # ---------------------------------------------------------------------
         # Return global names to s3.*
         #
@@ -29,6 +29,38 @@ def config(settings):
 
     # Uncomment this to prefer scalability-optimized strategies globally
     #settings.base.bigtable = True
+    # Uncomment this to use keyset pagination in server-side paginated data tables
+    #settings.base.keyset_pagination = True
+    # Uncomment this to cache record counts for filtered data tables (for 60 seconds)
+    #settings.base.count_cache = 60
+    # Uncomment this to show estimated record counts in data tables until counted (PostgreSQL only)
+    #settings.base.count_estimate = True
+    # Uncomment this to apply filters for multi-valued components as sub-selects rather than joins
+    #settings.base.semijoin_filters = True
+    # Change the number of parsed URL filters to cache between requests (0 to disable)
+    #settings.base.filter_cache = 1000
+    # Uncomment this to use a model manifest to find the model classes for tables (written when all models are loaded)
+    #settings.base.model_manifest = True
+    # Uncomment this to profile a fraction of all requests (statistics in admin/profiler)
+    #settings.base.profiler_sample_rate = 0.01
+    # Change the number of profiled requests to keep per controller/function/method
+    #settings.base.profiler_window = 100
+    # Uncomment this to record slow DB queries (threshold in seconds) for the index advisor (admin/index_advisor)
+    #settings.base.slow_query_threshold = 0.5
+    # Change the number of compiled XSLT stylesheets to cache between requests (0 to disable)
+    #settings.base.xslt_cache = 100
+    # Uncomment this to always use the XSLT stylesheets for CSV imports, even where a column mapping is available
+    #settings.base.csv_mappings = False
+    # Change the number of top-level elements per batch in streaming XML imports
+    #settings.base.import_batch_size = 1000
+    # Uncomment this to create new records of imports in bulk (faster prepopulate and CSV imports)
+    #settings.base.import_bulk_commit = True
+    # Change the number of master records per page in incremental XML exports (0 to disable)
+    #settings.base.export_page_size = 500
+    # Uncomment this to share foreign key representations between requests (maximum number of entries)
+    #settings.base.represent_cache = 5000
+    # Change the maximum age (in seconds) of shared representations
+    #settings.base.represent_cache_ttl = 300
 
     # Theme (folder to use for views/layout.html)
     #settings.base.theme = "default"
@@ -91,6 +123,12 @@ def config(settings):
     #settings.auth.org_admin_to_first = True
     # Define which entity types to use as realm entities in role manager
     #settings.auth.realm_entity_types = ("org_organisation",)
+    # Uncomment to share compiled ACLs between requests (max number of entries)
+    #settings.auth.acl_cache = 5000
+    # Uncomment to merge redundant realm/ownership predicates in accessible-queries
+    #settings.auth.simplify_realm_queries = True
+    # Uncomment to look up realm ancestors/descendants from a materialized closure of the OU hierarchy
+    #settings.auth.realm_closure = True
     # Uncomment to activate entity role manager tabs for OrgAdmins
     #settings.auth.entity_role_manager = True
     # Define modules for entity role manager
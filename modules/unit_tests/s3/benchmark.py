@@ -33,6 +33,8 @@
 # S3Resource.export (w/o DB extraction) = 1.7192029953 ms (=581 rec/sec)
 # S3Resource.__init__ = 2.65161395073 ms
 # S3Resource.load = 5.55664610863 ms
+# S3URLQueryParser.parse = 0.0415 ms (PyParsing-based parser: 17.19 ms)
+# S3Model model lookup (manifest) = 0.2 µs (module search: 25 µs)
 #
 # If you cannot achieve approximately these or even better results, then
 # it is recommendable to put effort into the optimization of the environment
@@ -50,6 +52,8 @@ import unittest
 from gluon import current
 from gluon.storage import Storage
 
+from s3dal import Field
+from s3 import S3Hierarchy, S3URLQueryParser, s3_all_meta_field_names, s3_meta_fields
 from unit_tests import run_suite
 
 def info(msg):
@@ -133,6 +137,57 @@ class S3PerformanceTests(unittest.TestCase):
             info("S3Model.__getitem__(non-table) = %s µs" % mlt)
             self.assertTrue(mlt<10)
 
+    def testS3ModelManifest(self):
+
+        s3db = current.s3db
+
+        info("")
+        manifest = s3db.manifest()
+        if manifest is None:
+            info("S3Model manifest not available (settings.base.model_manifest)")
+            return
+
+        models = current.models
+        names = [n for n, entry in manifest["names"].items()
+                 if entry[0] in models.__dict__]
+        if not names:
+            return
+
+        def search(tablename):
+            # Find the model class as S3Model.table does without manifest
+            module = models.__dict__.get(tablename.split("_", 1)[0])
+            if module is None:
+                return None
+            s3models = module.__dict__
+            for n in module.__all__:
+                model = s3models[n]
+                if hasattr(model, "_s3model") and \
+                   tablename in getattr(model, "names", ()):
+                    return n
+            return None
+
+        def lookup(tablename):
+            return manifest["names"].get(tablename)
+
+        # The manifest must refer to existing model classes, and agree
+        # with the module search where that finds the model class
+        for tablename in names:
+            prefix, classname = lookup(tablename)
+            module = models.__dict__[prefix]
+            self.assertTrue(hasattr(module.__dict__.get(classname), "_s3model"))
+            found = search(tablename)
+            if found:
+                self.assertEqual(found, classname)
+
+        number = 10
+        x = lambda: [search(tablename) for tablename in names]
+        mlt = timeit.Timer(x).timeit(number=number) / number / len(names) * 1000000
+        info("S3Model model lookup (module search) = %s µs" % mlt)
+
+        x = lambda: [lookup(tablename) for tablename in names]
+        mlt_ = timeit.Timer(x).timeit(number=number) / number / len(names) * 1000000
+        info("S3Model model lookup (manifest) = %s µs" % mlt_)
+
     def testS3ModelConfigure(self):
 
         s3db = current.s3db
@@ -150,6 +205,93 @@ class S3PerformanceTests(unittest.TestCase):
         info("S3Model.get_config = %s µs" % mlt)
         self.assertTrue(mlt<10)
 
+    def testS3ModelComponents(self):
+
+        s3db = current.s3db
+
+        info("")
+        get_components = s3db.get_components
+
+        # Warm up (loads all component models)
+        get_components("pr_person")
+
+        def compile_components():
+            s3db.clear_component_index()
+            return get_components("pr_person")
+
+        number = 100
+        x = compile_components
+        mlt = timeit.Timer(x).timeit(number=number) / number * 1000
+        info("S3Model.get_components(pr_person, compile) = %s ms" % mlt)
+
+        x = lambda: get_components("pr_person")
+        mlt_ = timeit.Timer(x).timeit(number=number) / number * 1000
+        info("S3Model.get_components(pr_person, compiled) = %s ms" % mlt_)
+        self.assertTrue(mlt_ < mlt)
+
+    def testS3HierarchyClosure(self):
+
+        db = current.db
+        s3db = current.s3db
+
+        info("")
+        current.auth.override = True
+
+        tablename = "bench_hierarchy"
+        table = s3db.define_table(tablename,
+                                  Field("name"),
+                                  Field("parent", "reference %s" % tablename),
+                                  *s3_meta_fields())
+        try:
+            # Build a tree with 50k nodes (10 roots, 10 children per node)
+            parents = [None]
+            number = 0
+            while number < 50000:
+                items = []
+                for i in range(min(len(parents) * 10, 50000 - number)):
+                    items.append({"name": "Node %s" % (number + i),
+                                  "parent": parents[i // 10],
+                                  })
+                parents = table.bulk_insert(items)
+                number += len(items)
+            db.commit()
+
+            s3db.configure(tablename,
+                           hierarchy = "parent",
+                           hierarchy_closure = True,
+                           )
+            S3Hierarchy.dirty(tablename)
+            h = S3Hierarchy(tablename)
+            root = next(iter(h.roots))
+
+            def expand():
+                nodes = h.findall(root, inclusive=True)
+                return db(table.id.belongs(nodes)).count()
+
+            def subtree():
+                return db(h.subtree_query(table.id, root)).count()
+
+            self.assertEqual(expand(), subtree())
+
+            number = 10
+            mlt = timeit.Timer(expand).timeit(number=number) / number * 1000
+            info("S3Hierarchy subtree query, 50k nodes (belongs) = %s ms" % mlt)
+
+            mlt_ = timeit.Timer(subtree).timeit(number=number) / number * 1000
+            info("S3Hierarchy subtree query, 50k nodes (closure table) = %s ms" % mlt_)
+            self.assertTrue(mlt_ < mlt)
+
+        finally:
+            ctable = s3db.s3_hierarchy_closure
+            db(ctable.tablename == tablename).delete()
+            htable = s3db.s3_hierarchy
+            db(htable.tablename == tablename).delete()
+            current.model["hierarchies"].pop(tablename, None)
+            table.drop()
+            db.commit()
+
+            current.auth.override = False
+
     def testS3ResourceInit(self):
 
         info("")
@@ -172,6 +314,17 @@ class S3PerformanceTests(unittest.TestCase):
         self.assertTrue(mlt<10)
         current.auth.override = False
 
+    def testS3URLQueryParser(self):
+
+        info("")
+        expression = 'last_name like "User*" and ' \
+                     'not(contact.value like "*example.com" or first_name like "Norm*")'
+        parser = S3URLQueryParser()
+        x = lambda: parser.parse(expression)
+        mlt = timeit.Timer(x).timeit(number=1000)
+        info("S3URLQueryParser.parse = %s ms" % mlt)
+        self.assertTrue(mlt<1)
+
     def testS3ResourceImportExport(self):
 
         xmlstr = """
@@ -286,6 +439,150 @@ class S3PerformanceTests(unittest.TestCase):
 
         current.auth.override = False
 
+    def testS3ResourceImportCSV(self):
+        """ CSV import of prepop data, via XSLT vs via column mapping """
+
+        import csv
+        import os
+
+        request = current.request
+        settings = current.deployment_settings
+
+        meta_fields = s3_all_meta_field_names()
+
+        template = os.path.join(request.folder, "modules", "templates", "default")
+        formats = os.path.join(request.folder, "static", "formats", "s3csv")
+
+        # Prepop CSVs of the default template with column mappings
+        tasks = (("gis_projection", "base/gis_projection.csv", "gis/projection.xsl"),
+                 ("gis_marker", "gis_marker.csv", "gis/marker.xsl"),
+                 ("project_status", "project_status.csv", "project/status.xsl"),
+                 ("project_hazard", "project_hazard.csv", "project/hazard.xsl"),
+                 ("supply_person_item_status", "supply_person_item_status.csv",
+                  "supply/person_item_status.xsl"),
+                 )
+
+        def import_csv(tablename, filename, stylesheet):
+            resource = current.s3db.resource(tablename)
+            with open(os.path.join(template, filename), "rb") as source:
+                resource.import_xml(source,
+                                    format = "csv",
+                                    stylesheet = os.path.join(formats, stylesheet),
+                                    )
+            current.db.rollback()
+
+        def import_results(tablename, filename, stylesheet):
+            # Import a CSV file, return the number of imported records
+            # and the resulting values of all non-meta fields
+            resource = current.s3db.resource(tablename)
+            with open(os.path.join(template, filename), "rb") as source:
+                resource.import_xml(source,
+                                    format = "csv",
+                                    stylesheet = os.path.join(formats, stylesheet),
+                                    )
+            table = resource.table
+            fields = [table[fn] for fn in table.fields
+                      if fn != "id" and fn not in meta_fields]
+            rows = current.db(table.deleted == False).select(*fields)
+            values = sorted(tuple(bool(row[f]) if f.type == "upload" else str(row[f])
+                                  for f in fields)
+                            for row in rows)
+            current.db.rollback()
+            return resource.import_count, values
+
+        def csv_rows(filename):
+            with open(os.path.join(template, filename), "r") as source:
+                return len(list(csv.DictReader(source)))
+
+        current.auth.override = True
+        current.db.rollback()
+
+        csv_mappings = settings.base.get("csv_mappings")
+
+        info("")
+        try:
+            number = 10
+            results = {}
+            for mode in (False, True):
+                settings.base.csv_mappings = mode
+                x = lambda: [import_csv(*task) for task in tasks]
+                results[mode] = timeit.Timer(x).timeit(number=number) / number * 1000
+            info("S3Resource.import_xml(CSV, XSLT) = %s ms" % results[False])
+            info("S3Resource.import_xml(CSV, mapping) = %s ms" % results[True])
+
+            # Column mappings import the same records as the stylesheets
+            for task in tasks:
+                settings.base.csv_mappings = False
+                count, values = import_results(*task)
+                self.assertEqual(count, csv_rows(task[1]))
+                settings.base.csv_mappings = True
+                self.assertEqual(import_results(*task), (count, values))
+        finally:
+            if csv_mappings is None:
+                settings.base.pop("csv_mappings", None)
+            else:
+                settings.base.csv_mappings = csv_mappings
+            current.auth.override = False
+
+    def testS3ResourceImportBulk(self):
+        """ XML import of new records, one by one vs bulk commit """
+
+        db = current.db
+        s3db = current.s3db
+        settings = current.deployment_settings
+
+        tablename = "bench_import"
+        table = s3db.define_table(tablename,
+                                  Field("name"),
+                                  Field("number", "integer"),
+                                  *s3_meta_fields())
+        db.commit()
+
+        number = 2000
+        xmlstr = "<s3xml>%s</s3xml>" % "".join(
+                    """<resource name="%s">""" \
+                    """<data field="name">Record %s</data>""" \
+                    """<data field="number">%s</data>""" \
+                    """</resource>""" % (tablename, i, i) for i in range(number))
+
+        from lxml import etree
+        tree = etree.ElementTree(etree.fromstring(xmlstr))
+
+        current.auth.override = True
+        bulk_commit = settings.base.get("import_bulk_commit")
+
+        info("")
+        try:
+            results = {}
+            for mode in (False, True):
+                settings.base.import_bulk_commit = mode
+                resource = s3db.resource(tablename)
+                x = lambda: resource.import_xml(tree)
+                results[mode] = timeit.Timer(x).timeit(number=1)
+
+                # All records imported
+                rows = db(table.deleted == False).select(table.name,
+                                                         table.number,
+                                                         orderby = table.number,
+                                                         )
+                self.assertEqual(len(rows), number)
+                self.assertEqual(rows.first().name, "Record 0")
+                self.assertEqual(rows.last().number, number - 1)
+                db.rollback()
+
+            for mode, label in ((False, "one by one"), (True, "bulk commit")):
+                info("S3Resource.import_xml (%s) = %s rec/sec" % \
+                     (label, int(number / results[mode])))
+            self.assertTrue(results[True] < results[False])
+        finally:
+            if bulk_commit is None:
+                settings.base.pop("import_bulk_commit", None)
+            else:
+                settings.base.import_bulk_commit = bulk_commit
+            current.auth.override = False
+            table.drop()
+            db.commit()
+
 # =============================================================================
 if __name__ == "__main__":
 
@@ -1162,6 +1162,61 @@ class ACLManagementTests(unittest.TestCase):
                 del table[acl_id]
             auth.s3_delete_role(group_id)
 
+    # -------------------------------------------------------------------------
+    def testACLCache(self):
+        """ Test sharing of compiled ACLs in the process-wide cache """
+
+        auth = current.auth
+        settings = current.deployment_settings
+
+        settings.security.policy = 5
+        acl_cache = settings.get_auth_acl_cache()
+        settings.auth.acl_cache = 100
+        S3Permission._acl_cache = None
+
+        group_id = auth.s3_create_role("Test Role", uid="TEST")
+        try:
+            permission = auth.permission = S3Permission(auth)
+            READ, UPDATE = permission.READ, permission.UPDATE
+
+            permission.update_acl(group_id,
+                                  c="pr", f="person", uacl=READ, oacl=READ)
+
+            realms = Storage({group_id: None})
+            acls = permission.applicable_acls(READ,
+                                              realms = realms,
+                                              c = "pr",
+                                              f = "person",
+                                              )
+            self.assertEqual(acls["ANY"], (READ, READ))
+
+            # Second lookup (new request) uses the cache
+            cache = S3Permission.acl_cache()
+            hits = cache.hits
+            permission = auth.permission = S3Permission(auth)
+            acls = permission.applicable_acls(READ,
+                                              realms = realms,
+                                              c = "pr",
+                                              f = "person",
+                                              )
+            self.assertEqual(acls["ANY"], (READ, READ))
+            self.assertEqual(cache.hits, hits + 1)
+
+            # Updating the ACL invalidates the cache
+            permission.update_acl(group_id,
+                                  c="pr", f="person",
+                                  uacl=READ|UPDATE, oacl=READ|UPDATE)
+            acls = permission.applicable_acls(READ,
+                                              realms = realms,
+                                              c = "pr",
+                                              f = "person",
+                                              )
+            self.assertEqual(acls["ANY"], (READ|UPDATE, READ|UPDATE))
+        finally:
+            auth.s3_delete_role(group_id)
+            settings.auth.acl_cache = acl_cache
+            S3Permission._acl_cache = None
+
 # =============================================================================
 class HasPermissionTests(unittest.TestCase):
     """ Test permission check method """
@@ -2285,6 +2340,50 @@ class AccessibleQueryTests(unittest.TestCase):
         s3db.pr_remove_affiliation(self.org[0], self.org[1], role="TestOrgUnit")
         auth.s3_withdraw_role(auth.user.id, self.editor)
 
+    # -------------------------------------------------------------------------
+    def testSimplifyRealmQuery(self):
+        """ Test simplification of realm/ownership predicates """
+
+        auth = current.auth
+
+        current.deployment_settings.security.policy = 6
+        auth.permission = S3Permission(auth)
+        auth.permission.simplify = True
+
+        table = current.s3db.org_permission_test
+
+        user = Storage(id = 5,
+                       realms = Storage([(2, None),
+                                         (10, [4, 3]),
+                                         (11, [3, 4]),
+                                         (12, [5]),
+                                         ]),
+                       )
+
+        # Roles with identical realms are merged, realms covered
+        # by the caller (no_realm) are removed
+        query = auth.permission.owner_query(table,
+                                            user,
+                                            realm = [3],
+                                            no_realm = [3],
+                                            realm_public = True,
+                                            )
+        expected = (((table.owned_by_group.belongs([10, 11])) & \
+                   (table.realm_entity == 4)) | \
+                   ((table.owned_by_group == 12) & \
+                   (table.realm_entity == 5))) | \
+                   (table.owned_by_group == 2)
+        self.assertSameQuery(query, expected)
+
+        # Without realm_public, the individual owner and public
+        # records must still be included
+        query = auth.permission.owner_query(table,
+                                            user,
+                                            realm = [3],
+                                            no_realm = [3],
+                                            )
+        self.assertIn("owned_by_user", str(query))
+
     # -------------------------------------------------------------------------
     @classmethod
     def assertSameQuery(cls, l, r, msg=None):
@@ -3455,6 +3554,77 @@ class RealmEntityTests(unittest.TestCase):
         record = otable[self.org_id]
         assertEqual(record.realm_entity, None)
 
+    # -------------------------------------------------------------------------
+    def testSetRealmEntityBulk(self):
+        """ Test bulk update of the realm entity """
+
+        s3db = current.s3db
+        auth = current.auth
+        settings = current.deployment_settings
+
+        ftable = s3db.org_office
+        stable = s3db.org_site
+
+        assertEqual = self.assertEqual
+
+        # Add another office of the same organisation
+        office = Storage(organisation_id = self.org_id,
+                         name = "Ownership Test Office 2",
+                         )
+        office_id = ftable.insert(**office)
+        office.update(id=office_id)
+        s3db.update_super(ftable, office)
+
+        office_ids = (self.office_id, office_id)
+        query = (ftable.id.belongs(office_ids))
+        current.db(query).update(realm_entity = None)
+
+        organisation_pe_id = s3db.pr_get_pe_id("org_organisation", self.org_id)
+
+        progress = []
+        def report(done, total):
+            progress.append((done, total))
+
+        # Without callback, the realm is resolved once for both records
+        tname = "org_office"
+        shook = s3db.get_config(tname, "realm_entity")
+        s3db.clear_config(tname, "realm_entity")
+        try:
+            result = auth.set_realm_entity_bulk(ftable, query, progress=report)
+            assertEqual(result, 2)
+            assertEqual(progress, [(2, 2)])
+
+            rows = current.db(query).select(ftable.realm_entity,
+                                            ftable.site_id,
+                                            )
+            for row in rows:
+                assertEqual(row.realm_entity, organisation_pe_id)
+                site = stable[row.site_id]
+                assertEqual(site.realm_entity, organisation_pe_id)
+
+            # With callback, the realm is resolved per record
+            settings.auth.realm_entity = self.realm_entity
+            auth.set_realm_entity(ftable, query, force_update=True)
+            rows = current.db(query).select(ftable.realm_entity)
+            for row in rows:
+                assertEqual(row.realm_entity, 5)
+
+            # A set-safe table callback does not make the global
+            # callback set-safe, i.e. it still gets the full records
+            s3db.configure(tname, realm_entity_set_safe=True)
+            current.db(query).update(realm_entity = None)
+            self.owned_record = None
+            result = auth.set_realm_entity_bulk(ftable, query)
+            assertEqual(result, 2)
+            assertEqual(self.owned_record[1] in office_ids, True)
+            rows = current.db(query).select(ftable.realm_entity)
+            for row in rows:
+                assertEqual(row.realm_entity, 5)
+        finally:
+            s3db.clear_config(tname, "realm_entity_set_safe")
+            if shook is not None:
+                s3db.configure(tname, realm_entity=shook)
+
     # -------------------------------------------------------------------------
     def testUpdateSharedFields(self):
         """ Test that realm entity gets set in super-entity """
@@ -8,7 +8,7 @@
 import unittest
 from gluon.languages import lazyT
 
-from s3 import S3ResourceTree
+from s3 import S3LRUCache, S3ResourceTree
 from s3.s3fields import *
 from s3compat import basestring
 
@@ -170,6 +170,98 @@ class S3RepresentTests(unittest.TestCase):
         self.assertTrue(isinstance(result, lazyT))
         self.assertEqual(result, current.T(self.name1))
 
+    # -------------------------------------------------------------------------
+    def testSharedCache(self):
+        """ Test sharing of representations between instances """
+
+        assertEqual = self.assertEqual
+
+        class SharedRepresent(S3Represent):
+            shared = True
+
+        db = current.db
+        s3db = current.s3db
+
+        cache = S3Represent._cache
+        S3Represent._cache = S3LRUCache(maxsize=100)
+        try:
+            # First instance looks up the rows
+            r = SharedRepresent(lookup="org_organisation")
+            result = r.bulk([self.id1, self.id2])
+            assertEqual(result[self.id1], self.name1)
+            assertEqual(result[self.id2], self.name2)
+            assertEqual(r.queries, 1)
+
+            # Second instance gets the representations from the cache
+            r = SharedRepresent(lookup="org_organisation")
+            result = r.bulk([self.id1, self.id2])
+            assertEqual(result[self.id1], self.name1)
+            assertEqual(result[self.id2], self.name2)
+            assertEqual(r.queries, 0)
+            assertEqual(S3Represent.cache_stats()["hits"], 2)
+
+            # Different options must not share representations
+            r = SharedRepresent(lookup="org_organisation", translate=True)
+            r.bulk([self.id1])
+            assertEqual(r.queries, 1)
+
+            # Change the record, run the onaccept of the model
+            otable = s3db.org_organisation
+            db(otable.id == self.id1).update(name="Renamed Organisation")
+            s3db.onaccept(otable, {"id": self.id1}, method="update")
+
+            # Representations are invalidated
+            r = SharedRepresent(lookup="org_organisation")
+            result = r.bulk([self.id1, self.id2])
+            assertEqual(result[self.id1], "Renamed Organisation")
+            assertEqual(r.queries, 1)
+
+            # Changes in other tables the representations depend on
+            # invalidate them too
+            ntable = s3db.org_organisation_name
+            s3db.onaccept(ntable, {"id": 0}, method="create")
+            r = SharedRepresent(lookup="org_organisation")
+            r.bulk([self.id1, self.id2])
+            assertEqual(r.queries, 1)
+
+            # Invalidator for other lookup tables leaves them untouched
+            invalidate = S3Represent.invalidator("org_site")
+            invalidate(Storage(vars=Storage(id=0)))
+            r = SharedRepresent(lookup="org_organisation")
+            r.bulk([self.id1, self.id2])
+            assertEqual(r.queries, 0)
+        finally:
+            S3Represent._cache = cache
+
+    # -------------------------------------------------------------------------
+    def testLazyBatching(self):
+        """ Test request-wide batching of lazy representations """
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+
+        current.response.s3.represent_pending = None
+
+        r1 = S3Represent(lookup="org_organisation")
+        r2 = S3Represent(lookup="org_organisation", labels="Org: %(name)s")
+
+        lazy1 = S3RepresentLazy(self.id1, r1)
+        lazy2 = S3RepresentLazy(self.id2, r2)
+
+        # Both renderers are registered for the lookup table
+        pending = current.response.s3.represent_pending
+        assertEqual(pending["org_organisation"], [r1, r2])
+
+        # Rendering the first value resolves both renderers
+        assertEqual(lazy1.represent(), self.name1)
+        assertTrue(self.id2 in r2.theset)
+        assertEqual(lazy2.represent(), "Org: %s" % self.name2)
+
+        # No renderer needed an extra query of its own
+        assertEqual(r1.queries, 0)
+        assertEqual(r2.queries, 0)
+
+    # -------------------------------------------------------------------------
     def testRowsPrecedence(self):
 
         # Check that rows get preferred over values
@@ -376,6 +376,105 @@ class S3HierarchyTests(unittest.TestCase):
             # Cleanup
             db(table.uuid.like("HIERARCHY1-4%")).delete()
 
+    # -------------------------------------------------------------------------
+    def testChangeDetection(self):
+        """ Test detection of changes in the table of a stored hierarchy """
+
+        db = current.db
+        hierarchies = current.model["hierarchies"]
+
+        assertTrue = self.assertTrue
+        assertFalse = self.assertFalse
+        assertEqual = self.assertEqual
+
+        uids = self.uids
+        node_id = uids["HIERARCHY2-1-2"]
+        old_parent = uids["HIERARCHY2-1"]
+        new_parent = uids["HIERARCHY1-1"]
+
+        table = db.test_hierarchy
+        try:
+            # Rebuild and store the hierarchy
+            h = S3Hierarchy("test_hierarchy")
+            h.dirty("test_hierarchy")
+            assertEqual(h.parent(node_id), old_parent)
+
+            htable = current.s3db.s3_hierarchy
+            query = (htable.tablename == "test_hierarchy")
+            def stored_parent():
+                row = db(query).select(htable.hierarchy,
+                                       limitby = (0, 1),
+                                       ).first()
+                return row.hierarchy["nodes"][str(node_id)]["p"]
+            assertEqual(stored_parent(), old_parent)
+
+            # Move the node to another parent, bypassing S3Hierarchy
+            db(table.id == node_id).update(parent=new_parent)
+
+            # Load the stored hierarchy
+            hierarchies.pop("test_hierarchy", None)
+            h = S3Hierarchy("test_hierarchy")
+
+            # Verify that the change has been detected
+            assertEqual(h.parent(node_id), new_parent)
+            assertTrue(node_id in h.children(new_parent))
+            assertFalse(node_id in h.children(old_parent))
+
+            # Verify that the rebuilt hierarchy has been stored
+            assertEqual(stored_parent(), new_parent)
+
+        finally:
+            # Cleanup
+            db(table.id == node_id).update(parent=old_parent)
+            hierarchies.pop("test_hierarchy", None)
+            S3Hierarchy.dirty("test_hierarchy")
+
+    # -------------------------------------------------------------------------
+    def testSubtreeQuery(self):
+        """ Test subtree query using the closure table """
+
+        db = current.db
+        s3db = current.s3db
+
+        assertTrue = self.assertTrue
+        assertEqual = self.assertEqual
+
+        uids = self.uids
+        ctable = s3db.s3_hierarchy_closure
+
+        s3db.configure("test_hierarchy", hierarchy_closure=True)
+        try:
+            # Rebuild the hierarchy and the closure table
+            h = S3Hierarchy("test_hierarchy")
+            h.dirty("test_hierarchy")
+            nodes = h.findall(uids["HIERARCHY1"], inclusive=True)
+
+            # One row per node and ancestor
+            query = (ctable.tablename == "test_hierarchy")
+            rows = db(query).select(ctable.ancestor, ctable.descendant)
+            pairs = {(row.ancestor, row.descendant) for row in rows}
+            for node_id in h.theset:
+                for ancestor in h.path(node_id):
+                    assertTrue((ancestor, node_id) in pairs)
+
+            # Subtree query matches the same nodes as findall
+            table = db.test_hierarchy
+            query = h.subtree_query(table.id, uids["HIERARCHY1"])
+            assertTrue(query is not None)
+            rows = db(query).select(table.id)
+            assertEqual({row.id for row in rows}, nodes)
+
+            # TYPEOF-query uses the closure table
+            resource = s3db.resource("test_hierarchy",
+                                     filter = FS("id").typeof(uids["HIERARCHY1"]),
+                                     )
+            rows = resource.select(["id"], as_rows=True)
+            assertEqual({row.id for row in rows}, nodes)
+
+        finally:
+            s3db.configure("test_hierarchy", hierarchy_closure=False)
+            S3Hierarchy.dirty("test_hierarchy")
+
     # -------------------------------------------------------------------------
     def testCategory(self):
         """ Test node category lookup """
@@ -14,7 +14,7 @@ from gluon.storage import Storage
 from lxml import etree
 
 from s3 import S3Duplicate, S3ImportItem, S3ImportJob, s3_meta_fields
-from s3.s3import import S3ObjectReferences
+from s3.s3import import S3ImportBulkCommit, S3ObjectReferences
 
 from unit_tests import run_suite
 
@@ -1182,6 +1182,272 @@ class UIDCollisionHandlingTests(unittest.TestCase):
             assertEqual(row.type1_id, type1_id)
             assertEqual(row.type2_id, type2_id)
 
+# =============================================================================
+class BulkCommitTests(unittest.TestCase):
+    """ Tests for the bulk commit mode of import jobs """
+
+    @classmethod
+    def setUpClass(cls):
+
+        db = current.db
+
+        # Define test tables
+        db.define_table("bulk_test_type",
+                        Field("name"),
+                        *s3_meta_fields())
+
+        db.define_table("bulk_test",
+                        Field("name"),
+                        Field("type_id", "reference bulk_test_type"),
+                        *s3_meta_fields())
+
+        db.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+
+        db = current.db
+        db.bulk_test.drop()
+        db.bulk_test_type.drop()
+        db.commit()
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        settings = current.deployment_settings
+        self.bulk_commit = settings.base.get("import_bulk_commit")
+        settings.base.import_bulk_commit = True
+
+        # Record the bulk onaccept calls
+        calls = self.calls = []
+        def onaccept(forms):
+            calls.append(len(forms))
+
+        s3db = current.s3db
+        s3db.configure("bulk_test_type",
+                       deduplicate = S3Duplicate(),
+                       )
+        s3db.configure("bulk_test",
+                       deduplicate = S3Duplicate(),
+                       bulk_onaccept = onaccept,
+                       )
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.db.rollback()
+        current.auth.override = False
+
+        settings = current.deployment_settings
+        if self.bulk_commit is None:
+            settings.base.pop("import_bulk_commit", None)
+        else:
+            settings.base.import_bulk_commit = self.bulk_commit
+
+        s3db = current.s3db
+        s3db.clear_config("bulk_test_type")
+        s3db.clear_config("bulk_test")
+
+    # -------------------------------------------------------------------------
+    def testLevels(self):
+        """ Test grouping of import items into levels """
+
+        xmlstr = """
+<s3xml>
+    <resource name="bulk_test">
+        <data field="name">Level1</data>
+        <reference field="type_id" resource="bulk_test_type" tuid="LT1"/>
+    </resource>
+    <resource name="bulk_test">
+        <data field="name">Level0</data>
+    </resource>
+    <resource name="bulk_test_type" tuid="LT1">
+        <data field="name">LevelType1</data>
+    </resource>
+</s3xml>"""
+
+        tree = etree.ElementTree(etree.fromstring(xmlstr))
+
+        job = S3ImportJob(current.db.bulk_test, tree=tree)
+        for element in tree.getroot():
+            if element.get("name") == "bulk_test":
+                job.add_item(element=element)
+
+        import_list = []
+        for item_id in job.items:
+            job.resolve(item_id, import_list)
+            if item_id not in import_list:
+                import_list.append(item_id)
+
+        levels = job.levels(import_list)
+        names = [sorted(job.items[item_id].data.name for item_id in level)
+                 for level in levels]
+        self.assertEqual(names, [["Level0", "LevelType1"], ["Level1"]])
+
+    # -------------------------------------------------------------------------
+    def testBulkCommit(self):
+        """ Test bulk commit of new records with references and duplicates """
+
+        assertEqual = self.assertEqual
+
+        xmlstr = """
+<s3xml>
+    <resource name="bulk_test">
+        <data field="name">Bulk1</data>
+        <reference field="type_id" resource="bulk_test_type" tuid="T1"/>
+    </resource>
+    <resource name="bulk_test">
+        <data field="name">Bulk2</data>
+        <reference field="type_id" resource="bulk_test_type" tuid="T1"/>
+    </resource>
+    <resource name="bulk_test">
+        <data field="name">Bulk3</data>
+        <reference field="type_id" resource="bulk_test_type" tuid="T2"/>
+    </resource>
+    <resource name="bulk_test">
+        <data field="name">bulk3</data>
+        <reference field="type_id" resource="bulk_test_type" tuid="T2"/>
+    </resource>
+    <resource name="bulk_test">
+        <data field="name">bulk1</data>
+    </resource>
+    <resource name="bulk_test_type" tuid="T1">
+        <data field="name">BulkType1</data>
+    </resource>
+    <resource name="bulk_test_type" tuid="T2">
+        <data field="name">BulkType2</data>
+    </resource>
+</s3xml>"""
+
+        db = current.db
+        s3db = current.s3db
+
+        tree = etree.ElementTree(etree.fromstring(xmlstr))
+        resource = s3db.resource("bulk_test")
+        resource.import_xml(tree)
+        assertEqual(resource.error, None)
+
+        # Referenced records are created in the first level, together
+        # with the unreferenced record; the records referencing them are
+        # created in the second level, whereby the (case-insensitive)
+        # duplicate of a pending record causes the pending records to
+        # be created first, so that it is detected as update
+        assertEqual(self.calls, [1, 2])
+        assertEqual(len(resource.import_created), 3)
+        assertEqual(len(resource.import_updated), 2)
+
+        ttable = db.bulk_test_type
+        types = db(ttable.deleted == False).select(ttable.id,
+                                                   ttable.name,
+                                                   ).as_dict(key="name")
+        assertEqual(set(types.keys()), {"BulkType1", "BulkType2"})
+
+        table = db.bulk_test
+        rows = db(table.deleted == False).select(table.name,
+                                                 table.type_id,
+                                                 orderby = table.id,
+                                                 )
+        assertEqual([row.name for row in rows], ["Bulk1", "Bulk2", "bulk3"])
+        assertEqual([row.type_id for row in rows],
+                    [types["BulkType1"]["id"],
+                     types["BulkType1"]["id"],
+                     types["BulkType2"]["id"],
+                     ])
+
+    # -------------------------------------------------------------------------
+    def testBulkCommitValidation(self):
+        """ Test that validation sees records created earlier in the same batch """
+
+        assertEqual = self.assertEqual
+
+        db = current.db
+        s3db = current.s3db
+
+        table = db.bulk_test
+
+        # Uniqueness check in onvalidation
+        def onvalidation(form):
+            query = (table.name == form.vars.get("name")) & \
+                    (table.deleted == False)
+            if db(query).select(table.id, limitby=(0, 1)).first():
+                form.errors["name"] = "Duplicate name"
+
+        s3db.clear_config("bulk_test", "deduplicate")
+        s3db.configure("bulk_test", onvalidation=onvalidation)
+
+        xmlstr = """
+<s3xml>
+    <resource name="bulk_test">
+        <data field="name">SameName</data>
+    </resource>
+    <resource name="bulk_test">
+        <data field="name">SameName</data>
+    </resource>
+    <resource name="bulk_test">
+        <data field="name">OtherName</data>
+    </resource>
+</s3xml>"""
+
+        tree = etree.ElementTree(etree.fromstring(xmlstr))
+        resource = s3db.resource("bulk_test")
+        resource.import_xml(tree, ignore_errors=True)
+
+        # Second record rejected, records created one by one
+        self.assertNotEqual(resource.error, None)
+        assertEqual(len(resource.import_created), 2)
+        assertEqual(self.calls, [1, 1])
+
+        rows = db(table.deleted == False).select(table.name,
+                                                 orderby = table.id,
+                                                 )
+        assertEqual([row.name for row in rows], ["SameName", "OtherName"])
+
+    # -------------------------------------------------------------------------
+    def testBulkInsert(self):
+        """ Test multi-row insert with matching of the new record IDs """
+
+        assertEqual = self.assertEqual
+
+        db = current.db
+        table = db.bulk_test
+
+        items = [{"name": "BulkInsert%s" % i} for i in range(7)]
+        items.append({"name": "BulkInsertNoUUID", "uuid": None})
+
+        record_ids = S3ImportBulkCommit.bulk_insert(table, items, chunk_size=3)
+        assertEqual(len(record_ids), len(items))
+
+        rows = db(table.id.belongs(record_ids)).select(table.id, table.name)
+        names = dict((row.id, row.name) for row in rows)
+        assertEqual([names.get(record_id) for record_id in record_ids],
+                    [item["name"] for item in items])
+
+    # -------------------------------------------------------------------------
+    def testNotInDB(self):
+        """ Test detection of IS_NOT_IN_DB validators """
+
+        db = current.db
+        field = db.bulk_test.name
+
+        not_in_db = S3ImportBulkCommit.not_in_db
+
+        requires = field.requires
+        try:
+            field.requires = None
+            self.assertFalse(not_in_db(field))
+
+            field.requires = IS_NOT_IN_DB(db, "bulk_test.name")
+            self.assertTrue(not_in_db(field))
+
+            field.requires = [IS_NOT_EMPTY(),
+                              IS_EMPTY_OR(IS_NOT_IN_DB(db, "bulk_test.name")),
+                              ]
+            self.assertTrue(not_in_db(field))
+        finally:
+            field.requires = requires
+
 # =============================================================================
 if __name__ == "__main__":
 
@@ -1196,6 +1462,7 @@ if __name__ == "__main__":
         ObjectReferencesTests,
         ObjectReferencesImportTests,
         UIDCollisionHandlingTests,
+        BulkCommitTests,
         )
 
 # END ========================================================================
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# S3IndexAdvisor Unit Tests
+#
+# To run this script use:
+# python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3indexes.py
+#
+import unittest
+
+from s3.s3indexes import S3IndexAdvisor
+
+from unit_tests import run_suite
+
+# =============================================================================
+class S3IndexAdvisorTests(unittest.TestCase):
+    """ Tests for the slow-query log and index advisor """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        S3IndexAdvisor.clear()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        S3IndexAdvisor.clear()
+
+    # -------------------------------------------------------------------------
+    def testShape(self):
+        """ Test normalization of SQL statements """
+
+        shape = S3IndexAdvisor.shape
+
+        sql = "SELECT org_office.id FROM org_office " \
+              "WHERE ((org_office.realm_entity IN (3,4,5)) AND " \
+              "(org_office.name = 'Test''s Office'));"
+        self.assertEqual(shape(sql),
+                         "SELECT org_office.id FROM org_office "
+                         "WHERE ((org_office.realm_entity IN (?)) AND "
+                         "(org_office.name = ?))")
+
+        # Same shape for different literals
+        other = sql.replace("(3,4,5)", "(7)").replace("Test''s", "Other")
+        self.assertEqual(shape(other), shape(sql))
+
+    # -------------------------------------------------------------------------
+    def testColumns(self):
+        """ Test detection of filter and join columns """
+
+        sql = 'SELECT "org_office"."id" FROM "org_office" ' \
+              'LEFT JOIN "org_organisation" AS "org_organisation_branch" ' \
+              'ON ("org_organisation_branch"."id" = "org_office"."organisation_id") ' \
+              'WHERE (("org_office"."deleted" = ?) AND ' \
+              '("org_office"."modified_on" > ?));'
+
+        columns = S3IndexAdvisor.columns(S3IndexAdvisor.shape(sql))
+        self.assertEqual(columns, {("org_organisation", "id"),
+                                   ("org_office", "organisation_id"),
+                                   ("org_office", "deleted"),
+                                   ("org_office", "modified_on"),
+                                   })
+
+    # -------------------------------------------------------------------------
+    def testReport(self):
+        """ Test aggregation of index candidates and migration scripts """
+
+        assertEqual = self.assertEqual
+        assertIn = self.assertIn
+
+        sql = "SELECT org_office.id FROM org_office " \
+              "WHERE ((org_office.realm_entity = %s) AND " \
+              "(org_office.deleted = 'F'));"
+
+        record = S3IndexAdvisor.record
+        record(sql % 3, 1.5, origin="org_office")
+        record(sql % 4, 0.5, origin="org_office")
+        record("INSERT INTO org_office (name) VALUES ('Test');", 2.0)
+
+        # Ignore any existing indexes in the test database
+        class Advisor(S3IndexAdvisor):
+            existing_indexes = staticmethod(lambda db: set())
+
+        candidates = Advisor.report()
+        candidates = dict((c["field"], c) for c in candidates
+                          if c["table"] == "org_office")
+
+        # Queries with the same shape are aggregated, the primary
+        # key and non-query statements are ignored
+        assertIn("realm_entity", candidates)
+        candidate = candidates["realm_entity"]
+        assertEqual(candidate["type"], "realm")
+        assertEqual(candidate["queries"], 1)
+        assertEqual(candidate["count"], 2)
+        assertEqual(candidate["time"], 2.0)
+        assertEqual(candidate["origins"], ["org_office"])
+        self.assertNotIn("id", candidates)
+
+        assertEqual(candidates["deleted"]["type"], "deleted")
+
+        # Migration scripts per backend
+        script = Advisor.script("postgres")
+        assertIn("CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+                 "org_office_realm_entity_idx ON org_office (realm_entity);",
+                 script)
+        script = Advisor.script("mysql")
+        assertIn("CREATE INDEX org_office_realm_entity_idx "
+                 "ON org_office (realm_entity);",
+                 script)
+        with self.assertRaises(ValueError):
+            Advisor.script("oracle")
+
+# =============================================================================
+if __name__ == "__main__":
+
+    run_suite(
+        S3IndexAdvisorTests,
+    )
+
+# END ========================================================================
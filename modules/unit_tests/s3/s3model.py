@@ -6,6 +6,7 @@
 # python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3model.py
 #
 import datetime
+import os
 import unittest
 
 from gluon import current, IS_EMPTY_OR, IS_FLOAT_IN_RANGE, IS_INT_IN_RANGE, IS_IN_SET, IS_NOT_EMPTY
@@ -13,7 +14,7 @@ from gluon.languages import lazyT
 from gluon.storage import Storage
 
 from s3.s3fields import s3_meta_fields
-from s3.s3model import DYNAMIC_PREFIX, S3DynamicModel
+from s3.s3model import DYNAMIC_PREFIX, S3DynamicModel, S3Model
 from s3.s3validators import IS_NOT_ONE_OF, IS_ONE_OF, IS_UTC_DATE, IS_UTC_DATETIME
 
 from unit_tests import run_suite
@@ -23,6 +24,132 @@ class S3ModelTests(unittest.TestCase):
 
     pass
 
+# =============================================================================
+class S3ModelManifestTests(unittest.TestCase):
+    """ Tests for model loading by manifest """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.manifest = S3Model._manifest
+        S3Model._manifest = {"names": {"org_organisation": ["org", "OrganisationModel"],
+                                       "org_nonexistent": ["org", "NonexistentModel"],
+                                       },
+                             "components": {},
+                             }
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        S3Model._manifest = self.manifest
+
+    # -------------------------------------------------------------------------
+    def testLoadFromManifest(self):
+        """ Test loading of model classes by manifest entries """
+
+        assertTrue = self.assertTrue
+        assertFalse = self.assertFalse
+
+        load = S3Model.load_from_manifest
+
+        # Known model class
+        assertTrue(load("org_organisation"))
+        assertTrue(hasattr(current.db, "org_organisation"))
+
+        # Unknown model class
+        assertFalse(load("org_nonexistent"))
+
+        # Name not in manifest
+        assertFalse(load("org_undefined"))
+
+        # Without manifest
+        S3Model._manifest = False
+        assertFalse(load("org_organisation"))
+
+    # -------------------------------------------------------------------------
+    def testManifestSignature(self):
+        """ Test that changes of the template config invalidate the manifest """
+
+        settings = current.deployment_settings
+
+        module = current.models.__dict__["org"]
+        mtimes = {"org": [module.__file__, os.path.getmtime(module.__file__)]}
+
+        signature = S3Model._S3Model__manifest_signature
+
+        template = settings.get_template()
+        if isinstance(template, (list, tuple)):
+            template = template[-1]
+        path = os.path.join(current.request.folder,
+                            "modules", "templates", *template.split("."))
+        path = os.path.join(path, "config.py")
+
+        stat = os.stat(path)
+        before = signature(mtimes)
+        try:
+            os.utime(path, (stat.st_atime, stat.st_mtime - 10))
+            self.assertNotEqual(signature(mtimes), before)
+        finally:
+            os.utime(path, (stat.st_atime, stat.st_mtime))
+        self.assertEqual(signature(mtimes), before)
+
+# =============================================================================
+class S3ComponentIndexTests(unittest.TestCase):
+    """ Tests for the compiled component hooks """
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        hooks = current.model["components"].get("org_organisation")
+        if hooks:
+            hooks.pop("index_test", None)
+
+    # -------------------------------------------------------------------------
+    def testComponentIndex(self):
+        """ Test compilation and invalidation of component hooks """
+
+        assertEqual = self.assertEqual
+        assertIn = self.assertIn
+        assertNotIn = self.assertNotIn
+        assertTrue = self.assertTrue
+
+        s3db = current.s3db
+
+        # Hooks are compiled once
+        index = s3db.component_index("org_organisation")
+        assertTrue(s3db.component_index("org_organisation") is index)
+        assertNotIn("index_test", index["hooks"])
+
+        # Component descriptions are parsed once, but returned as copies
+        components = s3db.get_components("org_organisation", names=["office"])
+        component = components["office"]
+        assertEqual(component.tablename, "org_office")
+        component.tablename = "changed"
+        component = s3db.get_component("org_organisation", "office")
+        assertEqual(component.tablename, "org_office")
+
+        # Super-components are included, with the super-table
+        table, hooks = s3db.get_hooks("org_organisation", names="contact")
+        assertIn("contact", hooks)
+        assertEqual(hooks["contact"].supertable._tablename, "pr_pentity")
+
+        # Adding components invalidates the index
+        s3db.add_components("org_organisation",
+                            org_office = {"name": "index_test",
+                                          "joinby": "organisation_id",
+                                          },
+                            )
+        index = s3db.component_index("org_organisation")
+        assertIn("index_test", index["hooks"])
+        component = s3db.get_component("org_organisation", "index_test")
+        assertEqual(component.tablename, "org_office")
+
+        # Removing hooks (without add_components) is detected, too
+        del current.model["components"]["org_organisation"]["index_test"]
+        index = s3db.component_index("org_organisation")
+        assertNotIn("index_test", index["hooks"])
+        assertEqual(s3db.get_component("org_organisation", "index_test"), None)
+
 # =============================================================================
 class S3SuperEntityTests(unittest.TestCase):
 
@@ -1092,6 +1219,8 @@ if __name__ == "__main__":
 
     run_suite(
         #S3ModelTests,
+        S3ModelManifestTests,
+        S3ComponentIndexTests,
         S3SuperEntityTests,
         S3DynamicModelTests,
         S3DynamicComponentTests,
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# S3RequestProfiler Unit Tests
+#
+# To run this script use:
+# python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3profiler.py
+#
+import unittest
+
+from gluon import current
+
+from s3.s3profiler import S3RequestProfiler, s3_profile, s3_profiled
+
+from unit_tests import run_suite
+
+# =============================================================================
+class S3RequestProfilerTests(unittest.TestCase):
+    """ Tests for the sampling request profiler """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        s3 = current.response.s3
+        self.profiler = s3.profiler
+        s3.profiler = None
+
+        S3RequestProfiler.clear()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.response.s3.profiler = self.profiler
+
+        S3RequestProfiler.clear()
+
+    # -------------------------------------------------------------------------
+    def testInactive(self):
+        """ Test that phases are ignored when the request is not profiled """
+
+        assertEqual = self.assertEqual
+
+        @s3_profiled("test")
+        def function(x):
+            return x * 2
+
+        assertEqual(S3RequestProfiler.active(), None)
+        assertEqual(function(2), 4)
+        with s3_profile("test") as profiler:
+            assertEqual(profiler, None)
+
+    # -------------------------------------------------------------------------
+    def testPhases(self):
+        """ Test attribution of phases and queries """
+
+        assertEqual = self.assertEqual
+        assertIn = self.assertIn
+        assertNotIn = self.assertNotIn
+
+        db = current.db
+
+        profiler = S3RequestProfiler()
+        profiler.instrument(db)
+        current.response.s3.profiler = profiler
+
+        @s3_profiled("model")
+        def model():
+            db(db.auth_user.id > 0).count()
+            with s3_profile("acl"):
+                db(db.auth_group.id > 0).count()
+                db(db.auth_group.id > 0).count()
+            S3RequestProfiler.count("components", 2)
+
+        try:
+            model()
+        finally:
+            profiler.finish()
+
+        # Queries are attributed to the innermost phase
+        summary = profiler.summary()
+        phases = summary["phases"]
+        assertEqual(summary["queries"], 3)
+        assertEqual(phases["model"]["queries"], 1)
+        assertEqual(phases["acl"]["queries"], 2)
+        assertEqual(summary["counters"], {"components": 2})
+
+        # The adapter has been restored
+        assertNotIn("execute", db._adapter.__dict__)
+
+        # The sample has been added to the store
+        statistics = S3RequestProfiler.statistics()
+        assertIn(profiler.key, statistics)
+
+        stats = statistics[profiler.key]
+        assertEqual(stats["requests"], 1)
+        assertEqual(stats["queries"], 3)
+        assertEqual(stats["phases"]["acl"]["queries"], 2)
+        assertEqual(stats["counters"]["components"], 2)
+
+        # Finishing again doesn't add another sample
+        profiler.finish()
+        stats = S3RequestProfiler.statistics()[profiler.key]
+        assertEqual(stats["requests"], 1)
+
+# =============================================================================
+if __name__ == "__main__":
+
+    run_suite(
+        S3RequestProfilerTests,
+    )
+
+# END ========================================================================
@@ -16,13 +16,6 @@ from gluon.storage import Storage
 
 from s3 import *
 
-try:
-    import pyparsing
-except ImportError:
-    PYPARSING = False
-else:
-    PYPARSING = True
-
 from unit_tests import run_suite
 
 # =============================================================================
@@ -1086,6 +1079,53 @@ class ResourceFilterQueryTests(unittest.TestCase):
         row.test = ""
         assertFalse(query(resource, row))
 
+    # -------------------------------------------------------------------------
+    def testSemiJoinFilterConstruction(self):
+        """ Test filters for multi-valued components as semi-joins """
+
+        s3db = current.s3db
+        settings = current.deployment_settings
+
+        assertEqual = self.assertEqual
+        assertFalse = self.assertFalse
+        assertIn = self.assertIn
+
+        q = (FS("first_name") != None) & \
+            (FS("contact.value") != None) & \
+            (FS("contact.contact_method") == "EMAIL") & \
+            (FS("identity.value") != None)
+
+        semijoin_filters = settings.base.get("semijoin_filters")
+        try:
+            settings.base.semijoin_filters = False
+            resource = s3db.resource("pr_person", filter=q)
+            expected_ids = set(resource.select(["id"], as_rows=True).column("id"))
+            expected_count = resource.count()
+
+            settings.base.semijoin_filters = True
+            resource = s3db.resource("pr_person", filter=q)
+            rfilter = resource.rfilter
+            query = rfilter.get_query()
+
+            # Contact filters in the same sub-select, identity in another
+            assertEqual(len(rfilter.sfltr), 2)
+            assertEqual(set(rfilter.stables), {"pr_contact", "pr_identity"})
+            assertEqual(str(query).count("SELECT"), 2)
+            assertIn("pr_person.first_name", str(query))
+
+            # No component joins or DISTINCT in the master query
+            assertEqual(rfilter.get_joins(left=True), [])
+            assertEqual(rfilter.get_joins(), [])
+            assertFalse(rfilter.distinct)
+
+            # Same results
+            ids = set(resource.select(["id"], as_rows=True).column("id"))
+            assertEqual(ids, expected_ids)
+            assertEqual(resource.count(), expected_count)
+
+        finally:
+            settings.base.semijoin_filters = semijoin_filters
+
 # =============================================================================
 class ResourceContextFilterTests(unittest.TestCase):
     """ Test global context filter """
@@ -2299,6 +2339,74 @@ class URLQueryTests(unittest.TestCase):
                      (org_service.name.lower().like("test%"))))
         assertEqual(str(query), str(expected))
 
+    # -------------------------------------------------------------------------
+    def testParseURLQueryCache(self):
+        """ Test caching of parsed URL queries """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+        assertIsNot = self.assertIsNot
+
+        S3URLQuery.clear_cache()
+        cache = S3URLQuery.cache()
+        if cache is None:
+            self.skipTest("filter cache disabled")
+
+        url_query = {"facility.organisation_id$name__like": "Test*",
+                     "$filter": "~.name eq \"Test\"",
+                     "_other": "1",
+                     }
+
+        resource = s3db.resource("org_facility")
+
+        stats = cache.stats()
+        hits, misses = stats["hits"], stats["misses"]
+
+        # First parse => miss
+        first = S3URLQuery.parse(resource, url_query)
+        stats = cache.stats()
+        assertEqual(stats["misses"], misses + 1)
+        assertEqual(stats["hits"], hits)
+
+        # Same filters (non-filter vars differ) => hit
+        url_query["_other"] = "2"
+        second = S3URLQuery.parse(resource, url_query)
+        stats = cache.stats()
+        assertEqual(stats["misses"], misses + 1)
+        assertEqual(stats["hits"], hits + 1)
+
+        # Cached results are equivalent, but not shared with the first
+        # parse result (copied once when storing)
+        assertEqual(list(first.keys()), list(second.keys()))
+        for alias in first:
+            assertEqual([q.serialize_url(resource) for q in first[alias]],
+                         [q.serialize_url(resource) for q in second[alias]])
+            for q1, q2 in zip(first[alias], second[alias]):
+                assertIsNot(q1, q2)
+
+        # Subsequent hits share the cached queries, but not the lists
+        third = S3URLQuery.parse(resource, url_query)
+        for alias in second:
+            assertIsNot(second[alias], third[alias])
+            for q2, q3 in zip(second[alias], third[alias]):
+                self.assertIs(q2, q3)
+
+        # Queries work the same with or without cache
+        resource = s3db.resource("org_facility", vars=url_query)
+        query = resource.rfilter.get_query()
+        S3URLQuery.clear_cache()
+        resource = s3db.resource("org_facility", vars=url_query)
+        assertEqual(str(resource.rfilter.get_query()), str(query))
+
+        # Clear the cache for a table
+        S3URLQuery.parse(resource, url_query)
+        assertEqual(len(cache), 1)
+        S3URLQuery.clear_cache("org_office")
+        assertEqual(len(cache), 1)
+        S3URLQuery.clear_cache("org_facility")
+        assertEqual(len(cache), 0)
+
     # -------------------------------------------------------------------------
     def testBBOXFilterDirectLink(self):
         """ Test URL query with BBOX filter, location_id """
@@ -2488,12 +2596,7 @@ class URLQueryParserTests(unittest.TestCase):
         """ Test parser instantiation """
 
         p = S3URLQueryParser()
-
-        if PYPARSING:
-            self.assertNotEqual(p.parser, None)
-        else:
-            self.assertEqual(p.parser, None,
-                             msg = "Unexpected Parser Instance")
+        self.assertNotEqual(p.parser, None)
 
     # -------------------------------------------------------------------------
     def testParser(self):
@@ -2523,11 +2626,8 @@ class URLQueryParserTests(unittest.TestCase):
             log_messages = log_recorder.read()
 
             assertTrue(isinstance(q, dict))
-            if PYPARSING:
-                assertTrue(None in q)
-                assertNotIn("Invalid URL Filter Expression", log_messages)
-            else:
-                assertEqual(q, {})
+            assertTrue(None in q)
+            assertNotIn("Invalid URL Filter Expression", log_messages)
 
             # Test with invalid expression
             # => should succeed, but not return any query
@@ -2538,8 +2638,7 @@ class URLQueryParserTests(unittest.TestCase):
             log_messages = log_recorder.read()
 
             assertEqual(q, {})
-            if PYPARSING:
-                assertIn("Invalid URL Filter Expression", log_messages)
+            assertIn("Invalid URL Filter Expression", log_messages)
 
             # Test with empty expression
             # => should succeed, but not return any query
@@ -2550,8 +2649,7 @@ class URLQueryParserTests(unittest.TestCase):
             log_messages = log_recorder.read()
 
             assertEqual(q, {})
-            if PYPARSING:
-                assertNotIn("Invalid URL Filter Expression", log_messages)
+            assertNotIn("Invalid URL Filter Expression", log_messages)
 
             # Test without expression
             # => should succeed, but not return any query
@@ -2562,8 +2660,7 @@ class URLQueryParserTests(unittest.TestCase):
             log_messages = log_recorder.stop()
 
             assertEqual(q, {})
-            if PYPARSING:
-                assertNotIn("Invalid URL Filter Expression", log_messages)
+            assertNotIn("Invalid URL Filter Expression", log_messages)
 
         finally:
             settings.base.debug = debug
@@ -2828,7 +2925,6 @@ class URLQueryParserTests(unittest.TestCase):
         assertEqual(query, q3)
 
     # -------------------------------------------------------------------------
-    @unittest.skipIf(not PYPARSING, "PyParsing not available")
     def testParsing(self):
         """ Test expression parsing (not comprehensive) """
 
@@ -2901,6 +2997,144 @@ class URLQueryParserTests(unittest.TestCase):
                                   (i, v, k, actual),
                             )
 
+    # -------------------------------------------------------------------------
+    def testParsingConformance(self):
+        """ Test expression parsing against a corpus of known results """
+
+        p = S3URLQueryParser()
+
+        assertEqual = self.assertEqual
+
+        tree = self.tree
+
+        examples = (
+            ('first_name eq "Test"',
+             {None: ('eq', 'first_name', 'Test')},
+             ),
+            ('~.id belongs 1,2,3',
+             {None: ('belongs', '~.id', ['1', '2', '3'])},
+             ),
+            # No whitespace allowed within value lists
+            ('~.id belongs 1, 2',
+             {None: ('belongs', '~.id', '1')},
+             ),
+            ('~.name eq "Test","Other",NONE',
+             {None: ('eq', '~.name', ['Test', 'Other', None])},
+             ),
+            ("~.name eq 'Single''Quoted'",
+             {None: ('eq', '~.name', "'Single''Quoted'")},
+             ),
+            ('~.name like "Ex*mple"',
+             {None: ('like', 'lower(~.name)', 'ex%mple')},
+             ),
+            ('~.value gt -1.5e3',
+             {None: ('gt', '~.value', '-1.5e3')},
+             ),
+            ('lower(~.name) eq "test"',
+             {None: ('eq', 'lower(~.name)', 'test')},
+             ),
+            ('upper( contact.value )ne "X"',
+             {'contact': ('ne', 'upper(contact.value)', 'X')},
+             ),
+            ('[org].name eq 1',
+             {'(org)': ('eq', '(org).name', '1')},
+             ),
+            ('organisation_id$name like "*YMCA*" or organisation_id$name like "*YWCA*"',
+             {None: ('or', ('like', 'lower(organisation_id$name)', '%ymca%'),
+                           ('like', 'lower(organisation_id$name)', '%ywca%'))},
+             ),
+            ('last_name like "User*" or lower(contact.value) like "*example.com"',
+             {None: ('or', ('like', 'lower(last_name)', 'user%'),
+                           ('like', 'lower(contact.value)', '%example.com'))},
+             ),
+            ('last_name like "User*" and not(contact.value like "*example.com" or first_name like "Norm*")',
+             {None: ('and', ('like', 'lower(last_name)', 'user%'),
+                            ('not', ('like', 'lower(first_name)', 'norm%'))),
+              'contact': ('not', ('like', 'lower(contact.value)', '%example.com')),
+              },
+             ),
+            ('(~.a eq "x") or (~.a eq NONE)',
+             {None: ('or', ('eq', '~.a', 'x'), ('eq', '~.a', None))},
+             ),
+            ('((~.a eq 1) and (b.c ne 2)) and (d.e gt 3)',
+             {None: ('eq', '~.a', '1'),
+              'b': ('ne', 'b.c', '2'),
+              'd': ('gt', 'd.e', '3'),
+              },
+             ),
+            ('~.a eq 1 or ~.b eq 2 and not ~.c eq 3',
+             {None: ('or', ('eq', '~.a', '1'),
+                           ('and', ('eq', '~.b', '2'), ('not', ('eq', '~.c', '3'))))},
+             ),
+            ('not not ~.a eq 1',
+             {None: ('eq', '~.a', '1')},
+             ),
+            ('not(~.a eq 1 or x.b eq 2)',
+             {None: ('not', ('eq', '~.a', '1')),
+              'x': ('not', ('eq', 'x.b', '2')),
+              },
+             ),
+            # Chained operators
+            ('~.a eq 1 and ~.b eq 2 and ~.c eq 3',
+             {None: ('and', ('and', ('eq', '~.a', '1'), ('eq', '~.b', '2')),
+                            ('eq', '~.c', '3'))},
+             ),
+            ('~.a eq 1 or ~.b eq 2 or ~.c eq 3',
+             {None: ('or', ('or', ('eq', '~.a', '1'), ('eq', '~.b', '2')),
+                           ('eq', '~.c', '3'))},
+             ),
+            # Operators must be separate words
+            ('notes.a eq 1',
+             {'notes': ('eq', 'notes.a', '1')},
+             ),
+            # Trailing parts that can not be parsed are ignored
+            ('~.a eq 1 and',
+             {None: ('eq', '~.a', '1')},
+             ),
+            ('~.a eq value trailing',
+             {None: ('eq', '~.a', 'value')},
+             ),
+            ('~.a eq x)',
+             {None: ('eq', '~.a', 'x)')},
+             ),
+            # Invalid expressions
+            ('not a valid expression', {}),
+            ('invalidexpression', {}),
+            ('(~.a eq x)', {}),
+            ('~.a eq', {}),
+            ('   ', {}),
+        )
+
+        for expression, expected in examples:
+            result = p.parse(expression)
+            result = {alias: tree(query) for alias, query in result.items()}
+            assertEqual(result, expected,
+                        msg = "Unexpected result for '%s'" % expression)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def tree(cls, query):
+        """
+            Helper to convert an S3ResourceQuery into a tuple for comparison
+
+            Args:
+                query: the S3ResourceQuery
+
+            Returns:
+                tuple (op, left, right)
+        """
+
+        op = query.op
+        if op in (query.AND, query.OR):
+            return (op, cls.tree(query.left), cls.tree(query.right))
+        elif op == query.NOT:
+            return (op, cls.tree(query.left))
+
+        left = query.left
+        selector = "%s(%s)" % (left.op, left.name) if left.op else left.name
+
+        return (op, selector, query.right)
+
 # =============================================================================
 class AIRegexTests(unittest.TestCase):
     """ Tests for accent-insensitive LIKE """
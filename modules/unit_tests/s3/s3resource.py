@@ -620,6 +620,214 @@ class ResourceExportTests(unittest.TestCase):
         finally:
             current.db.rollback()
 
+    # -------------------------------------------------------------------------
+    def testExportStream(self):
+        """ Test incremental export of a resource page by page """
+
+        assertEqual = self.assertEqual
+
+        s3db = current.s3db
+
+        xmlstr = """
+<s3xml>
+    <resource name="org_organisation" uuid="ESO1">
+        <data field="name">ExportStreamOrganisation1</data>
+        <resource name="org_office" uuid="ESO1O1">
+            <data field="name">ExportStreamOffice1</data>
+            <reference field="office_type_id" resource="org_office_type" uuid="ESOT1"/>
+        </resource>
+    </resource>
+    <resource name="org_organisation" uuid="ESO2">
+        <data field="name">ExportStreamOrganisation2</data>
+        <resource name="org_office" uuid="ESO2O1">
+            <data field="name">ExportStreamOffice2</data>
+            <reference field="office_type_id" resource="org_office_type" uuid="ESOT1"/>
+        </resource>
+    </resource>
+    <resource name="org_organisation" uuid="ESO3">
+        <data field="name">ExportStreamOrganisation3</data>
+    </resource>
+    <resource name="org_office_type" uuid="ESOT1">
+        <data field="name">ExportStreamOfficeType</data>
+    </resource>
+</s3xml>"""
+
+        try:
+            xmltree = etree.ElementTree(etree.fromstring(xmlstr))
+            resource = s3db.resource("org_organisation")
+            resource.import_xml(xmltree)
+
+            uids = ["ESO1", "ESO2", "ESO3"]
+
+            # Build the complete tree
+            resource = s3db.resource("org_organisation", uid=uids)
+            expected = etree.fromstring(resource.export_xml(mcomponents=["office"]))
+
+            # Export page by page
+            from io import BytesIO
+            output = BytesIO()
+            resource = s3db.resource("org_organisation", uid=uids)
+            results = resource.export_stream(output,
+                                             page_size = 1,
+                                             mcomponents = ["office"],
+                                             )
+            assertEqual(results, 3)
+
+            root = etree.fromstring(output.getvalue())
+            assertEqual(root.tag, current.xml.TAG.root)
+            assertEqual(root.get("success"), "true")
+            assertEqual(root.get("results"), "3")
+
+            # Same master records and components
+            orgs = root.xpath("resource[@name='org_organisation']")
+            assertEqual(sorted(org.get("uuid") for org in orgs), uids)
+            offices = root.xpath("//resource[@name='org_office']")
+            assertEqual(len(offices),
+                        len(expected.xpath("//resource[@name='org_office']")))
+
+            # Referenced record exported only once, although
+            # referenced from records in different pages
+            types = root.xpath("resource[@name='org_office_type']")
+            assertEqual(len(types), 1)
+            assertEqual(types[0].get("uuid"), "ESOT1")
+            references = root.xpath("//reference[@resource='org_office_type']")
+            assertEqual(len(references), 2)
+            for reference in references:
+                assertEqual(reference.get("uuid"), "ESOT1")
+
+            # Slicing
+            output = BytesIO()
+            resource = s3db.resource("org_organisation", uid=uids)
+            results = resource.export_stream(output,
+                                             page_size = 2,
+                                             start = 1,
+                                             limit = 5,
+                                             mcomponents = None,
+                                             )
+            assertEqual(results, 2)
+            root = etree.fromstring(output.getvalue())
+            assertEqual(len(root.xpath("resource[@name='org_organisation']")), 2)
+
+            # Extra filter pushed down into the query before exporting
+            def test_filter(resource, ids, expression):
+                return ids
+            def test_query(resource, expression):
+                return resource.table.uuid == expression
+            test_filter.query = test_query
+
+            output = BytesIO()
+            resource = s3db.resource("org_organisation",
+                                     uid = uids,
+                                     extra_filters = [(test_filter, "ESO2")],
+                                     )
+            resource.rfilter.get_query()
+            results = resource.export_stream(output,
+                                             page_size = 1,
+                                             mcomponents = None,
+                                             )
+            assertEqual(results, 1)
+            root = etree.fromstring(output.getvalue())
+            orgs = root.xpath("resource[@name='org_organisation']")
+            assertEqual([org.get("uuid") for org in orgs], ["ESO2"])
+
+            # No records
+            output = BytesIO()
+            resource = s3db.resource("org_organisation", uid=["ESONONE"])
+            results = resource.export_stream(output, page_size=2)
+            assertEqual(results, 0)
+            root = etree.fromstring(output.getvalue())
+            assertEqual(root.get("success"), "false")
+            assertEqual(len(root), 0)
+
+        finally:
+            current.db.rollback()
+
+    # -------------------------------------------------------------------------
+    def testExportStreamComponent(self):
+        """ Test incremental export of component requests """
+
+        assertEqual = self.assertEqual
+
+        db = current.db
+        s3db = current.s3db
+
+        xmlstr = """
+<s3xml>
+    <resource name="org_organisation" uuid="ESCO1">
+        <data field="name">ExportStreamComponentOrganisation</data>
+        <resource name="org_office" uuid="ESCO1O1">
+            <data field="name">ExportStreamComponentOffice1</data>
+        </resource>
+        <resource name="org_office" uuid="ESCO1O2">
+            <data field="name">ExportStreamComponentOffice2</data>
+        </resource>
+    </resource>
+</s3xml>"""
+
+        from io import BytesIO
+
+        def export(r):
+            # Export the request resource, return the UIDs of the offices
+            resource = r.resource
+            query = str(resource.rfilter.get_query())
+
+            output = BytesIO()
+            target = r.target()[3]
+            results = resource.export_stream(output,
+                                             page_size = 1,
+                                             msince = datetime.datetime(2000, 1, 1),
+                                             target = target,
+                                             )
+            assertEqual(results, 1)
+
+            # Export filters are not added to the request resource
+            assertEqual(str(resource.rfilter.get_query()), query)
+
+            root = etree.fromstring(output.getvalue())
+            offices = root.xpath("//resource[@name='org_office']")
+            return sorted(office.get("uuid") for office in offices)
+
+        try:
+            xmltree = etree.ElementTree(etree.fromstring(xmlstr))
+            resource = s3db.resource("org_organisation")
+            resource.import_xml(xmltree)
+
+            otable = s3db.org_organisation
+            org_id = db(otable.uuid == "ESCO1").select(otable.id,
+                                                       limitby = (0, 1),
+                                                       ).first().id
+            ftable = s3db.org_office
+            office_id = db(ftable.uuid == "ESCO1O1").select(ftable.id,
+                                                            limitby = (0, 1),
+                                                            ).first().id
+
+            # All component records
+            r = S3Request(prefix = "org",
+                          name = "organisation",
+                          args = [str(org_id), "office"],
+                          get_vars = {},
+                          )
+            assertEqual(export(r), ["ESCO1O1", "ESCO1O2"])
+
+            # Single component record
+            r = S3Request(prefix = "org",
+                          name = "organisation",
+                          args = [str(org_id), "office", str(office_id)],
+                          get_vars = {},
+                          )
+            assertEqual(export(r), ["ESCO1O1"])
+
+            # Component URL filter
+            r = S3Request(prefix = "org",
+                          name = "organisation",
+                          args = [str(org_id), "office"],
+                          get_vars = {"office.name": "ExportStreamComponentOffice2"},
+                          )
+            assertEqual(export(r), ["ESCO1O2"])
+
+        finally:
+            db.rollback()
+
 # =============================================================================
 class ResourceImportTests(unittest.TestCase):
     """ Test XML imports into resources """
@@ -757,6 +965,134 @@ class ResourceImportTests(unittest.TestCase):
         self.assertEqual(s3_utc(resource.mtime).date(),
                          s3_utc(datetime.datetime.utcnow()).date())
 
+    # -------------------------------------------------------------------------
+    def testImportStreamComplete(self):
+        """ Test that streaming imports of large sources import complete records """
+
+        from io import BytesIO
+
+        assertEqual = self.assertEqual
+
+        # Large enough to span multiple parser chunks
+        number = 2000
+        names = ["StreamCompleteRecord%s%s" % (i, "x" * (i % 100)) for i in range(number)]
+        resources = ['<resource name="importer_test" uuid="STREAMCOMPLETE%s">'
+                     '<data field="name">%s</data>'
+                     '</resource>' % (i, name) for i, name in enumerate(names)]
+        xmlstr = "<s3xml>%s</s3xml>" % "".join(resources)
+
+        db = current.db
+        s3db = current.s3db
+
+        try:
+            resource = s3db.resource("importer_test")
+            success = resource.import_stream(BytesIO(xmlstr.encode("utf-8")),
+                                             batch_size = 100,
+                                             )
+            self.assertTrue(success)
+            assertEqual(resource.import_count, number)
+
+            table = db.importer_test
+            rows = db(table.uuid.like("STREAMCOMPLETE%")).select(table.uuid,
+                                                                  table.name,
+                                                                  )
+            assertEqual(len(rows), number)
+            for row in rows:
+                assertEqual(row.name, names[int(row.uuid[14:])])
+        finally:
+            db.rollback()
+
+    # -------------------------------------------------------------------------
+    def testImportStream(self):
+        """ Test streaming import in batches """
+
+        from io import BytesIO
+
+        assertEqual = self.assertEqual
+
+        xmlstr = """
+<s3xml>
+    <resource name="org_organisation" tuid="STREAMTESTORG">
+        <data field="name">StreamTestOrganisation</data>
+    </resource>
+    <resource name="org_office" uuid="STREAMTESTOFFICE1">
+        <data field="name">StreamTestOffice1</data>
+        <reference field="organisation_id" resource="org_organisation" tuid="STREAMTESTORG"/>
+    </resource>
+    <resource name="org_office" uuid="STREAMTESTOFFICE2">
+        <data field="name">StreamTestOffice2</data>
+        <reference field="organisation_id" resource="org_organisation" tuid="STREAMTESTORG"/>
+    </resource>
+    <resource name="org_office" uuid="STREAMTESTOFFICE3">
+        <data field="name">StreamTestOffice3</data>
+        <reference field="organisation_id" resource="org_organisation" tuid="STREAMTESTORG"/>
+    </resource>
+</s3xml>"""
+
+        db = current.db
+        s3db = current.s3db
+
+        try:
+            resource = s3db.resource("org_office")
+            success = resource.import_stream(BytesIO(xmlstr.encode("utf-8")),
+                                             batch_size = 1,
+                                             )
+            self.assertTrue(success)
+            assertEqual(resource.import_count, 3)
+
+            # References to elements of earlier batches are resolved
+            otable = s3db.org_organisation
+            table = s3db.org_office
+            query = (table.uuid.like("STREAMTESTOFFICE%")) & \
+                    (table.organisation_id == otable.id)
+            rows = db(query).select(otable.name)
+            assertEqual(len(rows), 3)
+            assertEqual(set(row.name for row in rows), {"StreamTestOrganisation"})
+
+            # Pending elements are imported when exceeding the batch size
+            xmlstr = """
+<s3xml>
+    <resource name="org_organisation" tuid="STREAMTESTORG1">
+        <data field="name">StreamTestOrganisation1</data>
+    </resource>
+    <resource name="org_organisation" tuid="STREAMTESTORG2">
+        <data field="name">StreamTestOrganisation2</data>
+    </resource>
+    <resource name="org_office" uuid="STREAMTESTOFFICE4">
+        <data field="name">StreamTestOffice4</data>
+        <reference field="organisation_id" resource="org_organisation" tuid="STREAMTESTORG1"/>
+    </resource>
+</s3xml>"""
+
+            resource = s3db.resource("org_office")
+            success = resource.import_stream(BytesIO(xmlstr.encode("utf-8")),
+                                             batch_size = 1,
+                                             )
+            self.assertTrue(success)
+            assertEqual(resource.import_count, 1)
+
+            query = (otable.name.like("StreamTestOrganisation_")) & \
+                    (otable.deleted == False)
+            rows = db(query).select(otable.id, otable.name)
+            organisations = dict((row.name, row.id) for row in rows)
+            assertEqual(set(organisations),
+                        {"StreamTestOrganisation1", "StreamTestOrganisation2"},
+                        )
+
+            row = db(table.uuid == "STREAMTESTOFFICE4").select(table.organisation_id,
+                                                                limitby = (0, 1),
+                                                                ).first()
+            assertEqual(row.organisation_id,
+                        organisations["StreamTestOrganisation1"],
+                        )
+
+            # Parse errors fail the import
+            resource = s3db.resource("org_office")
+            msg = resource.import_xml(BytesIO(b"<s3xml><resource"), stream=True)
+            assertEqual(json.loads(msg)["status"], "failed")
+        finally:
+            db.rollback()
+
 # =============================================================================
 class ResourceDataObjectAPITests (unittest.TestCase):
     """ Test the S3Resource Data Object API """
@@ -1914,6 +2250,7 @@ class ResourceSelectTests(unittest.TestCase):
         """ Test application of extra filters """
 
         assertTrue = self.assertTrue
+        assertFalse = self.assertFalse
         assertEqual = self.assertEqual
         assertNotEqual = self.assertNotEqual
 
@@ -1974,7 +2311,14 @@ class ResourceSelectTests(unittest.TestCase):
         seen = []
         subset = apply_extra_filters(test_set, limit=2)
         assertEqual(subset, [4, 6])
-        assertEqual(seen, [1, 2, 3, 4, 5, 6])
+        # - batch size extrapolated from hit rate after first match
+        assertEqual(seen, test_set)
+
+        # Verify round trip statistics
+        stats = resource.rfilter.efstats["test_filter"]
+        assertEqual(stats["calls"], 3)
+        assertEqual(stats["ids"], 8)
+        assertFalse(stats["pushdown"])
 
         # Test with limit > len(test_set)
         seen = []
@@ -2144,6 +2488,53 @@ class ResourceSelectTests(unittest.TestCase):
         for index, row in enumerate(rows):
             assertEqual(row["select_master.id"], ids[index])
 
+    # -------------------------------------------------------------------------
+    def testSelectExtraFilterPushdown(self):
+        """ Test selection with extra filter translated into a DAL query """
+
+        s3db = current.s3db
+
+        assertTrue = self.assertTrue
+        assertEqual = self.assertEqual
+
+        test_expression = "A"
+
+        # Number of expected matches
+        numitems = len([item for item in self.test_data if item[1] == test_expression])
+
+        calls = []
+        def test_filter(resource, ids, expression):
+            """ Test filter function (must not be called) """
+
+            calls.append(ids)
+            return ids
+
+        def test_query(resource, expression):
+            """ Test filter query """
+
+            return resource.table.status == expression
+
+        test_filter.query = test_query
+
+        # Define resource
+        resource = s3db.resource("select_master",
+                                 extra_filters = [(test_filter, test_expression)],
+                                 )
+
+        # Select with counting
+        data = resource.select(["name", "status"], limit=2, count=True)
+        rows = data.rows
+        # - Rows properly filtered
+        assertEqual(len(rows), min(2, numitems))
+        assertTrue(all(row["select_master.status"] == test_expression for row in rows))
+        # - Rows correctly counted
+        assertEqual(data.numrows, numitems)
+
+        # Verify that the filter has been added to the query
+        assertEqual(calls, [])
+        assertEqual(resource.rfilter.get_extra_filters(), [])
+        assertTrue(resource.rfilter.efstats["test_filter"]["pushdown"])
+
     # -------------------------------------------------------------------------
     def testSelectSubset(self):
         """ Test selection of unfiltered subset (pagination) """
@@ -2517,6 +2908,186 @@ class ResourceSelectTests(unittest.TestCase):
         # - returns all matching record ids, however
         assertEqual(len(data.ids), numitems)
 
+    # -------------------------------------------------------------------------
+    def testSelectSubsetKeyset(self):
+        """ Test selection of subsets with keyset pagination """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+        assertNotEqual = self.assertNotEqual
+
+        numitems = len(self.test_data)
+
+        resource = s3db.resource("select_master")
+        table = resource.table
+        orderby = ~table.id
+
+        # Reference: all records in order
+        data = resource.select(["id", "name"], orderby=orderby)
+        all_ids = [row["select_master.id"] for row in data.rows]
+
+        # Walk through all pages
+        limit = 3
+        seek = []
+        seen = []
+        while True:
+            data = resource.select(["id", "name"],
+                                   limit = limit,
+                                   count = True,
+                                   orderby = orderby,
+                                   seek = seek,
+                                   )
+            # - counts all matching records with every page
+            assertEqual(data.numrows, numitems)
+            page = [row["select_master.id"] for row in data.rows]
+            if not page:
+                break
+            seen.extend(page)
+
+            # - returns the sort key of the last record in the page
+            seek = data.seek
+            assertEqual(seek, [page[-1]])
+
+        # - all records in correct order, each exactly once
+        assertEqual(seen, all_ids)
+
+        # Invalid sort key falls back to OFFSET pagination
+        data = resource.select(["id", "name"],
+                               start = 3,
+                               limit = limit,
+                               orderby = orderby,
+                               seek = ["invalid"],
+                               )
+        page = [row["select_master.id"] for row in data.rows]
+        assertEqual(page, all_ids[3:3+limit])
+        assertEqual(data.seek, None)
+
+        # Nullable orderby field falls back to OFFSET pagination
+        data = resource.select(["id", "name"],
+                               start = 3,
+                               limit = limit,
+                               orderby = "select_master.name",
+                               seek = [],
+                               )
+        assertEqual(len(data.rows), limit)
+        assertEqual(data.seek, None)
+
+        # No seek, no sort key
+        data = resource.select(["id", "name"], limit=limit, orderby=orderby)
+        assertEqual(data.seek, None)
+        assertNotEqual(len(data.rows), 0)
+
+    # -------------------------------------------------------------------------
+    def testCountCache(self):
+        """ Test caching of record counts """
+
+        db = current.db
+        s3db = current.s3db
+        settings = current.deployment_settings
+
+        assertEqual = self.assertEqual
+
+        numitems = len([item for item in self.test_data if item[1] == "A"])
+
+        count_cache = settings.get_base_count_cache()
+        settings.base.count_cache = 60
+        try:
+            cache = S3ResourceFilter.count_cache()
+            cache.clear()
+
+            resource = s3db.resource("select_master", filter=FS("status") == "A")
+            assertEqual(resource.count(), numitems)
+            assertEqual(cache.stats()["misses"] > 0, True)
+
+            # Same filter in another resource => cache hit
+            hits = cache.stats()["hits"]
+            resource = s3db.resource("select_master", filter=FS("status") == "A")
+            assertEqual(resource.count(), numitems)
+            assertEqual(cache.stats()["hits"], hits + 1)
+
+            # Insert => invalidated by modified_on high-water mark
+            table = resource.table
+            record_id = table.insert(name="selectX", status="A")
+            try:
+                resource = s3db.resource("select_master", filter=FS("status") == "A")
+                assertEqual(resource.count(), numitems + 1)
+            finally:
+                db(table.id == record_id).delete()
+
+            # Hard deletion => invalidated by number of records
+            archive_not_delete = settings.security.get("archive_not_delete")
+            settings.security.archive_not_delete = False
+            record_ids = [table.insert(name="select%s" % i, status="A")
+                          for i in ("X1", "X2")]
+            try:
+                resource = s3db.resource("select_master", filter=FS("status") == "A")
+                assertEqual(resource.count(), numitems + 2)
+                db(table.id == record_ids[0]).delete()
+                resource = s3db.resource("select_master", filter=FS("status") == "A")
+                assertEqual(resource.count(), numitems + 1)
+            finally:
+                db(table.id.belongs(record_ids)).delete()
+                if archive_not_delete is None:
+                    settings.security.pop("archive_not_delete", None)
+                else:
+                    settings.security.archive_not_delete = archive_not_delete
+
+            # Estimate returns the exact count if known from the cache
+            settings.base.count_estimate = True
+            resource = s3db.resource("select_master", filter=FS("status") == "A")
+            assertEqual(resource.count(), numitems)
+            rfilter = resource.rfilter
+            rfilter.estimate_records = lambda *args, **kwargs: numitems + 10
+            number, exact = rfilter.estimate()
+            assertEqual(number, numitems)
+            assertEqual(exact, True)
+
+            # Estimate falls back to exact count where not supported
+            settings.base.count_estimate = False
+            resource = s3db.resource("select_master", filter=FS("status") == "A")
+            number, exact = resource.rfilter.estimate()
+            assertEqual(number, numitems)
+            assertEqual(exact, True)
+        finally:
+            settings.base.count_cache = count_cache
+            settings.base.pop("count_estimate", None)
+
+    # -------------------------------------------------------------------------
+    def testIterSelect(self):
+        """ Test chunked selection with iter_select """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+
+        numitems = len(self.test_data)
+
+        resource = s3db.resource("select_master")
+        data = resource.select(["id", "name"], orderby="select_master.id")
+        all_ids = [row["select_master.id"] for row in data.rows]
+
+        # All records in chunks of 4, in order
+        chunks = list(resource.iter_select(["id", "name"], chunk_size=4))
+        assertEqual([len(chunk) for chunk in chunks], [4, 4, numitems - 8])
+        ids = [row["select_master.id"] for chunk in chunks for row in chunk]
+        assertEqual(ids, all_ids)
+
+        # With virtual filter (falls back to offset)
+        query = FS("code") == "A"
+        resource = s3db.resource("select_master", filter=query)
+        numitems = len([item for item in self.test_data if item[1] == "A"])
+        chunks = list(resource.iter_select(["id", "name", "status"], chunk_size=2))
+        rows = [row for chunk in chunks for row in chunk]
+        assertEqual(len(rows), numitems)
+        assertTrue(all(row["select_master.status"] == "A" for row in rows))
+        assertEqual(len(set(row["select_master.id"] for row in rows)), numitems)
+
+        # Invalid chunk size
+        with self.assertRaises(ValueError):
+            list(resource.iter_select(["id"], chunk_size=0))
+
 # =============================================================================
 class ResourceLazyVirtualFieldsSupportTests(unittest.TestCase):
     """ Test support for lazy virtual fields """
@@ -4340,6 +4911,43 @@ class LazyComponentsTests(unittest.TestCase):
         assertNotIn("component_3", components.loaded)
         assertEqual(len(list(resource.links.keys())), 0)
 
+    # -------------------------------------------------------------------------
+    def testLazyComponentCounter(self):
+        """ Test that components are only instantiated on access """
+
+        s3db = current.s3db
+        s3 = current.response.s3
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+        assertFalse = self.assertFalse
+
+        s3.component_resources = None
+
+        resource = s3db.resource("lazy_master")
+        components = resource.components
+
+        # Instantiating the resource does not determine exposed aliases
+        assertEqual(components._exposed_aliases, None)
+        assertEqual(s3.component_resources, None)
+
+        # Checking for a component does not instantiate it
+        assertTrue("component_1" in components)
+        assertFalse("undefined" in components)
+        assertEqual(len(components.loaded), 0)
+        assertEqual(s3.component_resources, None)
+
+        # Each component is counted once when accessed
+        components.get("component_1")
+        components.get("component_1")
+        assertEqual(s3.component_resources, 1)
+
+        # Selectors instantiate only the components they refer to
+        resource.resolve_selector("component_2.id")
+        assertEqual(s3.component_resources, 2)
+        assertEqual(set(components.loaded.keys()),
+                    {"component_1", "component_2"})
+
 # =============================================================================
 if __name__ == "__main__":
 
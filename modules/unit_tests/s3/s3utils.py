@@ -5,6 +5,7 @@
 # To run this script use:
 # python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3utils.py
 #
+import time
 import unittest
 
 from s3.s3utils import *
@@ -205,6 +206,77 @@ class S3MarkupStripperTests(unittest.TestCase):
         # multiple inheritance with object enforces a new-style class
         stripper = S3MarkupStripper()
 
+# =============================================================================
+class S3LRUCacheTests(unittest.TestCase):
+    """ Tests for S3LRUCache """
+
+    # -------------------------------------------------------------------------
+    def testEviction(self):
+        """ Least-recently used entries are evicted when full """
+
+        assertEqual = self.assertEqual
+        assertIn = self.assertIn
+        assertNotIn = self.assertNotIn
+
+        cache = S3LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        # Access "a" so that "b" becomes the least-recently used
+        assertEqual(cache.get("a"), 1)
+
+        cache.set("c", 3)
+        assertEqual(len(cache), 2)
+        assertIn("a", cache)
+        assertNotIn("b", cache)
+        assertIn("c", cache)
+
+    # -------------------------------------------------------------------------
+    def testExpiry(self):
+        """ Expired entries are not returned """
+
+        cache = S3LRUCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+
+        # Fake expiry
+        cache._data["a"] = (time.time() - 1, 1)
+        self.assertEqual(cache.get("a", "missing"), "missing")
+        self.assertEqual(len(cache), 0)
+
+    # -------------------------------------------------------------------------
+    def testCallAndStats(self):
+        """ Lookup with computation, hit/miss counters """
+
+        assertEqual = self.assertEqual
+
+        calls = []
+        def lookup():
+            calls.append(1)
+            return None
+
+        cache = S3LRUCache(maxsize=10)
+
+        # None is a valid cache value
+        assertEqual(cache("x", lookup), None)
+        assertEqual(cache("x", lookup), None)
+        assertEqual(len(calls), 1)
+
+        stats = cache.stats()
+        assertEqual(stats["hits"], 1)
+        assertEqual(stats["misses"], 1)
+        assertEqual(stats["size"], 1)
+
+        # Selective invalidation
+        cache.set(("t1", 1), 1)
+        cache.set(("t2", 1), 2)
+        cache.clear(lambda key: key[0] == "t1")
+        assertEqual(cache.get(("t1", 1)), None)
+        assertEqual(cache.get(("t2", 1)), 2)
+
+        assertEqual(cache.pop(("t2", 1)), 2)
+        assertEqual(cache.pop(("t2", 1)), None)
+
 # =============================================================================
 if __name__ == "__main__":
 
@@ -212,6 +284,7 @@ if __name__ == "__main__":
         S3TypeConverterTests,
         S3FKWrappersTests,
         S3MarkupStripperTests,
+        S3LRUCacheTests,
         )
 
 # END ========================================================================
@@ -13,7 +13,7 @@ from lxml import etree
 
 from gluon import *
 
-from s3 import S3Hierarchy, s3_meta_fields, S3Represent, S3RepresentLazy, S3XMLFormat, IS_ONE_OF
+from s3 import S3CSVMapping, S3Hierarchy, s3_meta_fields, S3Represent, S3RepresentLazy, S3XMLFormat, IS_ONE_OF
 from s3compat import BytesIO, StringIO
 
 from unit_tests import run_suite
@@ -263,6 +263,266 @@ class XMLFormatTests(unittest.TestCase):
         self.assertEqual(len(root), 0)
         self.assertEqual(root.text, "Test")
 
+# =============================================================================
+class XSLTCacheTests(unittest.TestCase):
+    """ Tests for the process-wide cache of compiled XSLT stylesheets """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        import tempfile
+
+        stylesheet = """<?xml version="1.0"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+    <xsl:param name="name"/>
+    <xsl:template match="/">
+        <test><xsl:value-of select="$name"/></test>
+    </xsl:template>
+</xsl:stylesheet>"""
+
+        handle, self.path = tempfile.mkstemp(suffix=".xsl")
+        with os.fdopen(handle, "w") as f:
+            f.write(stylesheet)
+
+        self.tree = etree.ElementTree(etree.fromstring("<root/>"))
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        os.remove(self.path)
+
+    # -------------------------------------------------------------------------
+    def testStylesheetReuse(self):
+        """ Test that stylesheet files are compiled only once """
+
+        assertEqual = self.assertEqual
+
+        xml = current.xml
+        if xml.xslt_cache() is None:
+            self.skipTest("XSLT cache disabled")
+
+        statistics = xml.xslt_statistics
+        compiled = statistics()["compiled"]
+
+        # First transformation compiles the stylesheet
+        result = xml.transform(self.tree, self.path, name="first")
+        assertEqual(result.getroot().text, "first")
+        assertEqual(statistics()["compiled"], compiled + 1)
+
+        # Subsequent transformations reuse the compiled stylesheet
+        result = xml.transform(self.tree, self.path, name="second")
+        assertEqual(result.getroot().text, "second")
+        xmlformat = S3XMLFormat(self.path)
+        result = xmlformat.transform(self.tree, name="third")
+        assertEqual(result.getroot().text, "third")
+        assertEqual(statistics()["compiled"], compiled + 1)
+
+        # Modifying the stylesheet invalidates the compiled stylesheet
+        mtime = os.path.getmtime(self.path)
+        os.utime(self.path, (mtime + 10, mtime + 10))
+        xml.transform(self.tree, self.path, name="fourth")
+        assertEqual(statistics()["compiled"], compiled + 2)
+
+    # -------------------------------------------------------------------------
+    def testIncludedStylesheets(self):
+        """ Test that modifying an imported stylesheet invalidates the cache """
+
+        import tempfile
+
+        assertEqual = self.assertEqual
+
+        xml = current.xml
+        if xml.xslt_cache() is None:
+            self.skipTest("XSLT cache disabled")
+
+        stylesheet = """<?xml version="1.0"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+    <xsl:import href="%s"/>
+</xsl:stylesheet>""" % os.path.basename(self.path)
+
+        handle, path = tempfile.mkstemp(suffix=".xsl",
+                                        dir=os.path.dirname(self.path),
+                                        )
+        with os.fdopen(handle, "w") as f:
+            f.write(stylesheet)
+
+        try:
+            # Imported files are tracked
+            stylesheet, transformer = xml.stylesheet(path)
+            files = xml.xslt_files(os.path.abspath(path), stylesheet)
+            assertEqual(files, [os.path.abspath(path), os.path.abspath(self.path)])
+
+            statistics = xml.xslt_statistics
+            compiled = statistics()["compiled"]
+
+            result = xml.transform(self.tree, path, name="first")
+            assertEqual(result.getroot().text, "first")
+            assertEqual(statistics()["compiled"], compiled)
+
+            # Modifying the imported stylesheet invalidates the importing one
+            mtime = os.path.getmtime(self.path)
+            os.utime(self.path, (mtime + 10, mtime + 10))
+            result = xml.transform(self.tree, path, name="second")
+            assertEqual(result.getroot().text, "second")
+            assertEqual(statistics()["compiled"], compiled + 1)
+        finally:
+            os.remove(path)
+
+# =============================================================================
+class IterParseTests(unittest.TestCase):
+    """ Tests for incremental parsing of S3XML sources in batches """
+
+    # -------------------------------------------------------------------------
+    def testIterParse(self):
+        """ Test that batches contain only complete elements """
+
+        assertEqual = self.assertEqual
+
+        # Large enough to span multiple parser chunks
+        number = 5000
+        resources = []
+        for i in range(number):
+            resources.append('<resource name="iterparse_test" uuid="ITP%s">'
+                             '<data field="name">Name%s%s</data>'
+                             '<data field="comments">%s</data>'
+                             '<reference field="test_id" resource="iterparse_other" uuid="ITPR%s"/>'
+                             '</resource>' % (i, i, "x" * 50, "c" * (i % 200 + 1), i))
+        xmlstr = '<s3xml domain="test">%s<other/></s3xml>' % "".join(resources)
+
+        xml = current.xml
+
+        uids = []
+        for batch in xml.iterparse(BytesIO(xmlstr.encode("utf-8")), batch_size=100):
+
+            # Batch root has the tag and attributes of the source root
+            assertEqual(batch.tag, xml.TAG.root)
+            assertEqual(batch.get("domain"), "test")
+
+            # Batch size is respected
+            self.assertTrue(len(batch) <= 100)
+
+            for element in batch:
+                # Only complete resource elements
+                assertEqual(element.tag, xml.TAG.resource)
+                uid = element.get("uuid")
+                i = int(uid[3:])
+                assertEqual(len(element), 3)
+                assertEqual(element[0].text, "Name%s%s" % (i, "x" * 50))
+                assertEqual(element[1].text, "c" * (i % 200 + 1))
+                assertEqual(element[2].get("uuid"), "ITPR%s" % i)
+                uids.append(uid)
+
+        self.assertEqual(xml.error, None)
+
+        # All elements parsed, each exactly once and in order
+        assertEqual(uids, ["ITP%s" % i for i in range(number)])
+
+    # -------------------------------------------------------------------------
+    def testIterParseError(self):
+        """ Test that parse errors end the iteration """
+
+        xml = current.xml
+
+        batches = list(xml.iterparse(BytesIO(b"<s3xml><resource"), batch_size=10))
+        self.assertEqual(batches, [])
+        self.assertNotEqual(xml.error, None)
+
+# =============================================================================
+class CSVMappingTests(unittest.TestCase):
+    """ Tests for declarative CSV import mappings """
+
+    # -------------------------------------------------------------------------
+    def testTree(self):
+        """ Test conversion of CSV sources into S3XML trees """
+
+        assertEqual = self.assertEqual
+
+        mapping = S3CSVMapping({
+            "resource": "org_office",
+            "uuid": "UUID",
+            "required": ["Name"],
+            "data": {"name": "Name",
+                     "code": {"column": "Code", "optional": True},
+                     "comments": "Comments",
+                     "phone1": {"value": "123"},
+                     },
+            "references": {
+                "organisation_id": {"resource": "org_organisation",
+                                    "column": "Organisation",
+                                    "field": "name",
+                                    },
+                "location_id": {"resource": "gis_location",
+                                "column": "Country",
+                                "uuid": "urn:iso:std:iso:3166:-1:code:%s",
+                                },
+                },
+            })
+
+        source = StringIO("UUID,Name,Code,Organisation,Country\n"
+                          "#uuid,#name,#code,#org,#country\n"
+                          "OFFICE1,Office 1,O1,Org A,PH\n"
+                          ",Office 2,NULL,Org A,\n"
+                          ",,O3,Org B,\n"
+                          )
+        root = mapping.tree(source, extra_data={"Comments": "Test"}).getroot()
+
+        assertEqual(root.tag, "s3xml")
+        resources = root.findall("resource")
+        assertEqual(len(resources), 3)
+
+        # Rows without required columns are skipped
+        office1, office2, organisation = resources
+        assertEqual(office1.get("name"), "org_office")
+        assertEqual(office1.get("uuid"), "OFFICE1")
+        assertEqual(office2.get("uuid"), None)
+
+        data = dict((d.get("field"), d.text) for d in office1.findall("data"))
+        assertEqual(data, {"name": "Office 1",
+                           "code": "O1",
+                           "comments": "Test",
+                           "phone1": "123",
+                           })
+
+        # Empty optional columns are skipped
+        data = dict((d.get("field"), d.text) for d in office2.findall("data"))
+        self.assertNotIn("code", data)
+
+        # References
+        references = dict((r.get("field"), r) for r in office1.findall("reference"))
+        assertEqual(references["location_id"].get("uuid"),
+                    "urn:iso:std:iso:3166:-1:code:PH")
+        tuid = references["organisation_id"].get("tuid")
+        assertEqual(tuid, "org_organisation/Org A")
+        references = dict((r.get("field"), r) for r in office2.findall("reference"))
+        self.assertNotIn("location_id", references)
+
+        # Referenced records are created once per value
+        assertEqual(organisation.get("name"), "org_organisation")
+        assertEqual(organisation.get("tuid"), tuid)
+        assertEqual(organisation.find("data").text, "Org A")
+
+        with self.assertRaises(ValueError):
+            S3CSVMapping({"resource": "org_office",
+                          "references": {"organisation_id": {"column": "Organisation"}},
+                          })
+
+    # -------------------------------------------------------------------------
+    def testFromXSLT(self):
+        """ Test generation of mappings from simple stylesheets """
+
+        folder = os.path.join(current.request.folder, "static", "formats", "s3csv")
+
+        # The mappings in the code base match the stylesheets
+        for name in ("gis/marker", "gis/projection", "project/status"):
+            path = os.path.join(folder, *name.split("/"))
+            with open("%s.json" % path, "r") as f:
+                expected = json.load(f)
+            self.assertEqual(S3CSVMapping.from_xslt("%s.xsl" % path), expected)
+
+        # More complex stylesheets can not be expressed as mapping
+        path = os.path.join(folder, "org", "sector.xsl")
+        self.assertEqual(S3CSVMapping.from_xslt(path), None)
+
 # =============================================================================
 class GetFieldOptionsTests(unittest.TestCase):
     """ Test field options introspection method """
@@ -1106,6 +1366,9 @@ if __name__ == "__main__":
         TreeBuilderTests,
         JSONMessageTests,
         XMLFormatTests,
+        XSLTCacheTests,
+        IterParseTests,
+        CSVMappingTests,
         GetFieldOptionsTests,
         S3JSONParsingTests,
         LookupListRepresentTests,
@@ -144,6 +144,48 @@ class PRTests(unittest.TestCase):
         users = s3db.pr_realm_users(None)
         self.assertTrue(all([u in users for u in all_users]))
 
+    # -------------------------------------------------------------------------
+    def testRealmClosure(self):
+        """ Test lookup of ancestors/descendants from the OU closure """
+
+        s3db = current.s3db
+        settings = current.deployment_settings
+
+        assertEqual = self.assertEqual
+
+        org1 = self.org1
+        org2 = self.org2
+
+        realm_closure = settings.get_auth_realm_closure()
+        settings.auth.realm_closure = True
+        current.response.s3.pr_closure = None
+        try:
+            # Build the closure
+            s3db.pr_update_closure()
+
+            # Make org2 a branch of org1
+            s3db.pr_add_affiliation(org1, org2, role="Branches")
+
+            assertEqual(s3db.pr_get_descendants(org1), [org2])
+            assertEqual(s3db.pr_get_ancestors(org2), [str(org1)])
+            assertEqual(s3db.pr_descendants([org1]), {org1: [org2]})
+            assertEqual(s3db.pr_ancestors([org2]), {org2: [str(org1)]})
+
+            # Same result as the path lookup
+            settings.auth.realm_closure = False
+            assertEqual(s3db.pr_get_descendants(org1), [org2])
+            assertEqual(s3db.pr_get_ancestors(org2), [str(org1)])
+            settings.auth.realm_closure = True
+
+            # Remove the affiliation
+            s3db.pr_remove_affiliation(org1, org2, role="Branches")
+
+            assertEqual(s3db.pr_get_descendants(org1), [])
+            assertEqual(s3db.pr_get_ancestors(org2), [])
+        finally:
+            settings.auth.realm_closure = realm_closure
+            current.response.s3.pr_closure = None
+
     # -------------------------------------------------------------------------
     def tearDown(self):
 
@@ -1,7 +1,9 @@
 <xsl:stylesheet version="1.0"
   xmlns="http://www.w3.org/2005/Atom"
   xmlns:georss="http://www.georss.org/georss"
-  xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+  xmlns:xsl="http://www.w3.org/1999/XSL/Transform"
+  xmlns:s3="http://eden.sahanafoundation.org/wiki/S3"
+  exclude-result-prefixes="s3">
 
     <!-- **********************************************************************
          GeoRSS Export Templates for S3XRC
@@ -32,6 +34,9 @@
     *********************************************************************** -->
     <xsl:output method="xml" indent="yes"/>
 
+    <!-- Entries can be transformed page by page -->
+    <s3:streaming items="entry"/>
+
     <!-- ****************************************************************** -->
     <xsl:template match="/">
         <xsl:apply-templates select="s3xml"/>
@@ -398,6 +398,7 @@
                 //'headerCallback': this._headerCallback(),
                 'rowCallback': this._rowCallback(),
                 'drawCallback': this._drawCallback(),
+                'infoCallback': this._infoCallback(),
 
                 // Custom initComplete
                 // - can e.g. be used to reposition elements like export_formats
@@ -507,6 +508,12 @@
                 cacheLower = -1;
             }
 
+            // Sort key of the last record in the last response (keyset pagination)
+            var seekNext = null;
+            if (cacheLastJson && cacheLastJson.dataTable_seek && cacheUpper !== null) {
+                seekNext = {start: cacheUpper, key: cacheLastJson.dataTable_seek};
+            }
+
             // Initialize cache
             var cacheCombined = new DDTCache();
             if (cacheLastJson && cacheLower != -1) {
@@ -515,12 +522,57 @@
                 cacheCombined.store(cacheLower, cacheLastJson.data, availableRecords);
             }
 
+            var self = this;
+
+            /**
+             * Request the exact number of records from the server, if the
+             * last response contained only an estimate
+             *
+             * @param {object} request - the current dataTables request
+             */
+            var exactCount = function(request) {
+
+                var sendData = [{'name': 'count',
+                                 'value': 'exact'
+                                 }];
+                if (request.search && request.search.value) {
+                    sendData.push({'name': 'sSearch',
+                                   'value': request.search.value
+                                   });
+                    sendData.push({'name': 'iColumns',
+                                   'value': request.columns.length
+                                   });
+                }
+                var ajaxMethod = $.ajaxS3;
+                if ($.searchS3 !== undefined) {
+                    ajaxMethod = $.searchS3;
+                }
+                ajaxMethod({
+                    'type':     conf.method,
+                    'url':      self.ajaxUrl,
+                    'data':     sendData,
+                    'dataType': 'json',
+                    'cache':    false,
+                    'success':  function(json) {
+                        if (cacheLastJson) {
+                            cacheLastJson.recordsTotal = json.recordsTotal;
+                            cacheLastJson.recordsFiltered = json.recordsFiltered;
+                            delete cacheLastJson.recordsEstimated;
+                        }
+                        cacheCombined.availableRecords = json.recordsFiltered;
+                        self.recordsEstimated = false;
+
+                        // Redraw (from cache) to update info and pagination
+                        $(self.element).DataTable().draw(false);
+                    }
+                });
+            };
+
             /**
              * Pipelining function for DataTables. To be used for the `ajax` option
              * of DataTables, original version from:
              * - http://datatables.net/examples/server_side/pipeline.html
              */
-            var self = this;
             return function(request, drawCallback, settings) {
 
                 if (this.hasOwnProperty('nTable')) {
@@ -539,6 +591,7 @@
                     cacheLastRequest = null;
                     cacheLower = -1;
                     cacheUpper = null;
+                    seekNext = null;
                     cacheCombined.clear();
 
                     drawCallback({}); // calls the inner function of reloadAjax
@@ -590,6 +643,7 @@
                         // API requested that the cache be cleared
                         cacheCombined.clear();
                         settings.clearCache = false;
+                        seekNext = null;
                         ajax = true;
 
                     } else if (cacheLastRequest &&
@@ -598,6 +652,7 @@
                                 JSON.stringify(request.search)  !== JSON.stringify(cacheLastRequest.search))) {
                         // Properties changed (ordering, columns, searching)
                         cacheCombined.clear();
+                        seekNext = null;
                         ajax = true;
 
                     } else {
@@ -664,6 +719,13 @@
                         sendData.push({'name': 'start',
                                        'value': requestStart
                                        });
+                        if (seekNext && seekNext.start == requestStart) {
+                            // Continue behind the last-seen sort key
+                            // (server falls back to start if not applicable)
+                            sendData.push({'name': 'seek',
+                                           'value': JSON.stringify(seekNext.key)
+                                           });
+                        }
                     }
                     if (request.search && request.search.value) {
                         sendData.push({'name': 'sSearch',
@@ -735,6 +797,13 @@
                             // Update cacheUpper with the actual number of records returned
                             cacheUpper = requestStart + json.data.length;
 
+                            // Remember where to seek for the subsequent page
+                            if (json.dataTable_seek) {
+                                seekNext = {start: cacheUpper, key: json.dataTable_seek};
+                            } else {
+                                seekNext = null;
+                            }
+
                             if (requestStart != drawStart) {
                                 // Remove the records up to the start of the
                                 // current page from JSON
@@ -747,6 +816,12 @@
                             }
 
                             drawCallback(json);
+
+                            // Replace an estimated number of records by the exact number
+                            self.recordsEstimated = !!json.recordsEstimated;
+                            if (self.recordsEstimated) {
+                                exactCount(request);
+                            }
                         }
                     });
 
@@ -755,6 +830,12 @@
                     var json = $.extend(true, {}, cacheLastJson, {draw: request.draw});
                     json.data = cached;
                     drawCallback(json);
+
+                    // Initial cache with estimated number of records?
+                    if (cacheLastJson.recordsEstimated && !self.recordsEstimated) {
+                        self.recordsEstimated = true;
+                        exactCount(request);
+                    }
                 }
             };
         },
@@ -782,6 +863,25 @@
         // --------------------------------------------------------------------
         // DATATABLE CALLBACKS
 
+        /**
+         * Get the info callback function
+         * - indicates an estimated number of records
+         */
+        _infoCallback: function() {
+
+            var self = this;
+
+            return function(settings, start, end, max, total, pre) {
+
+                if (self.recordsEstimated && i18n.infoEstimated) {
+                    return i18n.infoEstimated.replace('_START_', start)
+                                             .replace('_END_', end)
+                                             .replace('_TOTAL_', settings.fnFormatNumber.call(settings.oInstance, total));
+                }
+                return pre;
+            };
+        },
+
         /**
          * Get the header callback function
          */
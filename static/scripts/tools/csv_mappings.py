@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Script to generate declarative CSV import mappings (see S3CSVMapping)
+# from simple CSV import stylesheets in static/formats/s3csv
+#
+# - writes a <stylesheet>.json next to each stylesheet that can be
+#   expressed as mapping, unless a mapping already exists
+# - more complex stylesheets (lookups, hierarchies, tags...) are skipped
+#   and continue to be used for imports
+#
+# Run as:
+#   python web2py.py --no-banner -S eden -M -R applications/eden/static/scripts/tools/csv_mappings.py
+#
+# Add -A overwrite to replace existing mappings
+#
+import json
+import os
+import sys
+
+from s3 import S3CSVMapping
+
+overwrite = len(sys.argv) > 1 and sys.argv[1] == "overwrite"
+
+folder = os.path.join(request.folder, "static", "formats", "s3csv")
+
+generated = skipped = 0
+for path, dirs, files in os.walk(folder):
+    for filename in sorted(files):
+        name, extension = os.path.splitext(filename)
+        if extension != ".xsl":
+            continue
+        stylesheet = os.path.join(path, filename)
+        target = os.path.join(path, "%s.json" % name)
+        if os.path.exists(target) and not overwrite:
+            continue
+        mapping = S3CSVMapping.from_xslt(stylesheet)
+        if mapping is None:
+            skipped += 1
+            continue
+        with open(target, "w") as f:
+            json.dump(mapping, f, indent=4)
+            f.write("\n")
+        print("Generated %s" % os.path.relpath(target, folder))
+        generated += 1
+
+print("%s mappings generated, %s stylesheets too complex for mapping" % (generated, skipped))
@@ -9,6 +9,9 @@
 #
 # - normally run from fabfile.py as part of the upgrade cycle for instances
 #
+# - also creates the indexes recommended by the index advisor, if a migration
+#   script has been saved from admin/index_advisor?save=1
+#
 
 tablename = "pr_person"
 field = "first_name"
@@ -37,3 +40,20 @@ try:
 except:
     # Index already present
     pass
+
+# Indexes recommended by the index advisor (from slow queries of this instance)
+import os
+path = os.path.join(request.folder, "cache", "index_advisor.sql")
+if os.path.exists(path):
+    with open(path) as f:
+        statements = [l for l in f.read().splitlines() if l and l[:2] != "--"]
+    for statement in statements:
+        # Can't create indexes concurrently inside a transaction
+        statement = statement.replace(" CONCURRENTLY", "")
+        try:
+            db.executesql(statement)
+        except:
+            # Index already present
+            db.rollback()
+        else:
+            db.commit()